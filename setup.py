@@ -48,5 +48,9 @@ with open("README.md", "r") as fh:
                 'sciparse',
                 'liapy',
 		],
+		extras_require={
+				'arrow': ['pyarrow'],
+				'zstd': ['zstandard'],
+		},
 	license="MIT",
 	)
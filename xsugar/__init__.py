@@ -2,5 +2,19 @@ import pint
 ureg = pint.get_application_registry()
 from xsugar.source.conditions import *
 from xsugar.source.processing import *
+from xsugar.source.aggregation import *
+from xsugar.source.columns import *
+from xsugar.source.summary import *
+from xsugar.source.compression import *
+from xsugar.source.storage import *
+from xsugar.source.archive import *
+from xsugar.source.manifest import *
+from xsugar.source.pyramid import *
+from xsugar.source.lazy import *
+from xsugar.source.appender import *
+from xsugar.source.catalog import *
+from xsugar.source.arrow import *
+from xsugar.source.snapshot import *
+from xsugar.source.continuous import *
 from xsugar.source.experiments import Experiment
 from xsugar.test.shorthand import *
@@ -0,0 +1,312 @@
+"""
+Vectorized statistics over groups of replicate datasets
+"""
+import numpy as np
+import pandas as pd
+import pint
+from sciparse import is_scalar
+
+available_statistics = ['mean', 'sum', 'std', 'sem', 'median', 'ci_lower', 'ci_upper']
+
+def statistic_name(statistic):
+    """
+    Converts a statistic specification into its canonical name. Numeric statistics are interpreted as percentiles, i.e. 95 becomes "p95".
+
+    :param statistic: Statistic name (i.e. "mean", "p95") or percentile as a number
+    """
+    if isinstance(statistic, str):
+        if statistic in available_statistics:
+            return statistic
+        try:
+            percentile = float(statistic[1:])
+        except ValueError:
+            percentile = None
+        if statistic.startswith('p') and percentile is not None:
+            return 'p' + '{:g}'.format(percentile)
+        raise ValueError(f'Statistic {statistic} not recognized. Available statistics are {available_statistics} and percentiles of the form "p95"')
+    return 'p' + '{:g}'.format(statistic)
+
+def averaging_columns(frame, averaging_type='first'):
+    """
+    Gets the locations of the columns of a DataFrame which should be averaged
+
+    :param frame: DataFrame to be averaged
+    :param averaging_type: whether to average the last column only ("last") or all columns but the first column ("first")
+    :returns columns: List of integer column locations
+    """
+    N_columns = frame.shape[1]
+    if averaging_type == 'last':
+        return [N_columns - 1]
+    elif averaging_type == 'first':
+        return list(range(1, N_columns))
+    else:
+        raise ValueError(f'Averaging type {averaging_type} not recognized. Available types are "first" and "last"')
+
+def stack_frames(frames, columns):
+    """
+    Stacks a subset of the columns of identically-shaped DataFrames into a single 3D array.
+
+    :param frames: List of pandas DataFrames to stack
+    :param columns: List of integer column locations to include
+    :returns stack: numpy array of shape (N_frames, N_rows, N_columns)
+    """
+    shapes = set(frame.shape for frame in frames)
+    if len(shapes) > 1:
+        raise ValueError(f'Cannot stack DataFrames with different shapes {shapes}. All data in a group must have the same shape.')
+    return np.stack([frame.iloc[:, columns].to_numpy(dtype=float) \
+                     for frame in frames])
+
+def common_grid(x_values, grid='intersection'):
+    """
+    Generates a common grid of independent variable values from several datasets.
+
+    :param x_values: List of 1D arrays of independent variable values
+    :param grid: "union" (all values from all datasets), "intersection" (values from the first dataset which lie in the range covered by every dataset), or an array of values to use directly
+    :returns grid: 1D array of sorted independent variable values
+    """
+    if not isinstance(grid, str):
+        return np.sort(np.asarray(grid, dtype=float))
+    if grid == 'union':
+        return np.unique(np.concatenate(x_values))
+    elif grid == 'intersection':
+        lower = max(x.min() for x in x_values)
+        upper = min(x.max() for x in x_values)
+        first_x = np.unique(x_values[0])
+        return first_x[(first_x >= lower) & (first_x <= upper)]
+    else:
+        raise ValueError(f'Grid {grid} not recognized. Available grids are "union", "intersection", or an array of values')
+
+def interpolate_columns(new_x, x, values):
+    """
+    Linearly interpolates every column of a 2D array at once, with the same results as np.interp applied to each column. Points outside the range of x are set to NaN.
+
+    :param new_x: Values to interpolate at
+    :param x: Sorted values of the independent variable
+    :param values: 2D array with one row per value of x
+    :returns new_values: 2D array with one row per value of new_x
+    """
+    new_values = np.full((len(new_x), values.shape[1]), np.nan)
+    if len(x) == 0:
+        return new_values
+    inside = np.flatnonzero((new_x >= x[0]) & (new_x <= x[-1]))
+    inside_x = new_x[inside]
+    lower = (np.searchsorted(x, inside_x, side='right') - 1).clip(
+            0, max(len(x) - 2, 0))
+    upper = np.minimum(lower + 1, len(x) - 1)
+    lower_values = values[lower]
+    interpolated = values[upper]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interpolated -= lower_values
+        interpolated /= (x[upper] - x[lower])[:, None]
+        interpolated *= (inside_x - x[lower])[:, None]
+        interpolated += lower_values
+    exact_lower = np.flatnonzero(inside_x == x[lower])
+    interpolated[exact_lower] = lower_values[exact_lower]
+    exact_upper = np.flatnonzero(inside_x == x[upper])
+    interpolated[exact_upper] = values[upper[exact_upper]]
+    new_values[inside] = interpolated
+    return new_values
+
+def resample_frames(frames, grid='intersection'):
+    """
+    Linearly interpolates DataFrames onto a common grid. Assumes the first column of each DataFrame is the independent variable. Points outside the range of a given dataset are set to NaN.
+
+    :param frames: List of pandas DataFrames to resample
+    :param grid: "union", "intersection", or an array of values. See common_grid.
+    :returns resampled_frames: List of DataFrames sharing the same first column
+    """
+    x_values = [frame.iloc[:, 0].to_numpy(dtype=float) for frame in frames]
+    new_x = common_grid(x_values, grid=grid)
+    resampled_frames = []
+    for frame, x in zip(frames, x_values):
+        order = np.argsort(x, kind='stable')
+        values = frame.iloc[:, 1:].to_numpy(dtype=float)[order]
+        new_values = interpolate_columns(new_x, x[order], values)
+        new_frame = pd.DataFrame(new_values, columns=frame.columns[1:])
+        new_frame.insert(0, frame.columns[0], new_x)
+        resampled_frames.append(new_frame)
+    return resampled_frames
+
+def stack_scalars(values):
+    """
+    Stacks scalars, potentially pint Quantities, into a 1D array
+
+    :param values: List of scalar values to stack
+    :returns (stack, units): numpy array of magnitudes and the units of the first value, or None if the values are unitless
+    """
+    first_value = values[0]
+    if isinstance(first_value, pint.Quantity):
+        units = first_value.units
+        stack = np.array([v.to(units).magnitude for v in values])
+    else:
+        units = None
+        stack = np.array(values)
+    return stack, units
+
+def bootstrap_interval(
+        stack, statistic='mean', confidence=0.95, n_resamples=10000,
+        seed=None, max_elements=10**7):
+    """
+    Computes a bootstrap percentile confidence interval for a statistic along the first (replicate) axis of a stacked array. All resamples are drawn at once as a matrix of indices into the replicate axis.
+
+    :param stack: Array of shape (N_replicates, ...)
+    :param statistic: Statistic to compute the interval for. "mean", "sum", or "median"
+    :param confidence: Confidence level of the interval
+    :param n_resamples: Number of bootstrap resamples
+    :param seed: Seed (or numpy Generator) for the random number generator
+    :param max_elements: Maximum number of elements of resampled data held in memory at once. Resamples are processed in chunks if this is exceeded.
+    :returns (lower, upper): Lower and upper bounds of the interval with the replicate axis removed
+    """
+    reducers = {'mean': np.mean, 'sum': np.sum, 'median': np.median}
+    if statistic not in reducers:
+        raise ValueError(f'Cannot bootstrap statistic {statistic}. Available statistics are {list(reducers.keys())}')
+    reducer = reducers[statistic]
+    rng = np.random.default_rng(seed)
+    N_items = stack.shape[0]
+    indices = rng.integers(0, N_items, size=(n_resamples, N_items))
+    chunk_size = max(1, max_elements // max(1, stack.size))
+    resampled_statistics = np.concatenate([
+        reducer(stack[indices[i:i+chunk_size]], axis=1) \
+        for i in range(0, n_resamples, chunk_size)])
+    alpha = (1 - confidence) / 2 * 100
+    lower, upper = np.percentile(
+            resampled_statistics, [alpha, 100 - alpha], axis=0)
+    return lower, upper
+
+def aggregate_stack(stack, statistics=('mean',), ci_statistic='mean', **bootstrap_kw):
+    """
+    Computes several statistics along the first (replicate) axis of a stacked array in a single vectorized pass.
+
+    :param stack: Array of shape (N_replicates, ...)
+    :param statistics: List of statistics to compute. Available statistics are "mean", "sum", "std", "sem", "median", "ci_lower", "ci_upper", and any percentile (i.e. 5 or "p95").
+    :param ci_statistic: Statistic to compute the bootstrap confidence interval ("ci_lower" and "ci_upper") for
+    :param bootstrap_kw: Keyword arguments to pass into bootstrap_interval (i.e. confidence, n_resamples, seed)
+    :returns aggregated: Dictionary of statistic name: array with the replicate axis removed
+    """
+    names = [statistic_name(s) for s in statistics]
+    N_items = stack.shape[0]
+    aggregated = {}
+
+    if any(name in names for name in ['mean', 'std', 'sem']):
+        mean = stack.mean(axis=0)
+        aggregated['mean'] = mean
+    if 'sum' in names:
+        aggregated['sum'] = stack.sum(axis=0)
+    if 'std' in names or 'sem' in names:
+        if N_items > 1:
+            std = np.sqrt(((stack - mean) ** 2).sum(axis=0) / (N_items - 1))
+        else:
+            std = np.full(mean.shape, np.nan)
+        aggregated['std'] = std
+        aggregated['sem'] = std / np.sqrt(N_items)
+    if 'median' in names:
+        aggregated['median'] = np.median(stack, axis=0)
+    if 'ci_lower' in names or 'ci_upper' in names:
+        aggregated['ci_lower'], aggregated['ci_upper'] = bootstrap_interval(
+                stack, statistic=ci_statistic, **bootstrap_kw)
+
+    percentile_names = [n for n in names if n not in available_statistics]
+    if percentile_names:
+        percentiles = [float(n[1:]) for n in percentile_names]
+        percentile_values = np.percentile(stack, percentiles, axis=0)
+        for name, value in zip(percentile_names, percentile_values):
+            aggregated[name] = value
+
+    return {name: aggregated[name] for name in names}
+
+def replace_columns(template, columns, values):
+    """
+    Returns a copy of a DataFrame with a subset of its columns replaced
+
+    :param template: DataFrame to copy
+    :param columns: List of integer column locations to replace
+    :param values: 2D array of shape (N_rows, N_columns) containing the new values
+    """
+    frame = template.copy()
+    for i, column in enumerate(columns):
+        frame[frame.columns[column]] = values[:, i]
+    return frame
+
+class WelfordAccumulator:
+    """
+    Running mean and variance of a sequence of replicate datasets using Welford's algorithm. Only the running statistics are stored, so memory use does not grow with the number of replicates.
+
+    :param averaging_type: (if Pandas DataFrame) whether to average the last column only ("last") or all columns but the first column ("first")
+    """
+    streaming_statistics = ['mean', 'sum', 'std', 'sem']
+
+    def __init__(self, averaging_type='first'):
+        self.averaging_type = averaging_type
+        self.count = 0
+        self.template = None
+        self.columns = None
+        self.units = None
+        self.mean = None
+        self.m2 = None
+
+    def update(self, data):
+        """
+        Adds a single replicate to the running statistics
+
+        :param data: Replicate as a pandas DataFrame or a scalar
+        """
+        if isinstance(data, pd.DataFrame):
+            if self.count == 0:
+                self.template = data.copy()
+                self.columns = averaging_columns(data, self.averaging_type)
+            elif data.shape != self.template.shape:
+                raise ValueError(f'Cannot add data of shape {data.shape} to running average of shape {self.template.shape}')
+            values = stack_frames([data], self.columns)[0]
+        elif is_scalar(data):
+            if self.count == 0:
+                self.units = data.units if \
+                    isinstance(data, pint.Quantity) else None
+            elif isinstance(data, pint.Quantity) != (self.units is not None):
+                raise ValueError('Cannot mix quantities with and without units in running average')
+            if self.units is not None:
+                data = data.to(self.units).magnitude
+            values = np.float64(data)
+        else:
+            raise ValueError(f'type {type(data)} not supported. Available types are scalar, Pandas Array')
+
+        if self.count == 0:
+            self.mean = np.zeros_like(values)
+            self.m2 = np.zeros_like(values)
+        self.count += 1
+        delta = values - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (values - self.mean)
+
+    def result(self, statistics=('mean',)):
+        """
+        Gets the current running statistics in the same form as the input data
+
+        :param statistics: List of statistics to return. Available statistics are "mean", "sum", "std", and "sem"
+        :returns results: Dictionary of statistic name: statistic value
+        """
+        if self.count == 0:
+            raise ValueError('No data has been added to the running average')
+        results = {}
+        for statistic in statistics:
+            if statistic == 'mean':
+                values = self.mean
+            elif statistic == 'sum':
+                values = self.mean * self.count
+            elif statistic in ['std', 'sem']:
+                if self.count > 1:
+                    values = np.sqrt(self.m2 / (self.count - 1))
+                else:
+                    values = np.full(np.shape(self.mean), np.nan)
+                if statistic == 'sem':
+                    values = values / np.sqrt(self.count)
+            else:
+                raise ValueError(f'Statistic {statistic} cannot be computed from a running average. Available statistics are {self.streaming_statistics}')
+
+            if self.template is not None:
+                results[statistic] = replace_columns(
+                        self.template, self.columns, values)
+            elif self.units is not None:
+                results[statistic] = values * self.units
+            else:
+                results[statistic] = values
+        return results
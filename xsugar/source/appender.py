@@ -0,0 +1,91 @@
+"""
+Buffered writer for files of scalar results, which have one row per condition
+"""
+import os
+import time
+from sciparse import dict_to_string
+
+class ScalarAppender:
+    """
+    Keeps a results file open and appends rows to it in batches. Rows are buffered in memory and written when either flush_rows rows are waiting or flush_interval seconds have passed since the last write. An existing file is overwritten, unless resume is True, in which case its header is checked and rows are appended to it, so interrupted experiments can be resumed.
+
+    :param filename: Full filename of the results file
+    :param columns: List of column names
+    :param metadata: Dictionary of metadata written on the first line of a new file
+    :param flush_rows: Number of rows to buffer before writing them to the file
+    :param flush_interval: Maximum time in seconds rows are buffered before writing them to the file. If None, only flush_rows is used.
+    :param resume: Whether to append to an existing file instead of overwriting it
+    """
+    def __init__(self, filename, columns, metadata={},
+                 flush_rows=1, flush_interval=None, resume=False):
+        self.filename = filename
+        self.columns = list(columns)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+        if resume and os.path.exists(filename) and \
+                os.path.getsize(filename) > 0:
+            self.resume()
+            self.fh = open(filename, 'a')
+        else:
+            self.fh = open(filename, 'w')
+            self.fh.write(dict_to_string(metadata) + '\n')
+            self.fh.write(','.join(self.columns) + '\n')
+            self.flush(durable=True)
+
+    def resume(self):
+        """
+        Checks the header of an existing file matches the columns, and discards a partially-written last row left by an interrupted write.
+        """
+        with open(self.filename, 'r+') as fh:
+            fh.readline()
+            existing_columns = fh.readline().rstrip('\n').split(',')
+            if existing_columns != self.columns:
+                raise ValueError(f'Cannot append columns {self.columns} to file {self.filename} with columns {existing_columns}')
+        with open(self.filename, 'rb+') as fh:
+            contents = fh.read()
+            if not contents.endswith(b'\n'):
+                fh.truncate(contents.rfind(b'\n') + 1)
+
+    def append(self, values):
+        """
+        Adds a row to the file
+
+        :param values: List of values, one for each column
+        """
+        if len(values) != len(self.columns):
+            raise ValueError(f'Row {values} does not match columns {self.columns}')
+        self.buffer.append(','.join(str(v) for v in values) + '\n')
+        interval_elapsed = self.flush_interval is not None and \
+            time.monotonic() - self.last_flush >= self.flush_interval
+        if len(self.buffer) >= self.flush_rows or interval_elapsed:
+            self.flush()
+
+    def flush(self, durable=False):
+        """
+        Writes all buffered rows to the file
+
+        :param durable: If True, also waits until the file is written to disk
+        """
+        self.fh.write(''.join(self.buffer))
+        self.buffer = []
+        self.fh.flush()
+        if durable:
+            os.fsync(self.fh.fileno())
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Durably writes all buffered rows and closes the file
+        """
+        if not self.fh.closed:
+            self.flush(durable=True)
+            self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,236 @@
+"""
+Single-file container holding every condition's dataset in an experiment
+"""
+import io
+import os
+import json
+import struct
+import zlib
+import numpy as np
+import pandas as pd
+from sciparse import dict_to_string, string_to_dict
+from xsugar.source.columns import select_columns
+
+archive_extension = '.xsa'
+archive_magic = b'XSUGARA1'
+record_magic = b'XREC'
+record_prefix = struct.Struct('<4sQQI') # magic, header length, payload length, crc32
+
+def frame_to_bytes(frame):
+    """
+    Serializes the columns of a DataFrame as consecutive .npy arrays
+
+    :param frame: pandas DataFrame to serialize
+    :returns (payload, columns): The serialized bytes and a list of [column name, start, length] for each column
+    """
+    buffer = io.BytesIO()
+    columns = []
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if values.dtype == object:
+            values = values.astype(str)
+        start = buffer.tell()
+        np.lib.format.write_array(buffer, values, allow_pickle=False)
+        columns.append([str(name), start, buffer.tell() - start])
+    return buffer.getvalue(), columns
+
+def frame_from_bytes(payload, columns):
+    """
+    Deserializes a DataFrame written by frame_to_bytes
+
+    :param payload: Serialized bytes
+    :param columns: List of [column name, start, length] for each column
+    """
+    data = {}
+    for name, start, length in columns:
+        data[name] = np.lib.format.read_array(
+                io.BytesIO(payload[start:start+length]))
+    return pd.DataFrame(data)
+
+class ExperimentArchive:
+    """
+    Append-only container holding the datasets and metadata of all conditions in an experiment in a single file. Each dataset is stored as a checksummed record, and an index file next to the archive maps condition names to records for random access. Records are only ever appended, so a crash can at most lose the record being written. The index is rebuilt from the archive if it is missing or out of date. Appending a dataset with an existing name supersedes the old record.
+
+    :param filename: Full filename of the archive
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        directory, basename = os.path.split(filename)
+        self.index_filename = os.path.join(directory, '_' + basename + '.index')
+        self.index = {}
+        self.end = len(archive_magic)
+        if not os.path.exists(filename):
+            with open(filename, 'wb') as fh:
+                fh.write(archive_magic)
+                fh.flush()
+                os.fsync(fh.fileno())
+            if os.path.exists(self.index_filename):
+                os.remove(self.index_filename)
+        else:
+            with open(filename, 'rb') as fh:
+                if fh.read(len(archive_magic)) != archive_magic:
+                    raise ValueError(f'File {filename} is not an experiment archive')
+        self.load_index()
+
+    def load_index(self):
+        """
+        Loads the index file, and recovers any records in the archive which are missing from it.
+        """
+        archive_size = os.path.getsize(self.filename)
+        index_valid = os.path.exists(self.index_filename)
+        if index_valid:
+            with open(self.index_filename) as fh:
+                for line in fh:
+                    try:
+                        name, offset, end = json.loads(line)
+                    except ValueError:
+                        index_valid = False
+                        break
+                    if end > archive_size:
+                        index_valid = False
+                        break
+                    self.index[name] = (offset, end)
+                    self.end = max(self.end, end)
+
+        indexed_end = self.end
+        self.scan()
+        if not index_valid or self.end != indexed_end:
+            self.write_index()
+
+    def scan(self):
+        """
+        Reads records from the end of the indexed part of the archive, stopping at the end of the file or at the first incomplete or corrupted record.
+        """
+        archive_size = os.path.getsize(self.filename)
+        with open(self.filename, 'rb') as fh:
+            while self.end + record_prefix.size <= archive_size:
+                fh.seek(self.end)
+                magic, header_length, payload_length, checksum = \
+                    record_prefix.unpack(fh.read(record_prefix.size))
+                record_end = self.end + record_prefix.size + \
+                    header_length + payload_length
+                if magic != record_magic or record_end > archive_size:
+                    break
+                header_bytes = fh.read(header_length)
+                payload = fh.read(payload_length)
+                if zlib.crc32(header_bytes + payload) != checksum:
+                    break
+                header = json.loads(header_bytes.decode())
+                self.index[header['name']] = (self.end, record_end)
+                self.end = record_end
+
+    def write_index(self):
+        entries = sorted(self.index.items(), key=lambda x: x[1][0])
+        temporary_filename = self.index_filename + '.tmp'
+        with open(temporary_filename, 'w') as fh:
+            for name, (offset, end) in entries:
+                fh.write(json.dumps([name, offset, end]) + '\n')
+        os.replace(temporary_filename, self.index_filename)
+
+    def names(self):
+        """
+        Names of all datasets in the archive, in the order they were written
+        """
+        return [name for name, _ in \
+                sorted(self.index.items(), key=lambda x: x[1][0])]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def append(self, name, data, metadata):
+        """
+        Appends a dataset to the archive
+
+        :param name: Name of the condition
+        :param data: pandas DataFrame to store
+        :param metadata: Dictionary of metadata to store with the data
+        """
+        payload, columns = frame_to_bytes(data)
+        header = {
+            'name': name,
+            'metadata': dict_to_string(metadata),
+            'columns': columns}
+        header_bytes = json.dumps(header).encode()
+        checksum = zlib.crc32(header_bytes + payload)
+        prefix = record_prefix.pack(
+                record_magic, len(header_bytes), len(payload), checksum)
+
+        with open(self.filename, 'r+b') as fh:
+            fh.truncate(self.end) # Discard anything left by an interrupted write
+            fh.seek(self.end)
+            fh.write(prefix + header_bytes + payload)
+            fh.flush()
+            os.fsync(fh.fileno())
+            record_end = fh.tell()
+
+        offset = self.end
+        self.index[name] = (offset, record_end)
+        self.end = record_end
+        with open(self.index_filename, 'a') as fh:
+            fh.write(json.dumps([name, offset, record_end]) + '\n')
+
+    def read_metadata(self, name):
+        """
+        Reads the metadata of a single dataset from the archive without reading the data
+
+        :param name: Name of the condition
+        """
+        if name not in self.index:
+            raise KeyError(f'{name} not found in archive {self.filename}')
+        offset, end = self.index[name]
+        with open(self.filename, 'rb') as fh:
+            fh.seek(offset)
+            magic, header_length, payload_length, checksum = \
+                record_prefix.unpack(fh.read(record_prefix.size))
+            header = json.loads(fh.read(header_length).decode())
+        return string_to_dict(header['metadata'])
+
+    def read(self, name, columns=None):
+        """
+        Reads a single dataset from the archive
+
+        :param name: Name of the condition
+        :param columns: Names or units of the columns to read. If given, only the bytes of the requested columns are read, and the record checksum is not verified.
+        :returns (data, metadata): The stored DataFrame and its metadata
+        """
+        if name not in self.index:
+            raise KeyError(f'{name} not found in archive {self.filename}')
+        if columns is not None:
+            return self.read_columns(name, columns)
+        offset, end = self.index[name]
+        with open(self.filename, 'rb') as fh:
+            fh.seek(offset)
+            record = fh.read(end - offset)
+        magic, header_length, payload_length, checksum = \
+            record_prefix.unpack(record[:record_prefix.size])
+        body = record[record_prefix.size:]
+        if magic != record_magic or zlib.crc32(body) != checksum:
+            raise ValueError(f'Record {name} in archive {self.filename} is corrupted')
+        header = json.loads(body[:header_length].decode())
+        data = frame_from_bytes(body[header_length:], header['columns'])
+        metadata = string_to_dict(header['metadata'])
+        return data, metadata
+
+    def read_columns(self, name, columns):
+        offset, end = self.index[name]
+        with open(self.filename, 'rb') as fh:
+            fh.seek(offset)
+            magic, header_length, payload_length, checksum = \
+                record_prefix.unpack(fh.read(record_prefix.size))
+            if magic != record_magic:
+                raise ValueError(f'Record {name} in archive {self.filename} is corrupted')
+            header = json.loads(fh.read(header_length).decode())
+            payload_offset = offset + record_prefix.size + header_length
+            locations = {c[0]: c for c in header['columns']}
+            selected = select_columns(list(locations.keys()), columns)
+            data = {}
+            for column in selected:
+                _, start, length = locations[column]
+                fh.seek(payload_offset + start)
+                data[column] = np.lib.format.read_array(
+                        io.BytesIO(fh.read(length)))
+        metadata = string_to_dict(header['metadata'])
+        return pd.DataFrame(data, columns=selected), metadata
@@ -0,0 +1,229 @@
+"""
+Conversion of experiment data to and from Apache Arrow tables. Numeric columns are shared with the original arrays rather than copied, factor columns are dictionary-encoded, and units are stored in the metadata of each field.
+"""
+import numpy as np
+import pandas as pd
+import pint
+from sciparse import dict_to_string, string_to_dict, is_scalar
+from xsugar import ureg
+from xsugar.source.columns import column_unit
+from xsugar.source.storage import pa, require_pyarrow, metadata_key
+
+layout_key = b'xsugar_layout'
+role_key = b'xsugar_role'
+unit_key = b'unit'
+
+def field_metadata(role=None, unit=''):
+    metadata = {}
+    if role is not None:
+        metadata[role_key] = role.encode()
+    if unit:
+        metadata[unit_key] = unit.encode()
+    return metadata
+
+def factor_dictionary(values):
+    """
+    Builds the dictionary of a dictionary-encoded factor column from the level of the factor in each condition. Quantities are converted to the units of the first quantity.
+
+    :param values: List of factor levels, with None where the factor is missing
+    :returns (dictionary, indices, unit): pyarrow array of unique levels, list of the index of each level in the dictionary (or None), and the unit of the levels
+    """
+    present_values = [v for v in values if v is not None]
+    unit = ''
+    if present_values and \
+            all(isinstance(v, pint.Quantity) for v in present_values):
+        units = present_values[0].units
+        unit = str(units)
+        values = [None if v is None else v.to(units).magnitude for v in values]
+    elif not all(isinstance(v, (int, float, np.number)) \
+                 for v in present_values):
+        values = [None if v is None else str(v) for v in values]
+
+    unique_values = {}
+    indices = []
+    for value in values:
+        if value is None:
+            indices.append(None)
+        else:
+            indices.append(unique_values.setdefault(value, len(unique_values)))
+    return pa.array(list(unique_values.keys())), indices, unit
+
+def dictionary_chunk(index, length, dictionary):
+    """
+    Creates a dictionary-encoded array with a single repeated value
+
+    :param index: Index of the value in the dictionary, or None for nulls
+    :param length: Length of the array
+    :param dictionary: pyarrow array of values
+    """
+    if index is None:
+        indices = pa.nulls(length, pa.int32())
+    else:
+        indices = pa.array(np.full(length, index, dtype=np.int32))
+    return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+def table_from_data_dict(data_dict, conditions, metadata={}):
+    """
+    Converts a dictionary of named data into a single Arrow table, with one dictionary-encoded column for the condition name and one for each factor. Each DataFrame becomes one chunk of the table, so numeric columns are not copied. Dictionaries of scalars become one row per condition.
+
+    :param data_dict: Dictionary of name: DataFrame or name: scalar
+    :param conditions: Dictionary of name: condition, without metadata
+    :param metadata: Dictionary of experiment metadata to store in the schema
+    """
+    require_pyarrow()
+    names = list(data_dict.keys())
+    values = list(data_dict.values())
+    if all(isinstance(v, pd.DataFrame) for v in values):
+        layout = 'data'
+        lengths = [len(v) for v in values]
+    elif all(is_scalar(v) for v in values):
+        layout = 'scalar'
+        lengths = [1 for v in values]
+    else:
+        raise ValueError('Can only convert data dictionaries containing only DataFrames or only scalars to Arrow')
+
+    fields = []
+    columns = []
+    name_dictionary = pa.array(names)
+    fields.append(pa.field('condition',
+        pa.dictionary(pa.int32(), name_dictionary.type),
+        metadata=field_metadata('condition')))
+    columns.append(pa.chunked_array([
+        dictionary_chunk(i, length, name_dictionary) \
+        for i, length in enumerate(lengths)]))
+
+    factors = []
+    for name in names:
+        factors += [f for f in conditions[name].keys() if f not in factors]
+    for factor in factors:
+        dictionary, indices, unit = factor_dictionary(
+            [conditions[name].get(factor, None) for name in names])
+        fields.append(pa.field(factor,
+            pa.dictionary(pa.int32(), dictionary.type),
+            metadata=field_metadata('factor', unit)))
+        columns.append(pa.chunked_array([
+            dictionary_chunk(index, length, dictionary) \
+            for index, length in zip(indices, lengths)]))
+
+    if layout == 'data':
+        data_columns = list(values[0].columns)
+        for frame in values:
+            if list(frame.columns) != data_columns:
+                raise ValueError(f'All DataFrames must have the same columns to convert to Arrow. Found {list(frame.columns)} and {data_columns}')
+        for column in data_columns:
+            chunks = [pa.Array.from_pandas(frame[column]) for frame in values]
+            fields.append(pa.field(str(column), chunks[0].type,
+                metadata=field_metadata('data', column_unit(column))))
+            columns.append(pa.chunked_array(chunks, type=chunks[0].type))
+    else:
+        magnitudes, units = stack_values(values)
+        array = pa.array(magnitudes)
+        fields.append(pa.field('Value', array.type,
+            metadata=field_metadata('data', units)))
+        columns.append(pa.chunked_array([array]))
+
+    schema = pa.schema(fields, metadata={
+        layout_key: layout.encode(),
+        metadata_key: dict_to_string(metadata).encode()})
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def stack_values(values):
+    if isinstance(values[0], pint.Quantity):
+        units = values[0].units
+        return np.array([v.to(units).magnitude for v in values]), str(units)
+    return np.array(values), ''
+
+def table_from_master(frame, factor_columns, metadata={}):
+    """
+    Converts a master table (i.e. from master_data or tidy_data) into an Arrow table. Factor columns are dictionary-encoded, and numeric columns are not copied.
+
+    :param frame: pandas DataFrame
+    :param factor_columns: Names of the columns containing factors
+    :param metadata: Dictionary of experiment metadata to store in the schema
+    """
+    require_pyarrow()
+    fields = []
+    columns = []
+    for column in frame.columns:
+        array = pa.Array.from_pandas(frame[column])
+        if column in factor_columns:
+            array = array.dictionary_encode()
+            role = 'factor'
+        else:
+            role = 'data'
+        fields.append(pa.field(str(column), array.type,
+            metadata=field_metadata(role, column_unit(column))))
+        columns.append(array)
+    schema = pa.schema(fields, metadata={
+        layout_key: b'master',
+        metadata_key: dict_to_string(metadata).encode()})
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def field_role(field):
+    if field.metadata is None:
+        return None
+    role = field.metadata.get(role_key, None)
+    return role.decode() if role is not None else None
+
+def decode_factor(series):
+    if pd.api.types.is_categorical_dtype(series.dtype):
+        return series.astype(series.cat.categories.dtype)
+    return series
+
+def data_from_table(table):
+    """
+    Converts an Arrow table created by table_from_data_dict or table_from_master back into a data dictionary or master table. Numeric columns without missing values are not copied. DataFrames without rows are kept as empty DataFrames with the same columns.
+
+    :param table: pyarrow Table
+    :returns data: Dictionary of name: DataFrame, dictionary of name: scalar, or a pandas DataFrame for master tables
+    """
+    require_pyarrow()
+    schema_metadata = table.schema.metadata or {}
+    layout = schema_metadata.get(layout_key, b'master').decode()
+    if layout == 'master':
+        frame = table.to_pandas(split_blocks=True)
+        for field in table.schema:
+            if field_role(field) == 'factor':
+                frame[field.name] = decode_factor(frame[field.name])
+        return frame
+
+    data_columns = [f.name for f in table.schema if field_role(f) == 'data']
+    conditions = table.column('condition').combine_chunks()
+    indices = conditions.indices.to_numpy(zero_copy_only=False)
+    names = conditions.dictionary.to_pylist()
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(indices)) + 1]) \
+        if len(indices) else np.array([], dtype=int)
+    ends = np.append(starts[1:], len(indices))
+
+    data_dict = {}
+    if layout == 'scalar':
+        field = table.schema.field('Value')
+        values = table.column('Value').to_numpy()
+        unit = (field.metadata or {}).get(unit_key, b'').decode()
+        for index, value in zip(indices, values):
+            data_dict[names[index]] = value * ureg.Unit(unit) if unit \
+                else value
+        return data_dict
+
+    data_table = table.select(data_columns)
+    for start, end in zip(starts, ends):
+        name = names[indices[start]]
+        frame = data_table.slice(start, end - start).to_pandas(
+            split_blocks=True)
+        if name in data_dict:
+            frame = pd.concat([data_dict[name], frame], ignore_index=True)
+        data_dict[name] = frame
+    empty_frame = data_table.slice(0, 0).to_pandas()
+    return {name: data_dict[name] if name in data_dict else empty_frame.copy() \
+            for name in names}
+
+def metadata_from_table(table):
+    """
+    Gets the experiment metadata stored in an Arrow table
+
+    :param table: pyarrow Table
+    """
+    schema_metadata = table.schema.metadata or {}
+    if metadata_key in schema_metadata:
+        return string_to_dict(schema_metadata[metadata_key].decode())
+    return {}
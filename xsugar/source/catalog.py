@@ -0,0 +1,414 @@
+"""
+SQLite catalog of all the experiments under a base path, for finding conditions across experiments without opening each experiment
+"""
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+import pint
+from sciparse import is_scalar, title_to_quantity
+from xsugar import ureg
+from xsugar.source.conditions import condition_from_name, condition_matches
+from xsugar.source.columns import column_unit
+from xsugar.source.compression import strip_compression_extension
+from xsugar.source.storage import storage_from_filename, file_size
+from xsugar.source.archive import ExperimentArchive, archive_extension
+from xsugar.source.manifest import ExperimentManifest, manifest_suffix
+
+catalog_filename = '_catalog.sqlite'
+
+catalog_schema = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    UNIQUE (kind, name));
+CREATE TABLE IF NOT EXISTS conditions (
+    id INTEGER PRIMARY KEY,
+    experiment_id INTEGER NOT NULL REFERENCES experiments (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    file TEXT NOT NULL,
+    format TEXT,
+    rows INTEGER,
+    size INTEGER,
+    UNIQUE (experiment_id, name));
+CREATE TABLE IF NOT EXISTS factors (
+    condition_id INTEGER NOT NULL REFERENCES conditions (id) ON DELETE CASCADE,
+    factor TEXT NOT NULL,
+    value REAL,
+    text TEXT,
+    unit TEXT);
+CREATE TABLE IF NOT EXISTS columns (
+    condition_id INTEGER NOT NULL REFERENCES conditions (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    unit TEXT,
+    mean REAL,
+    minimum REAL,
+    maximum REAL);
+CREATE INDEX IF NOT EXISTS factor_value_index ON factors (factor, value);
+CREATE INDEX IF NOT EXISTS factor_text_index ON factors (factor, text);
+CREATE INDEX IF NOT EXISTS factor_condition_index ON factors (condition_id);
+CREATE INDEX IF NOT EXISTS column_condition_index ON columns (condition_id);
+"""
+
+def factor_value(value):
+    """
+    Converts the value of a factor into the form stored in the catalog. Quantities are stored in base SI units so they can be compared regardless of the unit they were saved in.
+
+    :param value: Value of the factor
+    :returns (value, text, unit): Numeric value (or None), text value (or None), and the unit the value was saved in
+    """
+    if isinstance(value, pint.Quantity):
+        return float(value.to_base_units().magnitude), None, str(value.units)
+    elif isinstance(value, (int, float, np.number)) and \
+            not isinstance(value, bool):
+        return float(value), None, ''
+    else:
+        return None, str(value), ''
+
+def filter_value(value, unit=''):
+    """
+    Converts the value of a factor filter into the form stored in the catalog. Plain numbers are taken to be in the given unit.
+
+    :param value: Value of the filter
+    :param unit: Unit a factor level was saved in, or an empty string if it has no units
+    :returns (value, text, unit): See factor_value
+    """
+    if unit and isinstance(value, (int, float, np.number)) and \
+            not isinstance(value, bool):
+        value = ureg.Quantity(value, unit)
+    return factor_value(value)
+
+def column_statistics(data, value_name='Value'):
+    """
+    Computes the unit, mean, minimum, and maximum of each numeric column of a dataset
+
+    :param data: pandas DataFrame or scalar
+    :param value_name: Name of the column used for scalar data
+    :returns statistics: List of (name, unit, mean, minimum, maximum)
+    """
+    if isinstance(data, pd.DataFrame):
+        statistics = []
+        for name in data.columns:
+            values = data[name].to_numpy()
+            if not np.issubdtype(values.dtype, np.number) or len(values) == 0:
+                continue
+            statistics.append((str(name), column_unit(name),
+                               float(np.nanmean(values)),
+                               float(np.nanmin(values)),
+                               float(np.nanmax(values))))
+        return statistics
+    elif is_scalar(data):
+        if isinstance(data, pint.Quantity):
+            unit = str(data.units)
+            value = float(data.magnitude)
+        else:
+            unit = ''
+            value = float(data)
+        return [(value_name, unit, value, value, value)]
+    return []
+
+def summary_statistics(statistics):
+    """
+    Converts the summary statistics stored in a manifest entry into the column statistics stored in the catalog
+
+    :param statistics: Dictionary of column name: dictionary of statistic: value, as computed by column_summary
+    :returns statistics: List of (name, unit, mean, minimum, maximum)
+    """
+    return [(name, column_unit(name), s['mean'], s['min'], s['max']) \
+            for name, s in statistics.items()]
+
+def results_conditions(filename, experiment, major_separator='~',
+                       minor_separator='='):
+    """
+    Reads the conditions and values saved in the scalar results file of an experiment
+
+    :param filename: Full filename of the results file
+    :param experiment: Name of the experiment
+    :returns (conditions, value_name): List of (condition name, value) with one entry per row of the file, and the name of the value column
+    """
+    with open(filename) as fh:
+        fh.readline()
+        data = pd.read_csv(fh)
+    value_name = str(data.columns[-1])
+    value_unit = column_unit(value_name)
+    factors = []
+    for title in data.columns[:-1]:
+        unit = column_unit(title)
+        factor = title_to_quantity(title, return_name=True)[1] \
+            if unit else str(title)
+        factors.append((factor, title, unit))
+    factors.sort()
+    columns = {title: data[title].tolist() for title in data.columns}
+    conditions = []
+    for i in range(len(data)):
+        name = experiment
+        for factor, title, unit in factors:
+            value = columns[title][i]
+            if unit:
+                value = '{:~}'.format(value * ureg.Unit(unit)).replace(' ', '')
+            name += major_separator + factor + minor_separator + str(value)
+        value = columns[value_name][i]
+        if value_unit:
+            value = value * ureg.Unit(value_unit)
+        conditions.append((name, value))
+    return conditions, value_name
+
+class ExperimentCatalog:
+    """
+    SQLite database indexing the experiments, conditions, factor levels, files, and column statistics of all experiments stored under base_path/data/<kind>/<name>/. It is updated by saveRawResults for experiments created with a catalog, and can be rebuilt from the files on disk with rescan.
+
+    :param base_path: The base path containing the data of all experiments
+    :param filename: Full filename of the database. Defaults to base_path/data/_catalog.sqlite
+    """
+    def __init__(self, base_path, filename=None):
+        self.base_path = base_path
+        self.data_path = os.path.join(base_path, 'data')
+        if filename is None:
+            os.makedirs(self.data_path, exist_ok=True)
+            filename = os.path.join(self.data_path, catalog_filename)
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(catalog_schema)
+
+    def close(self):
+        self.connection.close()
+
+    def experiment_id(self, kind, name, path):
+        cursor = self.connection.execute(
+            'SELECT id FROM experiments WHERE kind = ? AND name = ?',
+            (kind, name))
+        row = cursor.fetchone()
+        if row is not None:
+            return row[0]
+        cursor = self.connection.execute(
+            'INSERT INTO experiments (kind, name, path) VALUES (?, ?, ?)',
+            (kind, name, path))
+        return cursor.lastrowid
+
+    def add_condition(self, kind, experiment, path, name, cond, file,
+                      storage=None, data=None, size=None, value_name='Value',
+                      commit=True):
+        """
+        Adds a single condition to the catalog, replacing it if it already exists
+
+        :param kind: Kind of the experiment
+        :param experiment: Name of the experiment
+        :param path: Full path of the data directory of the experiment
+        :param name: Name of the condition
+        :param cond: Condition as a dictionary of factor: level, without metadata
+        :param file: Filename containing the data of the condition, relative to the data directory
+        :param storage: Storage format of the file
+        :param data: The data of the condition, used to compute the number of rows and the column statistics
+        :param size: Size of the data on disk in bytes
+        :param value_name: Name of the column used for scalar data
+        :param commit: Whether to commit the change to the database immediately
+        """
+        experiment_id = self.experiment_id(kind, experiment, path)
+        self.connection.execute(
+            'DELETE FROM conditions WHERE experiment_id = ? AND name = ?',
+            (experiment_id, name))
+        rows = len(data) if isinstance(data, (pd.DataFrame, np.ndarray)) \
+            else None
+        statistics = [] if data is None else \
+            column_statistics(data, value_name=value_name)
+        self.insert_condition(experiment_id, name, cond, file, storage,
+                              rows, size, statistics)
+        if commit:
+            self.connection.commit()
+
+    def insert_condition(self, experiment_id, name, cond, file, storage,
+                         rows, size, statistics):
+        cursor = self.connection.execute(
+            'INSERT INTO conditions (experiment_id, name, file, format, rows, size) VALUES (?, ?, ?, ?, ?, ?)',
+            (experiment_id, name, file, storage, rows, size))
+        condition_id = cursor.lastrowid
+        self.connection.executemany(
+            'INSERT INTO factors (condition_id, factor, value, text, unit) VALUES (?, ?, ?, ?, ?)',
+            [(condition_id, factor) + factor_value(value) \
+             for factor, value in cond.items()])
+        self.connection.executemany(
+            'INSERT INTO columns (condition_id, name, unit, mean, minimum, maximum) VALUES (?, ?, ?, ?, ?, ?)',
+            [(condition_id,) + s for s in statistics])
+
+    def rescan(self):
+        """
+        Rebuilds the catalog from the experiments on disk. Experiments with a manifest are indexed from it without opening their data files, including the column statistics stored in the manifest, otherwise only their filenames and sizes are indexed. Scalar results files are read, and each of their rows is indexed as a condition, as saveRawResults does.
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM experiments')
+            if not os.path.isdir(self.data_path):
+                return
+            for kind in sorted(os.listdir(self.data_path)):
+                kind_path = os.path.join(self.data_path, kind)
+                if kind.startswith(('.', '_')) or not os.path.isdir(kind_path):
+                    continue
+                for experiment in sorted(os.listdir(kind_path)):
+                    path = os.path.join(kind_path, experiment) + '/'
+                    if experiment.startswith(('.', '_')) or \
+                            not os.path.isdir(path):
+                        continue
+                    self.scan_experiment(kind, experiment, path)
+
+    def scan_experiment(self, kind, experiment, path):
+        manifest_filename = path + '_' + experiment + manifest_suffix
+        if os.path.exists(manifest_filename):
+            entries = ExperimentManifest(manifest_filename).entries.values()
+            files = [(e['name'], e['file'], e['format'], e['rows'], e['size'],
+                      summary_statistics(e.get('statistics', None) or {})) \
+                     for e in entries]
+        else:
+            files = []
+            for fn in sorted(os.listdir(path)):
+                if fn.startswith(('.', '_')) or not fn.startswith(experiment):
+                    continue
+                if fn == experiment + archive_extension:
+                    archive = ExperimentArchive(path + fn)
+                    files += [(name, fn, 'archive', None, end - offset, []) \
+                              for name, (offset, end) in archive.index.items()]
+                else:
+                    name = os.path.splitext(strip_compression_extension(fn))[0]
+                    files.append((name, fn, storage_from_filename(fn),
+                                  None, file_size(path + fn), []))
+
+        experiment_id = self.experiment_id(kind, experiment, path)
+        for name, fn, storage, rows, size, statistics in files:
+            if name == experiment and rows is None and \
+                    os.path.exists(path + fn):
+                conditions, value_name = results_conditions(
+                        path + fn, experiment)
+                for name, value in conditions:
+                    self.add_condition(
+                            kind, experiment, path, name,
+                            condition_from_name(name, full_condition=False),
+                            fn, storage='csv', data=value,
+                            value_name=value_name, commit=False)
+                continue
+            cond = condition_from_name(name, full_condition=False)
+            self.insert_condition(experiment_id, name, cond, fn, storage,
+                                  rows, size, statistics)
+
+    def query(self, kind=None, experiment=None, **factor_filters):
+        """
+        Finds the conditions matching a set of factor filters across all experiments
+
+        :param kind: Only return conditions from experiments of this kind
+        :param experiment: Only return conditions from the experiment with this name
+        :param factor_filters: Filters on factor levels, i.e. temperature=25, wavelength=(700*ureg.nm, 800*ureg.nm). Plain numbers are in the units the factor was saved in. Exact values, (lower, upper) ranges, and lists of values are evaluated by the database. Functions are applied to the matching conditions afterwards. See condition_matches.
+        :returns conditions: List of dictionaries with the kind, experiment, name, file, full filename, format, rows, and size of each matching condition
+        """
+        clauses = []
+        parameters = []
+        if kind is not None:
+            clauses.append('e.kind = ?')
+            parameters.append(kind)
+        if experiment is not None:
+            clauses.append('e.name = ?')
+            parameters.append(experiment)
+        python_filters = {}
+        for factor, value_filter in factor_filters.items():
+            if callable(value_filter) and \
+                    not isinstance(value_filter, pint.Quantity):
+                python_filters[factor] = value_filter
+                clause, clause_parameters = '1', []
+            else:
+                clause, clause_parameters = self.factor_clause(
+                        factor, value_filter)
+            clauses.append('EXISTS (SELECT 1 FROM factors f WHERE f.condition_id = c.id AND f.factor = ? AND (' + clause + '))')
+            parameters += [factor] + clause_parameters
+
+        sql = 'SELECT e.kind, e.name, e.path, c.name, c.file, c.format, c.rows, c.size FROM conditions c JOIN experiments e ON c.experiment_id = e.id'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY e.kind, e.name, c.name'
+
+        conditions = []
+        for kind, experiment, path, name, fn, storage, rows, size in \
+                self.connection.execute(sql, parameters):
+            if python_filters and not condition_matches(
+                    condition_from_name(name, full_condition=False),
+                    python_filters):
+                continue
+            conditions.append({
+                'kind': kind, 'experiment': experiment, 'name': name,
+                'file': fn, 'filename': path + fn, 'format': storage,
+                'rows': rows, 'size': size})
+        return conditions
+
+    def factor_clause(self, factor, value_filter):
+        """
+        Builds the SQL clause of a filter on one factor. Plain numbers are compared in the units each level of the factor was saved in, so the clause is repeated for each of those units.
+
+        :param factor: Name of the factor
+        :param value_filter: Exact value, (lower, upper) range, or list of values
+        :returns (clause, parameters): SQL clause on the factors table "f", and its parameters
+        """
+        units = [row[0] for row in self.connection.execute(
+            'SELECT DISTINCT unit FROM factors WHERE factor = ?', (factor,))]
+        clauses = []
+        parameters = []
+        for unit in units:
+            clause, clause_parameters = self.filter_clause(value_filter, unit)
+            clauses.append('(f.unit = ? AND (' + clause + '))')
+            parameters += [unit] + clause_parameters
+        if not clauses:
+            return '0', []
+        return ' OR '.join(clauses), parameters
+
+    def filter_clause(self, value_filter, unit=''):
+        if isinstance(value_filter, tuple):
+            lower, upper = value_filter
+            clauses = []
+            parameters = []
+            if lower is not None:
+                clauses.append('f.value >= ?')
+                parameters.append(filter_value(lower, unit)[0])
+            if upper is not None:
+                clauses.append('f.value <= ?')
+                parameters.append(filter_value(upper, unit)[0])
+            if not clauses:
+                return 'f.value IS NOT NULL', []
+            return ' AND '.join(clauses), parameters
+        elif isinstance(value_filter, (list, set)):
+            clauses = []
+            parameters = []
+            for value in value_filter:
+                clause, clause_parameters = self.filter_clause(value, unit)
+                clauses.append('(' + clause + ')')
+                parameters += clause_parameters
+            if not clauses:
+                return '0', []
+            return ' OR '.join(clauses), parameters
+        else:
+            value, text, _ = filter_value(value_filter, unit)
+            if value is None:
+                return 'f.text = ?', [text]
+            tolerance = 1e-9 * abs(value)
+            return 'f.value BETWEEN ? AND ?', [value - tolerance, value + tolerance]
+
+    def open_experiments(self, kind=None, experiment=None, parser=None,
+                         **factor_filters):
+        """
+        Opens the experiments containing conditions which match a set of filters. Each experiment is opened from its manifest, only contains the matching conditions, and only loads their data when it is accessed. The data of conditions which do not match is never read.
+
+        :param kind: Only open experiments of this kind
+        :param experiment: Only open the experiment with this name
+        :param parser: data loading function which returns a pandas DataFrame from a raw file of data. By default the parser is chosen from the file extension.
+        :param factor_filters: Filters on factor levels. See query.
+        :returns experiments: List of Experiments
+        """
+        from xsugar.source.experiments import Experiment
+        matching_names = {}
+        for condition in self.query(kind=kind, experiment=experiment,
+                                    **factor_filters):
+            key = (condition['kind'], condition['experiment'])
+            matching_names.setdefault(key, set()).add(condition['name'])
+
+        experiments = []
+        for (kind, name), names in matching_names.items():
+            experiments.append(Experiment.open(
+                name, kind, base_path=self.base_path, parser=parser,
+                names=names))
+        return experiments
@@ -0,0 +1,82 @@
+"""
+Selection of the columns of raw data by name or by unit
+"""
+import pint
+from sciparse import title_to_quantity
+from xsugar import ureg
+
+def select_columns(column_names, columns):
+    """
+    Selects columns by name or by unit. Units are matched with the same semantics as sciparse's column_from_unit: the first column whose unit (from a name of the form "Name (unit)") has the same dimensions as the requested unit is selected.
+
+    :param column_names: Names of the available columns
+    :param columns: List of column names, units (i.e. ureg.mV), or unit strings (i.e. "mV")
+    :returns selected: List of selected column names in the requested order
+    """
+    column_names = [str(c) for c in column_names]
+    selected = []
+    for column in columns:
+        if isinstance(column, str) and column in column_names:
+            name = column
+        else:
+            name = column_name_from_unit(column_names, column)
+        if name not in selected:
+            selected.append(name)
+    return selected
+
+def column_name_from_unit(column_names, unit):
+    if isinstance(unit, pint.Quantity):
+        unit = unit.units
+    try:
+        dimensionality = (1 * ureg.Unit(unit)).dimensionality
+    except (pint.errors.UndefinedUnitError, pint.errors.DefinitionSyntaxError,
+            TypeError, ValueError):
+        raise ValueError(f'Column {unit} not found. Available columns are {column_names}')
+    for name in column_names:
+        unit_string = column_unit(name)
+        if unit_string and \
+                ureg.Unit(unit_string).dimensionality == dimensionality:
+            return name
+    raise ValueError(f'No column with unit {unit} found. Available columns are {column_names}')
+
+def column_unit(column):
+    """
+    Gets the unit from a column name of the form "Name (unit)" as a string, or an empty string if it has no recognizable unit
+
+    :param column: Column name
+    """
+    try:
+        quantity = title_to_quantity(str(column))
+    except (pint.errors.UndefinedUnitError, pint.errors.DefinitionSyntaxError):
+        return ''
+    if quantity.dimensionless:
+        return ''
+    return str(quantity.units)
+
+def array_column_names(shape, columns=None, units=None):
+    """
+    Generates the column names of a numpy array of raw data from the names and units of its columns. Names which already contain a unit (i.e. "Voltage (mV)") are used as-is if no units are given.
+
+    :param shape: Shape of the array
+    :param columns: List of column names, or a single name for a 1D array. If None, the columns are unnamed.
+    :param units: List of units (as strings or pint units) of each column, or a single unit for a 1D array.
+    :returns column_names: List of column names, or None if the columns are unnamed
+    """
+    if columns is None:
+        if units is not None:
+            raise ValueError('Column units were given without column names')
+        return None
+    if isinstance(columns, str):
+        columns = [columns]
+    if isinstance(units, (str, pint.Unit)):
+        units = [units]
+    columns = [str(c) for c in columns]
+    column_count = shape[1] if len(shape) > 1 else 1
+    if len(shape) > 2 or len(columns) != column_count:
+        raise ValueError(f'Cannot name the columns of an array with shape {shape} with {columns}')
+    if units is None:
+        return columns
+    if len(units) != len(columns):
+        raise ValueError(f'Got {len(units)} units for {len(columns)} columns')
+    return [f'{c} ({ureg.Unit(u):~})' if str(u) else c \
+            for c, u in zip(columns, units)]
@@ -0,0 +1,90 @@
+"""
+Transparent compression of raw data files. Compressed files are read and written as streams, so they are never fully decompressed in memory.
+"""
+import os
+import gzip
+import bz2
+import lzma
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compression_formats = {
+    'gzip': '.gz',
+    'bz2': '.bz2',
+    'xz': '.xz',
+    'zstd': '.zst',
+}
+
+def require_zstandard():
+    if zstandard is None:
+        raise ImportError('zstandard is required for zstd compression. Install it with "pip install zstandard"')
+
+def compression_from_filename(filename):
+    """
+    Gets the compression of a file from its extension, or None if it is not compressed
+
+    :param filename: Name of the file
+    """
+    extension = os.path.splitext(filename)[1]
+    for compression, compression_extension in compression_formats.items():
+        if extension == compression_extension:
+            return compression
+    return None
+
+def strip_compression_extension(filename):
+    """
+    Removes the compression extension from a filename, i.e. TEST1~a=1.csv.gz becomes TEST1~a=1.csv
+
+    :param filename: Name of the file
+    """
+    if compression_from_filename(filename) is None:
+        return filename
+    return os.path.splitext(filename)[0]
+
+def open_compressed(filename, mode='rt', compression='infer'):
+    """
+    Opens a file, compressing or decompressing it as a stream
+
+    :param filename: Name of the file
+    :param mode: Mode to open the file in, i.e. "rt", "wt", "rb", "wb"
+    :param compression: Compression format, None for no compression, or "infer" to choose it from the file extension
+    """
+    if compression == 'infer':
+        compression = compression_from_filename(filename)
+    if compression is None:
+        return open(filename, mode)
+    elif compression == 'gzip':
+        return gzip.open(filename, mode)
+    elif compression == 'bz2':
+        return bz2.open(filename, mode)
+    elif compression == 'xz':
+        return lzma.open(filename, mode)
+    elif compression == 'zstd':
+        require_zstandard()
+        return zstandard.open(filename, mode)
+    else:
+        raise ValueError(f'Compression {compression} not recognized. Available compression formats are {list(compression_formats.keys())}')
+
+@contextmanager
+def decompressed_copy(filename):
+    """
+    Decompresses a file into a temporary file, for parsers which can only read from a filename. The temporary file is removed afterwards.
+
+    :param filename: Name of the compressed file
+    :returns temporary_filename: Name of the decompressed temporary file
+    """
+    extension = os.path.splitext(strip_compression_extension(filename))[1]
+    fd, temporary_filename = tempfile.mkstemp(suffix=extension)
+    try:
+        with open_compressed(filename, 'rb') as source, \
+                os.fdopen(fd, 'wb') as destination:
+            shutil.copyfileobj(source, destination)
+        yield temporary_filename
+    finally:
+        os.remove(temporary_filename)
@@ -1,6 +1,9 @@
 from xsugar import ureg
 import copy
 import pint
+import numpy as np
+
+removed_metadata_key = '_removed'
 
 def factors_from_condition(cond):
     factors = [x for x in cond.keys()]
@@ -42,6 +45,132 @@ def condition_is_subset(subset_cond, superset_cond):
     is_subset = all(item in superset_items for item in subset_items)
     return is_subset
 
+def filter_level(level, value):
+    """
+    Converts a level given in a filter to the units of the value of a factor. Plain numbers are taken to be in the units of the value.
+
+    :param level: Level given in the filter
+    :param value: Value of the factor
+    """
+    if isinstance(value, pint.Quantity) and \
+            isinstance(level, (int, float, np.number)) and \
+            not isinstance(level, bool):
+        return level * value.units
+    return level
+
+def value_matches(value, value_filter):
+    """
+    Checks whether a single value of a factor matches a filter. Plain numbers in the filter are in the units of the value, and values which cannot be compared with the filter (i.e. text compared with a range of numbers) do not match.
+
+    :param value: Value of the factor
+    :param value_filter: Exact value, tuple (lower, upper) giving an inclusive range (either may be None), list or set of allowed values, or a function which takes the value and returns True or False
+    """
+    if callable(value_filter) and not isinstance(value_filter, pint.Quantity):
+        return bool(value_filter(value))
+    try:
+        if isinstance(value_filter, tuple):
+            lower, upper = value_filter
+            if lower is not None and value < filter_level(lower, value):
+                return False
+            if upper is not None and value > filter_level(upper, value):
+                return False
+            return True
+        elif isinstance(value_filter, (list, set)):
+            return any(value_matches(value, level) for level in value_filter)
+        else:
+            return bool(value == filter_level(value_filter, value))
+    except (TypeError, ValueError, pint.DimensionalityError):
+        return False
+
+def condition_matches(cond, condition_filter):
+    """
+    Checks whether a condition matches a filter
+
+    :param cond: Condition to check
+    :param condition_filter: Function which takes the condition and returns True or False, or a dictionary of factor: filter pairs which must all match. See value_matches for the available filters.
+    """
+    if condition_filter is None:
+        return True
+    if callable(condition_filter):
+        return bool(condition_filter(cond))
+    for factor, value_filter in condition_filter.items():
+        if factor not in cond.keys():
+            return False
+        if not value_matches(cond[factor], value_filter):
+            return False
+    return True
+
+def common_metadata(metadata_list):
+    """
+    Finds the metadata shared by every dictionary in a list of metadata, in a single pass over the list
+
+    :param metadata_list: List of metadata dictionaries
+    :returns common: Dictionary of the key-value pairs present in every dictionary
+    """
+    common = None
+    for metadata in metadata_list:
+        if common is None:
+            common = dict(metadata)
+        else:
+            common = {k: v for k, v in common.items() \
+                      if k in metadata and metadata[k] == v}
+    if common is None:
+        common = {}
+    return common
+
+def metadata_delta(metadata, base_metadata):
+    """
+    Finds the metadata which differs from a set of base metadata. Keys present in the base metadata but missing from the metadata are listed under removed_metadata_key.
+
+    :param metadata: Dictionary of metadata
+    :param base_metadata: Dictionary of base metadata, i.e. the metadata shared by the whole experiment
+    :returns delta: Dictionary of the key-value pairs not present in or different from the base metadata
+    """
+    delta = {k: v for k, v in metadata.items() \
+             if k not in base_metadata or not values_equal(base_metadata[k], v)}
+    removed_keys = [k for k in base_metadata.keys() if k not in metadata]
+    if removed_keys:
+        delta[removed_metadata_key] = removed_keys
+    return delta
+
+def apply_metadata_delta(base_metadata, delta):
+    """
+    Recovers the metadata of a dataset from the base metadata and its delta. The inverse of metadata_delta.
+
+    :param base_metadata: Dictionary of base metadata
+    :param delta: Dictionary of metadata which differs from the base metadata
+    """
+    removed_keys = delta.get(removed_metadata_key, [])
+    metadata = {k: v for k, v in base_metadata.items() \
+                if k not in removed_keys}
+    metadata.update({k: v for k, v in delta.items() \
+                     if k != removed_metadata_key})
+    return metadata
+
+def values_equal(first_value, second_value):
+    try:
+        return bool(first_value == second_value)
+    except (ValueError, pint.errors.DimensionalityError):
+        return False
+
+def constants_from_deltas(base_metadata, deltas):
+    """
+    Finds the metadata shared by every dataset, given the base metadata shared by the whole experiment and the metadata deltas of each dataset. Only the deltas are intersected, which are usually empty.
+
+    :param base_metadata: Dictionary of base metadata
+    :param deltas: List of dictionaries of metadata which differ from the base metadata
+    :returns common: Dictionary of the key-value pairs shared by every dataset
+    """
+    deltas = list(deltas)
+    overridden = set()
+    for delta in deltas:
+        overridden.update(delta.keys())
+        overridden.update(delta.get(removed_metadata_key, []))
+    common = {k: v for k, v in base_metadata.items() if k not in overridden}
+    common.update(common_metadata(
+        [apply_metadata_delta({}, delta) for delta in deltas]))
+    return common
+
 def condition_from_name(
         name, major_separator='~', minor_separator='=',
         metadata={}, constants={},
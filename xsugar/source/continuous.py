@@ -0,0 +1,182 @@
+"""
+Continuous acquisition of long records with bounded memory. Data is written into a preallocated ring buffer and saved to disk in numbered segments.
+"""
+import numpy as np
+import pandas as pd
+import pint
+from xsugar import ureg
+from xsugar.source.columns import column_unit
+
+class RingBuffer:
+    """
+    Preallocated buffer holding the most recent rows of a numeric record. Rows are identified by their absolute index since the start of the record.
+
+    :param capacity: Maximum number of rows held
+    :param columns: Number of columns of each row
+    :param dtype: dtype of the buffer
+    """
+    def __init__(self, capacity, columns, dtype=np.float64):
+        self.buffer = np.empty((capacity, columns), dtype=dtype)
+        self.capacity = capacity
+        self.total = 0
+
+    def append(self, values):
+        """
+        Adds rows to the buffer, overwriting the oldest rows once it is full
+
+        :param values: 2D array of rows
+        """
+        if len(values) > self.capacity:
+            self.total += len(values) - self.capacity
+            values = values[-self.capacity:]
+        start = self.total % self.capacity
+        first_rows = min(len(values), self.capacity - start)
+        self.buffer[start:start + first_rows] = values[:first_rows]
+        self.buffer[:len(values) - first_rows] = values[first_rows:]
+        self.total += len(values)
+
+    def first(self):
+        """
+        Absolute index of the oldest row still held
+        """
+        return max(self.total - self.capacity, 0)
+
+    def rows(self, start, end):
+        """
+        Gets rows by absolute index. The rows are a view of the buffer if they are contiguous in it, otherwise a copy.
+
+        :param start: Absolute index of the first row
+        :param end: Absolute index after the last row
+        """
+        if start < self.first() or end > self.total:
+            raise ValueError(f'Rows {start} to {end} are not in the buffer, which holds rows {self.first()} to {self.total}')
+        start_position = start % self.capacity
+        if start_position + end - start <= self.capacity:
+            return self.buffer[start_position:start_position + end - start]
+        return np.concatenate([self.buffer[start_position:],
+                               self.buffer[:(end % self.capacity)]])
+
+class ContinuousAcquisition:
+    """
+    Continuous acquisition at a fixed condition. Rows are collected in a RingBuffer of fixed size, and every segment_rows rows are saved as a numpy array with the condition plus a "segment" factor numbering the segments. Saved segments are dropped from memory and read back from disk when they are needed again.
+
+    :param exp: Experiment used to save the segments
+    :param cond: Condition of the acquisition, without the segment number
+    :param columns: Names of the columns of each row (i.e. ['Time (s)', 'Voltage (mV)']). The first column is used as the time when reading back data if it has units of time.
+    :param segment_rows: Number of rows in each saved segment
+    :param capacity: Number of rows held in memory. Must be at least segment_rows. Defaults to two segments.
+    :param sampling_frequency: Sampling frequency of the rows (as a pint Quantity, or in Hz), used instead of a time column when reading back data
+    """
+    def __init__(self, exp, cond, columns, segment_rows, capacity=None,
+                 sampling_frequency=None):
+        if capacity is None:
+            capacity = 2 * segment_rows
+        if capacity < segment_rows:
+            raise ValueError(f'Capacity ({capacity} rows) must be at least the segment size ({segment_rows} rows)')
+        self.exp = exp
+        self.cond = cond
+        self.columns = [str(c) for c in columns]
+        self.segment_rows = segment_rows
+        self.buffer = RingBuffer(capacity, len(self.columns))
+        if isinstance(sampling_frequency, pint.Quantity):
+            sampling_frequency = sampling_frequency.to(ureg.Hz).magnitude
+        self.sampling_frequency = sampling_frequency
+        self.flushed = 0
+        self.segments = []
+        self.segment = 0
+        while exp.nameFromCondition(self.segment_condition(self.segment)) \
+                in exp.get_manifest():
+            self.segment += 1
+
+    def segment_condition(self, segment):
+        return dict(self.cond, segment=segment)
+
+    def append(self, values):
+        """
+        Adds rows to the acquisition, saving a segment each time segment_rows rows have been collected
+
+        :param values: 2D numpy array or DataFrame of rows, or a 1D array for a single row
+        """
+        if isinstance(values, pd.DataFrame):
+            values = values.to_numpy()
+        values = np.asarray(values).reshape(-1, len(self.columns))
+        while len(values) > 0:
+            unflushed_rows = self.buffer.total - self.flushed
+            chunk_rows = self.segment_rows - unflushed_rows
+            self.buffer.append(values[:chunk_rows])
+            values = values[chunk_rows:]
+            if self.buffer.total - self.flushed >= self.segment_rows:
+                self.flush()
+
+    def flush(self):
+        """
+        Saves the rows collected since the last segment as a new segment
+        """
+        if self.buffer.total == self.flushed:
+            return
+        values = self.buffer.rows(self.flushed, self.buffer.total)
+        cond = self.segment_condition(self.segment)
+        name = self.exp.nameFromCondition(cond)
+        self.exp.saveRawResults(np.ascontiguousarray(values), cond,
+                                columns=self.columns)
+        self.exp.release_data(name)
+        self.segments.append((name, self.flushed, self.buffer.total))
+        self.flushed = self.buffer.total
+        self.segment += 1
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def rows(self, start):
+        """
+        Gets all rows from an absolute index to the latest row, from the buffer and, for rows which are no longer in the buffer, from the saved segments. Segments are read from disk each time and are not kept in memory.
+
+        :param start: Absolute index of the first row
+        """
+        start = max(start, 0)
+        blocks = []
+        for name, segment_start, segment_end in self.segments:
+            if segment_end > start and segment_start < self.buffer.first():
+                values = self.exp.saved_source(name).load_data()
+                blocks.append(values[max(start - segment_start, 0):
+                    min(segment_end, self.buffer.first()) - segment_start])
+        blocks.append(self.buffer.rows(
+            max(start, self.buffer.first()), self.buffer.total))
+        return np.concatenate(blocks)
+
+    def last(self, duration):
+        """
+        Reads back the most recent part of the record
+
+        :param duration: Duration to read, as a pint Quantity or in seconds
+        :returns data: DataFrame of the rows within duration of the latest row
+        """
+        if isinstance(duration, pint.Quantity):
+            duration = duration.to(ureg.s).magnitude
+        time_unit = column_unit(self.columns[0])
+        if self.sampling_frequency is not None:
+            values = self.rows(self.buffer.total -
+                               int(round(duration * self.sampling_frequency)))
+        elif time_unit and ureg.Unit(time_unit).dimensionality == \
+                ureg.s.dimensionality:
+            duration = (duration * ureg.s).to(time_unit).magnitude
+            start = self.buffer.first()
+            segment_starts = [s[1] for s in self.segments if s[1] < start]
+            while True:
+                values = self.rows(start)
+                if len(values) == 0 or \
+                        values[0, 0] <= values[-1, 0] - duration or \
+                        not segment_starts:
+                    break
+                start = segment_starts.pop()
+            values = values[values[:, 0] >= values[-1, 0] - duration] \
+                if len(values) else values
+        else:
+            raise ValueError(f'Cannot find the duration of the data without a time column or a sampling frequency. The first column is {self.columns[0]}')
+        return pd.DataFrame(values, columns=self.columns)
@@ -2,6 +2,8 @@ import itertools
 import numpy as np
 import pandas as pd
 import os
+import shutil
+import pickle
 from pathlib import Path
 import pint
 from matplotlib.figure import Figure
@@ -9,8 +11,10 @@ from sugarplot import plt, prettifyPlot, default_plotter, power_spectrum_plot, n
 from spectralpy import power_spectrum
 from sciparse import parse_xrd, parse_default, is_scalar, dict_to_string, title_to_quantity, to_standard_quantity, quantity_to_title
 from itertools import permutations
-from xsugar import ureg, dc_photocurrent, modulated_photocurrent, noise_current, inoise_func_dBAHz, factors_from_condition, get_partial_condition, condition_is_subset, condition_from_name, match_theory_data
+from xsugar import ureg, dc_photocurrent, modulated_photocurrent, noise_current, inoise_func_dBAHz, factors_from_condition, get_partial_condition, condition_is_subset, condition_from_name, condition_matches, metadata_delta, apply_metadata_delta, constants_from_deltas, match_theory_data, stack_frames, stack_scalars, aggregate_stack, replace_columns, statistic_name, averaging_columns, WelfordAccumulator, resample_frames, storage_formats, ExperimentArchive, archive_extension, DataSource, LazyData, ScalarAppender, compression_formats, strip_compression_extension, compression_from_filename, parse_csv, file_size, file_signature, storage_from_filename, storage_compression, ExperimentManifest, manifest_entry, manifest_suffix, read_experiment_metadata, write_experiment_metadata, ExperimentCatalog, table_from_data_dict, table_from_master, data_from_table, array_column_names, write_npy_array, column_summary, DataSummary, write_pyramid, DecimationPyramid, pyramid_suffix, write_snapshot, read_snapshot, ContinuousAcquisition
 import copy
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 class Experiment:
     """
@@ -20,11 +24,28 @@ class Experiment:
     :param measure_func: The function to execute which returns data given a particular experimental condition. Must take the experimental condition as an argument
     :param base_path: The absolute or relative base path of all structures.
     :param verbose: Verbose output enable/disable
+    :param average_along: Factor (or list of factors) to keep a running average along while the experiment is executed (i.e. replicate). Running averages are stored in running_averages.
+    :param averaging_type: (if Pandas DataFrame) whether the running averages average the last column only ("last") or all columns but the first column ("first")
+    :param average_statistics: Statistics returned by running_average_data in addition to the mean by default. Available statistics are "mean", "sum", "std", and "sem".
+    :param retain_raw_data: Whether to keep each dataset in data after it is measured and saved. Set to False to bound memory use when only the running averages are needed; the raw data can still be loaded from disk.
+    :param compression: Compression applied to saved DataFrames. "gzip", "bz2", "xz", or "zstd" for CSV files, which are given an extra extension (i.e. ".csv.gz"). For "parquet" and "feather" storage the compression codec is used inside the file. Compressed files are detected automatically when loading.
+    :param catalog: ExperimentCatalog to add each saved condition to, or True to use the default catalog of the base path
+    :param flush_rows: Number of scalar results to buffer before writing them to the results file
+    :param flush_interval: Maximum time in seconds scalar results are buffered before writing them to the results file. Buffered results are always written at the end of Execute, or by calling flush_results or close.
+    :param resume: If True, scalar results are appended to an existing results file (after checking its columns), so an interrupted experiment can be continued. Otherwise the results file is overwritten by the first result saved by each Execute.
+    :param csv_precision: Number of significant digits of floating-point values in saved CSV files. If None, values are saved with full precision.
+    :param summarize: Whether to store summary statistics (mean, RMS, minimum, maximum, and variance) of each column of saved DataFrames and arrays in the manifest, which derived_quantity uses instead of loading the data when possible. No summaries are stored for CSV files saved with csv_precision, whose values differ from the data they were computed from.
+    :param pyramid_levels: Decimation factors (i.e. [10, 100, 1000]) of the min/max/mean decimation pyramid saved next to each numeric DataFrame, used to plot long records without loading them. No pyramids are saved if None.
+    :param storage: File format used to save DataFrames. "csv" (default), "parquet", "feather", "npy", or "archive". "npy" stores raw binary columns which are memory-mapped when loaded. "archive" stores all DataFrames in a single file for the whole experiment.
     """
 
     def __init__(self, name, kind, measure_func=None,
                  ident='', verbose=False,
-                 base_path=None, **kwargs):
+                 base_path=None, average_along=None, storage='csv',
+                 flush_rows=1, flush_interval=None, compression=None,
+                 catalog=None, csv_precision=None, summarize=True,
+                 pyramid_levels=None, resume=False, averaging_type='first',
+                 average_statistics=None, retain_raw_data=True, **kwargs):
         if not base_path:
             base_path = str(Path.home())
             if 'LOGNAME' in os.environ:
@@ -33,11 +54,50 @@ class Experiment:
         self.major_separator = '~'
         self.minor_separator = '='
         self.name = name
+        self.kind = kind
         self.ident = ident
         self.base_path = base_path
         self.data = {}
         self.metadata = {}
+        self.metadata_deltas = {}
+        self.experiment_metadata = None
         self.verbose = verbose
+        self.average_along = average_along
+        self.averaging_type = averaging_type
+        if average_statistics is not None:
+            average_statistics = [statistic_name(s) \
+                                  for s in average_statistics]
+            for statistic in average_statistics:
+                if statistic not in WelfordAccumulator.streaming_statistics:
+                    raise ValueError(f'Statistic {statistic} cannot be computed from a running average. Available statistics are {WelfordAccumulator.streaming_statistics}')
+        self.average_statistics = average_statistics
+        self.retain_raw_data = retain_raw_data
+        self.running_averages = {}
+        self.load_manifest = {}
+        self.load_options = {}
+        self.derived_data = {}
+        if storage not in storage_formats and storage != 'archive':
+            raise ValueError(f'Storage format {storage} not recognized. Available formats are {list(storage_formats.keys()) + ["archive"]}')
+        self.storage = storage
+        if compression is not None and \
+                compression not in storage_compression[storage]:
+            if not storage_compression[storage]:
+                raise ValueError(f'Compression is not supported for {storage} storage')
+            raise ValueError(f'Compression {compression} not recognized for {storage} storage. Available compression formats are {storage_compression[storage]}')
+        self.compression = compression
+        self.csv_precision = csv_precision
+        self.summarize = summarize
+        self.pyramid_levels = pyramid_levels
+        self.archive = None
+        self.appender = None
+        self.manifest = None
+        self.owns_catalog = catalog is True
+        self.catalog = None if catalog is True else catalog
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.resume = resume
+        self.results_written = set()
+        self.executing = False
         self.measure_func = measure_func
         if measure_func:
             self.measure_name = measure_func.__name__
@@ -69,9 +129,15 @@ class Experiment:
 
     def Execute(self, **kwargs):
         if self.verbose == True: print(f"Executing experimnent {self.name}")
-        for cond in self.conditions:
-            self.executeExperimentCondition(cond, **kwargs)
-            if self.verbose == True: print(f"Executing condition {cond}")
+        self.results_written = set()
+        self.executing = True
+        try:
+            for cond in self.conditions:
+                self.executeExperimentCondition(cond, **kwargs)
+                if self.verbose == True: print(f"Executing condition {cond}")
+        finally:
+            self.executing = False
+            self.flush_results()
 
     def executeExperimentCondition(self, cond, **kwargs):
         """
@@ -81,70 +147,627 @@ class Experiment:
         """
         condition_name = self.conditionToName(cond)
         data = self.measure_func(cond, **kwargs)
-        self.data[condition_name] = data
+        if self.retain_raw_data:
+            self.data[condition_name] = data
         self.saveRawResults(data, cond)
+        if self.average_along is not None:
+            self.update_running_average(data, cond)
+
+    def continuous(self, columns, segment_rows, cond=None, capacity=None,
+                   sampling_frequency=None):
+        """
+        Starts a continuous acquisition at a fixed condition, which holds at most capacity rows in memory and saves every segment_rows rows as a numbered segment (i.e. TEST1~segment=0, TEST1~segment=1, ...). Numbering continues after any segments already saved.
+
+        :param columns: Names of the columns of each row (i.e. ['Time (s)', 'Voltage (mV)'])
+        :param segment_rows: Number of rows in each saved segment
+        :param cond: Condition of the acquisition. Defaults to the only condition of the experiment.
+        :param capacity: Number of rows held in memory. Defaults to two segments.
+        :param sampling_frequency: Sampling frequency of the rows, used to read back data if the first column is not a time
+        :returns acquisition: ContinuousAcquisition
+        """
+        if cond is None:
+            if len(self.conditions) != 1:
+                raise ValueError(f'Experiment has {len(self.conditions)} conditions. Specify the condition of the continuous acquisition.')
+            cond = self.conditions[0]
+        return ContinuousAcquisition(
+                self, cond, columns, segment_rows, capacity=capacity,
+                sampling_frequency=sampling_frequency)
+
+    def execute_continuous(self, columns, segment_rows, duration=None,
+                          cond=None, capacity=None, sampling_frequency=None,
+                          **kwargs):
+        """
+        Executes a continuous acquisition, repeatedly calling measure_func(cond, **kwargs) to get the next rows (as a 2D array or DataFrame) until duration has passed or measure_func returns None. Buffered rows are always saved before returning.
+
+        :param duration: Wall-clock duration of the acquisition, as a pint Quantity or in seconds. Runs until measure_func returns None if None.
+        :returns acquisition: The ContinuousAcquisition, which can be used to read back the most recent data
+        """
+        acquisition = self.continuous(
+                columns, segment_rows, cond=cond, capacity=capacity,
+                sampling_frequency=sampling_frequency)
+        if isinstance(duration, pint.Quantity):
+            duration = duration.to(ureg.s).magnitude
+        start_time = time.monotonic()
+        with acquisition:
+            while duration is None or \
+                    time.monotonic() - start_time < duration:
+                values = self.measure_func(acquisition.cond, **kwargs)
+                if values is None:
+                    break
+                acquisition.append(values)
+        return acquisition
+
+    def update_running_average(self, data, cond):
+        """
+        Adds a dataset to the running average of the group it belongs to. The group is the condition without the factors in average_along.
+
+        :param data: Data measured at the given condition
+        :param cond: Experimental condition as a dictionary
+        """
+        average_along = self.average_along
+        if isinstance(average_along, str):
+            average_along = [average_along]
+        if not all(factor in cond.keys() for factor in average_along):
+            return
+        group_condition = get_partial_condition(
+                cond, exclude_factors=average_along)
+        group_name = self.nameFromCondition(group_condition)
+        if group_name not in self.running_averages:
+            self.running_averages[group_name] = WelfordAccumulator(
+                    averaging_type=self.averaging_type)
+        self.running_averages[group_name].update(data)
+
+    def running_average_data(self, statistics=None):
+        """
+        Gets the data averaged during execution of the experiment
+
+        :param statistics: Additional statistics to return. Available statistics are "mean", "sum", "std", and "sem". Defaults to the average_statistics of the experiment. If specified, returns a tuple of (averaged_data, statistics_data), where statistics_data is a dictionary of statistic name: data dict.
+        """
+        if statistics is None:
+            statistics = self.average_statistics
+        if statistics is None:
+            statistic_names = []
+        else:
+            statistic_names = list(statistics)
+        averaged_data = {}
+        statistics_data = {s: {} for s in statistic_names}
+        for group_name, accumulator in self.running_averages.items():
+            results = accumulator.result(['mean'] + statistic_names)
+            averaged_data[group_name] = results['mean']
+            for s in statistic_names:
+                statistics_data[s][group_name] = results[s]
+
+        if statistics is None:
+            return averaged_data
+        else:
+            return averaged_data, statistics_data
 
 # This is a mess. it should be refactored making use of external parsers in the sciparse library. Move all the unit stuff, and all the writing, out there.
-    def saveRawResults(self, raw_data, cond):
+    def saveRawResults(self, raw_data, cond, columns=None, units=None):
         """
-        Saves raw results from the experiment performed with a given condition. If the data is a scalar, saves the results in a single pandas array. If the data is itself a numpy/pandas array, saves the data in its own file for later analysis.
+        Saves raw results from the experiment performed with a given condition. If the data is a scalar, saves the results in a single pandas array. If the data is itself a numpy/pandas array, saves the data in its own file for later analysis. numpy arrays are always saved uncompressed in the npy format, whatever the storage and compression of the experiment, and are loaded back as numpy arrays.
 
         :param cond: Experimental condition as a dictionary
         :param raw_data: Raw data as a pandas array to save
+        :param columns: (if numpy array) Names of the columns of the array, which override the columns attribute of measure_func
+        :param units: (if numpy array) Units of the columns of the array, which override the units attribute of measure_func
         """
+        data_is_array = isinstance(raw_data, np.ndarray)
+        if data_is_array:
+            column_names = self.array_column_names(
+                    raw_data, columns=columns, units=units)
+        elif columns is not None or units is not None:
+            raise ValueError(f'columns and units can only be given for numpy arrays. Found data of type {type(raw_data)}')
         partial_filename = self.nameFromCondition(cond)
-        self.data[partial_filename] = raw_data
+        if self.retain_raw_data:
+            self.data[partial_filename] = raw_data
         data_is_scalar = is_scalar(raw_data)
         data_is_pandas = isinstance(raw_data, pd.DataFrame)
-        if data_is_pandas:
-            full_filename = self.data_full_path + partial_filename + '.csv'
-            parse_default(
-                    full_filename,
-                    data=raw_data, metadata=self.constants,
-                    read_write='w')
+        if data_is_pandas or data_is_array:
+            metadata = self.metadata_to_save(partial_filename, cond)
+            statistics = None
+            rounded = data_is_pandas and self.storage == 'csv' and \
+                self.csv_precision is not None
+            if self.summarize and not rounded:
+                statistics = column_summary(raw_data,
+                    column_names=column_names if data_is_array else None)
+
+        if data_is_array:
+            full_filename = self.data_full_path + partial_filename + \
+                storage_formats['npy'][0]
+            write_npy_array(full_filename, raw_data, metadata,
+                            column_names=column_names)
+            storage, size = 'npy', file_size(full_filename)
+            signature = file_signature(full_filename)
+            self.get_manifest().add(manifest_entry(
+                    partial_filename, os.path.basename(full_filename),
+                    storage, raw_data, metadata, size=size,
+                    column_names=column_names, statistics=statistics,
+                    signature=signature))
+
+        elif data_is_pandas and self.storage == 'archive':
+            archive = self.get_archive()
+            full_filename = archive.filename
+            archive.append(partial_filename, raw_data, metadata)
+            offset, end = archive.index[partial_filename]
+            storage, size = 'archive', end - offset
+            signature = (offset, end)
+            self.get_manifest().add(manifest_entry(
+                    partial_filename, os.path.basename(full_filename),
+                    storage, raw_data, metadata, size=size,
+                    statistics=statistics))
+
+        elif data_is_pandas:
+            extension, writer = storage_formats[self.storage]
+            full_filename = self.data_full_path + partial_filename + extension
+            if self.storage == 'csv':
+                if self.compression is not None:
+                    full_filename += compression_formats[self.compression]
+                parse_csv(
+                        full_filename,
+                        data=raw_data, metadata=metadata,
+                        read_write='w', precision=self.csv_precision)
+            elif self.compression is None:
+                writer(
+                        full_filename,
+                        data=raw_data, metadata=metadata,
+                        read_write='w')
+            else:
+                writer(
+                        full_filename,
+                        data=raw_data, metadata=metadata,
+                        read_write='w', compression=self.compression)
+            storage, size = self.storage, file_size(full_filename)
+            signature = file_signature(full_filename)
+            self.get_manifest().add(manifest_entry(
+                    partial_filename, os.path.basename(full_filename),
+                    storage, raw_data, metadata,
+                    compression=self.compression, size=size,
+                    statistics=statistics, signature=signature))
 
         elif data_is_scalar:
             full_filename = self.data_full_path + self.name + '.csv'
             cond_partial = self.conditionFromName(partial_filename,
                     full_condition=False)
-            if len(self.data) == 1:
-                with open(full_filename, 'w') as fh:
-                    metadata_line = dict_to_string(self.constants) + '\n'
-                    fh.write(metadata_line)
-                    for k, v in cond_partial.items():
-                        if isinstance(v, pint.Quantity):
-                            title_name = quantity_to_title(
-                                    v, name=k)
-                        else:
-                            title_name = k
-                        fh.write(title_name + ',')
-                    if isinstance(raw_data, pint.Quantity):
-                        data_name = quantity_to_title(
-                                raw_data, name=self.measure_name)
-                    else:
-                        if self.measure_name:
-                            data_name = self.measure_name
-                        else:
-                            data_name = 'Value'
+            columns = []
+            values = []
+            for k, v in cond_partial.items():
+                if isinstance(v, pint.Quantity):
+                    columns.append(quantity_to_title(v, name=k))
+                    values.append(v.magnitude)
+                else:
+                    columns.append(k)
+                    values.append(v)
+            if isinstance(raw_data, pint.Quantity):
+                columns.append(quantity_to_title(
+                        raw_data, name=self.measure_name))
+                values.append(raw_data.magnitude)
+            else:
+                if self.measure_name:
+                    columns.append(self.measure_name)
+                else:
+                    columns.append('Value')
+                values.append(raw_data)
+            appender = self.get_appender(full_filename, columns)
+            appender.append(values)
+            results_buffered = len(appender.buffer) > 0
+            if not self.executing and not results_buffered:
+                self.flush_results()
+            storage, size = 'csv', None
+        else:
+            raise ValueError(f'Cannot save data type {type(raw_data)}. Can only currently handle types of float, int, np.ndarray, and pd.DataFrame')
+        if data_is_pandas and self.pyramid_levels is not None:
+            write_pyramid(self.pyramid_filename(partial_filename), raw_data,
+                          self.pyramid_levels, signature=signature)
+        elif data_is_pandas or data_is_array:
+            shutil.rmtree(self.pyramid_filename(partial_filename),
+                          ignore_errors=True)
+        if self.get_catalog() is not None:
+            self.catalog.add_condition(
+                    self.kind, self.name, self.data_full_path,
+                    partial_filename,
+                    self.conditionFromName(partial_filename,
+                                           full_condition=False),
+                    os.path.basename(full_filename), storage=storage,
+                    data=raw_data, size=size,
+                    value_name=columns[-1] if data_is_scalar else 'Value')
+        if data_is_scalar and results_buffered:
+            print(f'Results buffered for {full_filename}')
+        else:
+            print(f'Results saved to {full_filename}')
 
-                    fh.write(data_name + '\n')
+    def array_column_names(self, raw_data, columns=None, units=None):
+        """
+        Gets the column names of a numpy array of raw data from the given columns and units, or else from the columns and units attributes of measure_func.
 
-            with open(full_filename, 'a') as fh:
-                for v in cond_partial.values():
-                    if isinstance(v, pint.Quantity):
-                        quantity_name = str(v.magnitude)
-                    else:
-                        quantity_name = str(v)
-                    fh.write(quantity_name + ',')
-                if isinstance(raw_data, pint.Quantity):
-                    raw_string = str(raw_data.magnitude)
-                else:
-                    raw_string = str(raw_data)
+        :param raw_data: numpy array
+        :param columns: Names of the columns
+        :param units: Units of the columns
+        """
+        if columns is None:
+            columns = getattr(self.measure_func, 'columns', None)
+            units = getattr(self.measure_func, 'units', None)
+        return array_column_names(raw_data.shape, columns=columns,
+                                  units=units)
+
+    def get_appender(self, filename, columns):
+        """
+        Gets the buffered appender for the file of scalar results, opening it if it is not already open. The file is overwritten the first time it is opened by each Execute (or outside Execute), unless the experiment resumes existing results, and appended to afterwards.
+
+        :param filename: Full filename of the results file
+        :param columns: List of column names of the results file
+        """
+        if self.appender is not None and (
+                self.appender.filename != filename or
+                self.appender.columns != list(columns)):
+            self.flush_results()
+        if self.appender is None:
+            resume = self.resume or filename in self.results_written
+            self.appender = ScalarAppender(
+                    filename, columns, metadata=self.constants,
+                    flush_rows=self.flush_rows,
+                    flush_interval=self.flush_interval, resume=resume)
+            self.results_written.add(filename)
+            manifest = self.get_manifest()
+            if self.name not in manifest:
+                manifest.add(manifest_entry(
+                        self.name, os.path.basename(filename), 'csv',
+                        None, self.constants))
+        return self.appender
+
+    def flush_results(self):
+        """
+        Durably writes any buffered scalar results to disk and closes the results file.
+        """
+        if self.appender is not None:
+            self.appender.close()
+            self.appender = None
+
+    def close(self):
+        """
+        Writes any buffered results and closes the files held open by the experiment, including the catalog if the experiment opened it
+        """
+        self.flush_results()
+        if self.owns_catalog and self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+
+    def get_catalog(self):
+        """
+        Gets the catalog saved conditions are added to, opening the default catalog of the base path if the experiment was created with catalog=True. Returns None if the experiment has no catalog.
+        """
+        if self.catalog is None and self.owns_catalog:
+            self.catalog = ExperimentCatalog(self.base_path)
+        return self.catalog
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def metadata_to_save(self, name, cond):
+        """
+        Gets the metadata to save with a single dataset. The metadata shared by the whole experiment is saved once, the first time a dataset is saved, and each dataset stores its condition and the metadata which differs from it.
+
+        :param name: Name of the dataset
+        :param cond: Experimental condition of the dataset
+        """
+        if self.experiment_metadata is None:
+            filename = self.experiment_metadata_filename()
+            if os.path.exists(filename):
+                self.experiment_metadata = read_experiment_metadata(filename)
+            else:
+                write_experiment_metadata(filename, self.constants)
+                self.experiment_metadata = dict(self.constants)
+        factors = self.conditionFromName(name, full_condition=False).keys()
+        return {**{k: cond[k] for k in factors if k in cond.keys()},
+                **metadata_delta(self.constants, self.experiment_metadata)}
+
+    def experiment_metadata_filename(self):
+        return self.data_full_path + '_' + self.name + '.metadata'
+
+    def get_manifest(self):
+        """
+        Gets the manifest listing every dataset saved in this experiment, creating it if it does not exist.
+        """
+        if self.manifest is None:
+            self.manifest = ExperimentManifest(
+                    self.data_full_path + '_' + self.name + manifest_suffix)
+        return self.manifest
+
+    def summary(self, name):
+        """
+        Gets the summary statistics saved with a dataset, or None if none were saved or the file of the dataset has changed since they were saved.
+
+        :param name: Name of the dataset
+        :returns summary: DataSummary or None
+        """
+        entry = self.get_manifest().entries.get(name, None)
+        if entry is None or entry.get('statistics', None) is None:
+            return None
+        if entry['format'] != 'archive':
+            full_filename = self.data_full_path + entry['file']
+            if not os.path.exists(full_filename) or \
+                    file_size(full_filename) != entry['size']:
+                return None
+            if entry.get('signature', None) is not None and \
+                    list(file_signature(full_filename)) != entry['signature']:
+                return None
+        return DataSummary(entry['statistics'])
+
+    def pyramid_filename(self, name):
+        """
+        Gets the full filename of the decimation pyramid of a dataset
+
+        :param name: Name of the dataset
+        """
+        return self.data_full_path + '_' + name + pyramid_suffix
+
+    def pyramid(self, name):
+        """
+        Gets the decimation pyramid saved with a dataset, or None if none was saved or the dataset has changed since it was saved.
 
-                fh.write(raw_string + '\n')
+        :param name: Name of the dataset
+        :returns pyramid: DecimationPyramid or None
+        """
+        filename = self.pyramid_filename(name)
+        entry = self.get_manifest().entries.get(name, None)
+        if entry is None or not os.path.isdir(filename):
+            return None
+        pyramid = DecimationPyramid(filename)
+        signature = self.raw_signature(entry)
+        if signature is None or pyramid.signature != list(signature):
+            return None
+        return pyramid
+
+    def raw_signature(self, entry):
+        """
+        Gets the current signature of the raw data of a manifest entry: the size and modification time of its file, or the position of its record for archives.
+
+        :param entry: Manifest entry of the dataset
+        :returns signature: Signature, or None if the raw data no longer exists
+        """
+        if entry['format'] == 'archive':
+            return self.get_archive().index.get(entry['name'], None)
+        full_filename = self.data_full_path + entry['file']
+        if not os.path.exists(full_filename):
+            return None
+        return file_signature(full_filename)
+
+    def decimated_data(self, points, names=None):
+        """
+        Gets the raw data decimated for plotting, using the coarsest level of the decimation pyramid of each dataset with at least the given number of points. Datasets without an adequate pyramid level are loaded in full.
+
+        :param points: Minimum number of points of each dataset (i.e. the horizontal resolution of a plot in pixels)
+        :param names: Names of the datasets. Defaults to all the raw data.
+        :returns data_dict: Dictionary of name: DataFrame. Decimated DataFrames contain the minimum and maximum of each block (see DecimationPyramid.envelope).
+        """
+        if names is None:
+            names = self.data.keys()
+        data_dict = {}
+        for name in names:
+            pyramid = self.pyramid(name)
+            level = pyramid.select_level(points) if pyramid else None
+            if level is None:
+                data_dict[name] = self.data[name]
+            else:
+                data_dict[name] = pyramid.envelope(level)
+        return data_dict
+
+    def rebuild_manifest(self, parser=None):
+        """
+        Rebuilds the manifest from the files in the data directory, reading every file once. Useful for experiments saved before manifests existed, or whose files were modified by hand.
+
+        :param parser: data loading function which returns a pandas DataFrame from a raw file of data. By default the parser is chosen from the file extension.
+        """
+        manifest = self.get_manifest()
+        manifest.entries.clear()
+        for source in self.data_sources(parser=parser):
+            manifest.entries[source.name] = self.source_manifest_entry(source)
+        manifest.write()
+
+    def source_manifest_entry(self, source):
+        """
+        Creates the manifest entry of a dataset by reading it from disk
+
+        :param source: DataSource of the dataset
+        """
+        data, metadata = source.load()
+        if source.archive is not None:
+            storage = 'archive'
+            offset, end = source.archive.index[source.name]
+            size, signature = end - offset, None
+        else:
+            storage = storage_from_filename(source.filename)
+            size = file_size(source.filename)
+            signature = file_signature(source.filename)
+        if isinstance(data, (pd.DataFrame, np.ndarray)):
+            statistics = column_summary(data)
         else:
-            raise ValueError(f'Cannot save data type {type(raw_data)}. Can only currently handle types of float, int, and pd.DataFrame')
-        print(f'Results saved to {full_filename}')
+            data, statistics = None, None
+        return manifest_entry(
+                source.name, os.path.basename(source.filename), storage,
+                data, metadata,
+                compression=compression_from_filename(source.filename),
+                size=size, statistics=statistics, signature=signature)
+
+    def refresh_manifest(self, parser=None):
+        """
+        Checks each dataset in the manifest against its file. Entries whose file has been deleted are removed, and datasets whose file has changed since they were saved are read again. New files are not detected, since the data directory is not listed; use rebuild_manifest for those.
+
+        :param parser: data loading function which returns a pandas DataFrame from a raw file of data. By default the parser is chosen from the file extension.
+        """
+        manifest = self.get_manifest()
+        changed = False
+        for entry in list(manifest.entries.values()):
+            if entry['format'] == 'archive':
+                continue
+            full_filename = self.data_full_path + entry['file']
+            if not os.path.exists(full_filename):
+                del manifest.entries[entry['name']]
+                changed = True
+            elif entry.get('signature', None) is not None and \
+                    list(file_signature(full_filename)) != entry['signature']:
+                source = DataSource(entry['name'], full_filename,
+                                    parser=parser)
+                manifest.entries[entry['name']] = \
+                    self.source_manifest_entry(source)
+                changed = True
+        if changed:
+            manifest.write()
+
+    @classmethod
+    def open(cls, name, kind, base_path=None, parser=None,
+             memory_budget=None, check=True, names=None, **kwargs):
+        """
+        Opens a saved experiment from its manifest, without listing the data directory or reading any data files. Conditions and metadata are recovered from the manifest, and each dataset is loaded the first time it is accessed. If the experiment has no manifest, it is first rebuilt from the data files.
+
+        :param name: The full name of the specific experiment (i.e. LIA1-1)
+        :param kind: A string of the kind of experiment (i.e. XRD, simulation, etc.)
+        :param base_path: The absolute or relative base path of all structures.
+        :param parser: data loading function which returns a pandas DataFrame from a raw file of data. By default the parser is chosen from the file extension.
+        :param memory_budget: Maximum memory in bytes used by loaded data. See LazyData.
+        :param check: Whether to check the manifest against the size and modification time of each file, re-reading changed datasets and dropping deleted ones. See refresh_manifest.
+        :param names: Names of the datasets to open. All the datasets in the manifest are opened if None.
+        :param kwargs: Additional keyword arguments to pass into Experiment
+        """
+        exp = cls(name, kind, base_path=base_path, **kwargs)
+        manifest = exp.get_manifest()
+        if len(manifest) == 0:
+            exp.rebuild_manifest(parser=parser)
+        elif check:
+            exp.refresh_manifest(parser=parser)
+        exp.data = LazyData(memory_budget=memory_budget)
+        experiment_metadata = read_experiment_metadata(
+                exp.experiment_metadata_filename())
+        for entry in manifest.entries.values():
+            if names is not None and entry['name'] not in names:
+                continue
+            full_filename = exp.data_full_path + entry['file']
+            if entry['format'] == 'archive':
+                source = DataSource(entry['name'], full_filename,
+                                    archive=exp.get_archive())
+            else:
+                source = DataSource(entry['name'], full_filename,
+                                    parser=parser)
+            exp.data.add_loader(entry['name'], source.load_data)
+            exp.add_loaded_metadata(
+                    entry['name'], manifest.metadata(entry['name']),
+                    experiment_metadata=experiment_metadata)
+        if exp.metadata:
+            exp.constants = constants_from_deltas(
+                    experiment_metadata, exp.metadata_deltas.values())
+        return exp
+
+    snapshot_attributes = [
+        'data', 'metadata', 'metadata_deltas', 'experiment_metadata',
+        'conditions', 'factors', 'constants', 'load_manifest',
+        'load_options', 'derived_data', 'running_averages']
+
+    def snapshot(self, filename):
+        """
+        Saves the in-memory state of the experiment (data, metadata, conditions, constants, derived_data, and running averages) to a single binary file, so it can be reopened with from_snapshot without parsing the raw data again. Lazily-loaded data is loaded first. The size and modification time of each raw data file are recorded to detect when the snapshot becomes stale, along with the parser, columns, and condition_filter of the last call to loadData, which are used to reload stale datasets.
+
+        :param filename: Full filename of the snapshot
+        """
+        try:
+            pickle.dumps(self.load_options)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            raise ValueError(f'Cannot save the load options {self.load_options} in a snapshot. The parser and condition_filter of loadData must be module-level functions or dictionaries to take a snapshot.')
+        state = {k: getattr(self, k) for k in self.snapshot_attributes}
+        state['data'] = dict(self.data)
+        load_manifest = {}
+        for source in self.matching_sources(**self.load_options):
+            load_manifest[source.name] = self.load_manifest.get(source.name,
+                {'signature': source.signature(), 'hash': None})
+        state['load_manifest'] = load_manifest
+        header = {'name': self.name, 'kind': self.kind,
+                  'base_path': self.base_path, 'storage': self.storage}
+        write_snapshot(filename, header, state)
+
+    @classmethod
+    def from_snapshot(cls, filename, refresh=True, **kwargs):
+        """
+        Reopens an experiment saved with snapshot. If raw data files have been added, changed, or deleted since the snapshot was taken, the snapshot is stale: the changed datasets are reloaded and derived_data is cleared, or a ValueError is raised if refresh is False. Snapshots are unpickled, so only open snapshots from trusted sources.
+
+        :param filename: Full filename of the snapshot
+        :param refresh: Whether to reload datasets which have changed since the snapshot was taken
+        :param kwargs: Additional keyword arguments to pass into Experiment
+        """
+        header, state = read_snapshot(filename)
+        exp = cls(header['name'], header['kind'],
+                  base_path=header['base_path'],
+                  storage=header['storage'], **kwargs)
+        for k, v in state.items():
+            setattr(exp, k, v)
+        changed_names = exp.changed_datasets()
+        if changed_names and not refresh:
+            raise ValueError(f'Snapshot {filename} is stale. Datasets changed since the snapshot was taken: {changed_names}')
+        elif changed_names:
+            exp.derived_data = {}
+            exp.loadData(incremental=True, **exp.load_options)
+        return exp
+
+    def changed_datasets(self):
+        """
+        Finds the datasets on disk which are new, changed, or deleted since they were last loaded, without updating the load manifest.
+
+        :returns names: Sorted list of dataset names
+        """
+        sources = self.matching_sources(**self.load_options)
+        changed_names = set(self.load_manifest.keys()) - \
+            set(source.name for source in sources)
+        for source in sources:
+            entry = self.load_manifest.get(source.name, None)
+            if entry is None:
+                changed_names.add(source.name)
+            elif entry['signature'] != source.signature() and \
+                    entry['hash'] != source.content_hash():
+                changed_names.add(source.name)
+        return sorted(changed_names)
+
+    def to_arrow(self, data=None, factor_columns=None):
+        """
+        Converts raw data, a derived data dictionary, or a master table into an Apache Arrow table without copying numeric columns. Factor columns are dictionary-encoded, units are stored in the metadata of each field, and the experiment constants in the metadata of the table.
+
+        :param data: Data dictionary (name: DataFrame or name: scalar) or master table (DataFrame) to convert. Defaults to the raw data.
+        :param factor_columns: (if master table) Names of the factor columns. Defaults to the columns named after factors of the experiment.
+        :returns table: pyarrow Table
+        """
+        if data is None:
+            data = self.data
+        if isinstance(data, pd.DataFrame):
+            if factor_columns is None:
+                factor_names = set(self.factors.keys())
+                for name in self.data.keys():
+                    factor_names.update(self.conditionFromName(
+                            name, full_condition=False).keys())
+                factor_columns = [c for c in data.columns \
+                        if str(c).split(' (')[0] in factor_names]
+            return table_from_master(data, factor_columns,
+                                     metadata=self.constants)
+        conditions = {name: self.conditionFromName(name, full_condition=False) \
+                      for name in data.keys()}
+        return table_from_data_dict(data, conditions, metadata=self.constants)
+
+    def from_arrow(self, table):
+        """
+        Converts an Arrow table created by to_arrow back into a data dictionary or master table. Numeric columns without missing values are not copied.
+
+        :param table: pyarrow Table
+        :returns data: Data dictionary or master table (DataFrame)
+        """
+        return data_from_table(table)
+
+    def get_archive(self):
+        """
+        Gets the single-file archive containing all the DataFrames in this experiment, creating it if it does not exist.
+        """
+        if self.archive is None:
+            self.archive = ExperimentArchive(
+                    self.data_full_path + self.name + archive_extension)
+        return self.archive
 
     def generate_conditions(self, comb_type='cartesian', **factors):
         """
@@ -310,7 +933,7 @@ class Experiment:
 
     def derived_quantity(
             self, quantity_func, data_dict=None, quantity_kw={},
-            average_along=None, sum_along=None):
+            average_along=None, sum_along=None, average_kw={}, save_as=None):
         """
         Extracts derived quantities from a named dictionary of data with some
         arbitrary input functioin, and optional averaging along an arbitrary
@@ -320,20 +943,34 @@ class Experiment:
         :param quantity_func: Function to apply to generate data
         :param quantity_kw: Additional keyword arguments to be passed into the quantity function on top of the condition.
         :param average_along: Axis to average along (i.e. replicate or None)
+        :param average_kw: Additional keyword arguments to be passed into average_data (i.e. statistics, bootstrap_kw)
+        :param save_as: If given, the derived quantities are also stored under this name in derived_data, which is saved in snapshots.
+
+        If data_dict is not given, the data is loaded lazily, and quantity_func has a from_summary attribute (i.e. dc_photocurrent or a function created by summary_quantity), quantity_func.from_summary(summary, cond) is called with the DataSummary saved with each dataset which is not yet in memory instead, so the raw data is not loaded. Datasets which are in memory, and datasets without a saved summary, are used as usual.
         """
+        use_summaries = data_dict is None and \
+            isinstance(self.data, LazyData) and \
+            hasattr(quantity_func, 'from_summary')
         if data_dict is None:
             data_dict = self.data
 
         derived_dict = {}
-        for name, data in data_dict.items():
-            cond = self.conditionFromName(name)
-            quantity = quantity_func(data, dict(cond, **quantity_kw))
+        for name in data_dict.keys():
+            cond = dict(self.conditionFromName(name), **quantity_kw)
+            summary = self.summary(name) \
+                if use_summaries and not data_dict.is_loaded(name) else None
+            if summary is not None:
+                quantity = quantity_func.from_summary(summary, cond)
+            else:
+                quantity = quantity_func(data_dict[name], cond)
             derived_dict[name] = quantity
 
         if average_along is not None or sum_along is not None:
             derived_dict = self.average_data(
                 data_dict=derived_dict, average_along=average_along,
-                sum_along=sum_along)
+                sum_along=sum_along, **average_kw)
+        if save_as is not None:
+            self.derived_data[save_as] = derived_dict
         return derived_dict
 
     def saveMasterData(self, data_dict=None):
@@ -350,31 +987,193 @@ class Experiment:
             master_data.to_csv(fh, mode='a', index=False)
 
 
-    def loadData(self, parser=parse_default):
+    def data_sources(self, parser=None, columns=None):
         """
-        Loads data from files located in the root data directory of the
-        experiment, if available.
+        Finds all the datasets in the root data directory of the experiment, without loading them.
 
-        :param loader: data loading function which returns a pandas DataFrame from a raw file of data. Useful if data is not already in CSV format
+        :param parser: data loading function which returns a pandas DataFrame from a raw file of data. By default the parser is chosen from the file extension.
+        :param columns: Names or units of the columns to load from each dataset. All columns are loaded if None.
+        :returns sources: List of DataSources
         """
         candidate_files = [x for x in os.listdir(self.data_full_path) \
                             if not x.startswith('.') and not x.startswith('_')
                           and x.startswith(self.name)]
-        for fn in candidate_files:
-            name = os.path.splitext(fn)[0]
+        sources = []
+        for fn in sorted(candidate_files):
             full_filename = self.data_full_path + fn
-            data, metadata = parser(full_filename)
-            self.data[name] = data
-            self.metadata[name] = metadata
-            self.constants = metadata # Inefficient but the best I can think of
-            cond = self.conditionFromName(name)
-            if self.conditions == [{}]:
-                self.conditions[0] = cond
+            if fn == self.name + archive_extension:
+                archive = ExperimentArchive(full_filename)
+                sources += [DataSource(name, full_filename, archive=archive,
+                                       columns=columns) \
+                            for name in archive.names()]
             else:
-                self.conditions.append(cond)
+                name = os.path.splitext(strip_compression_extension(fn))[0]
+                sources.append(DataSource(name, full_filename, parser=parser,
+                                          columns=columns))
+        return sources
 
-        for val in self.metadata.values():
-            self.constants = dict(self.constants.items() & val.items())
+    def matching_sources(self, parser=None, columns=None,
+                         condition_filter=None):
+        """
+        Finds the datasets on disk whose condition matches a filter. See data_sources and condition_matches.
+
+        :param parser: Parser used to read the files
+        :param columns: Names or units of the columns to read
+        :param condition_filter: Filter on the condition of each dataset. All datasets match if None.
+        """
+        sources = self.data_sources(parser=parser, columns=columns)
+        if condition_filter is not None:
+            sources = [s for s in sources if condition_matches(
+                self.conditionFromName(s.name, full_condition=False),
+                condition_filter)]
+        return sources
+
+    def loadData(self, parser=None, lazy=False, memory_budget=None,
+                 workers=None, pool='thread', incremental=False,
+                 condition_filter=None, columns=None):
+        """
+        Loads data from files located in the root data directory of the
+        experiment, if available.
+
+        :param parser: data loading function which returns a pandas DataFrame from a raw file of data. Useful if data is not already in CSV format. By default the parser is chosen from the file extension.
+        :param lazy: If True, only the metadata is read up front, and each dataset is loaded the first time it is accessed in self.data.
+        :param memory_budget: (if lazy) Maximum memory in bytes used by loaded data. Least-recently used datasets are dropped from memory beyond this.
+        :param workers: Number of files to parse concurrently. Results are always added in the same order, sorted by filename.
+        :param pool: "thread" or "process". Whether to parse files in a pool of threads or processes. Processes require the parser to be picklable.
+        :param incremental: If True, only parses files which are new or have changed since the last call to loadData, and drops data whose files have been deleted. Files are considered changed if their size or modification time has changed and the hash of their contents is different.
+        :param condition_filter: Only load datasets whose condition matches this filter. Either a dictionary of factor: filter pairs (i.e. {'temperature': 25, 'wavelength': (700, 800)}) or a function which takes a condition and returns True or False. The filter is checked against the condition in the filename, so files which do not match are never opened. See condition_matches.
+        :param columns: Only load these columns of each dataset, given as column names or units (i.e. ['Time (ms)', ureg.mV]). Units are matched as in column_from_unit. Binary formats only read the requested columns from disk, and CSV files only parse them. Also applies to datasets loaded lazily.
+        """
+        if lazy:
+            if not isinstance(self.data, LazyData):
+                lazy_data = LazyData()
+                lazy_data.update(self.data)
+                self.data = lazy_data
+            self.data.memory_budget = memory_budget
+
+        self.load_options = {'parser': parser, 'columns': columns,
+                             'condition_filter': condition_filter}
+        sources = self.matching_sources(**self.load_options)
+        if incremental:
+            source_names = set(source.name for source in sources)
+            for name in list(self.load_manifest.keys()):
+                if name not in source_names:
+                    self.remove_data(name)
+            sources = [s for s in sources if self.source_changed(s)]
+        else:
+            for source in sources:
+                self.load_manifest[source.name] = {
+                    'signature': source.signature(), 'hash': None}
+
+        if lazy:
+            load_function = DataSource.load_metadata
+        else:
+            load_function = DataSource.load
+
+        if workers is None or workers <= 1:
+            results = [load_function(source) for source in sources]
+        else:
+            if pool == 'thread':
+                executor_class = ThreadPoolExecutor
+            elif pool == 'process':
+                executor_class = ProcessPoolExecutor
+            else:
+                raise ValueError(f'pool must be "thread" or "process". Found {pool}')
+            with executor_class(max_workers=workers) as executor:
+                results = list(executor.map(load_function, sources))
+
+        experiment_metadata = read_experiment_metadata(
+                self.experiment_metadata_filename())
+        for source, result in zip(sources, results):
+            if lazy:
+                self.data.add_loader(source.name, source.load_data)
+                metadata = result
+            else:
+                data, metadata = result
+                self.data[source.name] = data
+            self.add_loaded_metadata(source.name, metadata,
+                    experiment_metadata=experiment_metadata)
+
+        if self.metadata:
+            self.constants = constants_from_deltas(
+                    experiment_metadata, self.metadata_deltas.values())
+
+    def source_changed(self, source):
+        """
+        Checks whether a dataset on disk is new or has changed since it was last loaded, and updates the load manifest.
+
+        :param source: DataSource to check
+        """
+        signature = source.signature()
+        entry = self.load_manifest.get(source.name, None)
+        if entry is None:
+            self.load_manifest[source.name] = {
+                'signature': signature, 'hash': None}
+            return True
+        if entry['signature'] == signature:
+            return False
+        content_hash = source.content_hash()
+        self.load_manifest[source.name] = {
+            'signature': signature, 'hash': content_hash}
+        return entry['hash'] != content_hash
+
+    def release_data(self, name):
+        """
+        Drops a saved dataset from memory. It is loaded from disk again the next time it is accessed.
+
+        :param name: Name of the dataset
+        """
+        if not isinstance(self.data, LazyData):
+            lazy_data = LazyData()
+            lazy_data.update(self.data)
+            self.data = lazy_data
+        self.data.add_loader(name, self.saved_source(name).load_data)
+
+    def saved_source(self, name):
+        """
+        Gets the DataSource of a dataset saved in this experiment, from its manifest entry
+
+        :param name: Name of the dataset
+        """
+        entry = self.get_manifest().entries[name]
+        if entry['format'] == 'archive':
+            return DataSource(name, self.data_full_path + entry['file'],
+                              archive=self.get_archive())
+        return DataSource(name, self.data_full_path + entry['file'])
+
+    def remove_data(self, name):
+        """
+        Removes a dataset, its metadata, and its condition from the experiment
+
+        :param name: Name of the dataset
+        """
+        cond = self.conditionFromName(name)
+        if cond in self.conditions:
+            self.conditions.remove(cond)
+        if name in self.data:
+            del self.data[name]
+        self.metadata.pop(name, None)
+        self.metadata_deltas.pop(name, None)
+        self.load_manifest.pop(name, None)
+
+    def add_loaded_metadata(self, name, metadata, experiment_metadata={}):
+        """
+        Adds the metadata and condition of a dataset loaded from disk to the experiment
+
+        :param name: Name of the dataset
+        :param metadata: The metadata loaded with the data
+        :param experiment_metadata: The metadata shared by the whole experiment, which the metadata of the dataset is added to
+        """
+        factors = self.conditionFromName(name, full_condition=False).keys()
+        metadata = {k: v for k, v in metadata.items() if k not in factors}
+        self.metadata_deltas[name] = metadata
+        self.metadata[name] = apply_metadata_delta(experiment_metadata,
+                                                   metadata)
+        cond = self.conditionFromName(name)
+        if self.conditions == [{}]:
+            self.conditions[0] = cond
+        elif cond not in self.conditions:
+            self.conditions.append(cond)
 
     def loadXRDData(self):
         self.loadData(parser=parse_xrd)
@@ -384,7 +1183,7 @@ class Experiment:
         Generates unique groups for grouping data data by condition which have different replicates but the some condition otherwise
 
         :param data_dict: Dictionary of named data for which to generate groups
-        :param group_along: Condition name that the data should be grouped by
+        :param group_along: Condition name (or list of condition names) that the data should be grouped by
         :param grouping_type: "name" or "value". Allows generation of groups into groups which have the same condition and run over one final condition, or groups which vary the value of a single condition.
         :returns groups: List of conditions without the group_along part
         """
@@ -392,17 +1191,19 @@ class Experiment:
             data_dict = self.data
         if group_along == None:
             return data_dict
+        if isinstance(group_along, str):
+            group_along = [group_along]
         names = [name for name in data_dict.keys()]
         conds = [self.conditionFromName(name, full_condition=False) \
                 for name in names]
         groups = {}
         for cond, cond_name in zip(conds, names):
-            if group_along in cond.keys():
+            if all(factor in cond.keys() for factor in group_along):
 
                 if grouping_type == 'name':
-                    group_conditions = {k: cond[k] for k in cond.keys() if k != group_along}
+                    group_conditions = {k: cond[k] for k in cond.keys() if k not in group_along}
                 elif grouping_type == 'value':
-                    group_conditions = {group_along: cond[group_along]}
+                    group_conditions = {k: cond[k] for k in group_along}
                 else:
                     raise ValueError(f'grouping_type must be "name" or "value". Found {grouping_type}')
 
@@ -436,10 +1237,11 @@ class Experiment:
 
         return grouped_data
 
-    def master_data(self, data_dict=None, value_name='Value'):
+    def master_data(self, data_dict=None, value_name='Value', statistics_data=None):
         """
-        NOTE: Currently only designed for data_dicts with scalar values. Not design for data frames or multi-valued datasets. I need to fix this.
+        NOTE: Currently only designed for data_dicts with scalar values. For data dicts containing DataFrames, use tidy_data instead.
 
+        :param statistics_data: Dictionary of statistic name: data dict, as returned by average_data. Each statistic is added as an extra column after the value column.
         """
         if not data_dict:
             data_dict = self.data
@@ -481,8 +1283,83 @@ class Experiment:
                     i != len(return_frame.columns) -1:
                 new_return_frame = new_return_frame.drop(col, axis=1)
 
+        if statistics_data is not None:
+            value_title = new_return_frame.columns[-1]
+            _, value_base_name = title_to_quantity(
+                    value_title, return_name=True)
+            for statistic, statistic_dict in statistics_data.items():
+                column_name = value_base_name + '_' + statistic
+                column_values = []
+                for name in data_dict.keys():
+                    quantity_value = data_dict[name]
+                    statistic_value = statistic_dict[name]
+                    if isinstance(quantity_value, pint.Quantity):
+                        column_name = quantity_to_title(
+                                quantity_value, name=value_base_name + \
+                                '_' + statistic)
+                        statistic_value = statistic_value.to(
+                                quantity_value.units).magnitude
+                    column_values.append(statistic_value)
+                new_return_frame[column_name] = column_values
+
         return new_return_frame
 
+    def tidy_data(self, data_dict=None, categorical=True):
+        """
+        Concatenates DataFrame-valued data into a single long-format (tidy) DataFrame. Each factor in the conditions becomes a column whose value identifies the condition each row came from, so that group-wise analysis over all conditions can be done with a single pandas groupby.
+
+        :param data_dict: Named data dictionary containing pandas DataFrames
+        :param categorical: Whether the factor columns should be pandas Categoricals (default) or plain columns
+        :returns tidy_frame: DataFrame with the factor columns followed by the data columns
+        """
+        if data_dict is None:
+            data_dict = self.data
+        names = list(data_dict.keys())
+        frames = [data_dict[name] for name in names]
+        if len(frames) == 0:
+            return pd.DataFrame()
+        for name, frame in zip(names, frames):
+            if not isinstance(frame, pd.DataFrame):
+                raise ValueError(f'Cannot make tidy data from type {type(frame)} in {name}. Can only handle pd.DataFrame. For scalar data use master_data.')
+
+        lengths = np.array([len(frame) for frame in frames])
+        conds = [self.conditionFromName(name, full_condition=False) \
+                 for name in names]
+
+        factor_titles = {}
+        factor_units = {}
+        for cond in conds:
+            for k, v in cond.items():
+                if k in factor_titles:
+                    continue
+                if isinstance(v, pint.Quantity):
+                    factor_titles[k] = quantity_to_title(v, name=k)
+                    factor_units[k] = v.units
+                else:
+                    factor_titles[k] = k
+
+        factor_columns = {}
+        for factor, title in factor_titles.items():
+            levels = np.empty(len(conds), dtype=object)
+            for i, cond in enumerate(conds):
+                v = cond.get(factor, None)
+                if isinstance(v, pint.Quantity):
+                    v = v.to(factor_units[factor]).magnitude
+                levels[i] = v
+            if categorical:
+                level_categories = pd.Categorical(levels)
+                factor_columns[title] = pd.Categorical.from_codes(
+                        np.repeat(level_categories.codes, lengths),
+                        categories=level_categories.categories)
+            else:
+                factor_columns[title] = pd.Series(
+                        np.repeat(levels, lengths)).infer_objects()
+
+        tidy_factors = pd.DataFrame(factor_columns)
+        tidy_values = pd.concat(frames, ignore_index=True, sort=False)
+        tidy_frame = pd.concat([tidy_factors, tidy_values], axis=1)
+        return tidy_frame
+
     def data_from_master(self, master_data):
         """
         Converts data from a master data table into a dictionary
@@ -622,13 +1499,16 @@ class Experiment:
 
         return return_dict
 
-    def average_data(self, data_dict=None, average_along=None, averaging_type='first', sum_along=None):
+    def average_data(self, data_dict=None, average_along=None, averaging_type='first', sum_along=None, statistics=None, resample=None, bootstrap_kw={}):
         """
         User-facing function to average existing data along some axis
 
         :param data_dict: Data dict to average
-        :param average_along: The axis to average the data along
+        :param average_along: The axis (or list of axes) to average the data along
         :param averaging_type: (if Pandas DataFrame) whether to average the last column only ("last") or all columns but the first column ("first")
+        :param statistics: Additional statistics to compute for each group. Available statistics are "mean", "sum", "std", "sem", "median", and percentiles (i.e. 95 or "p95"). If specified, returns a tuple of (averaged_data, statistics_data), where statistics_data is a dictionary of statistic name: data dict.
+        :param resample: (if Pandas DataFrame) Interpolates each group onto a common grid of the first column before averaging. "union", "intersection", or an array of values. Use when replicates have different lengths or x-values.
+        :param bootstrap_kw: Keyword arguments for the bootstrap confidence interval of the mean (or sum) used by "ci_lower" and "ci_upper". Available arguments are confidence (default 0.95), n_resamples (default 10000), and seed.
         """
         if sum_along is not None and average_along is None:
             average_along = sum_along
@@ -641,44 +1521,58 @@ class Experiment:
         grouped_data = self.group_data(
             data_dict=data_dict, group_along=average_along,
             grouping_type='name')
+        reduction = 'sum' if summing else 'mean'
+        if statistics is None:
+            statistic_names = []
+        else:
+            statistic_names = [statistic_name(s) for s in statistics]
+        requested_statistics = [reduction] + \
+            [s for s in statistic_names if s != reduction]
+        bootstrap_kw = dict(bootstrap_kw, ci_statistic=reduction)
+        bootstrap_kw['seed'] = np.random.default_rng(
+                bootstrap_kw.get('seed', None))
+
         averaged_data = {}
+        statistics_data = {s: {} for s in statistic_names}
 
         for group_name, group in grouped_data.items():
-            first_name  = list(group.keys())[0]
             first_item = list(group.values())[0]
             is_pandas = isinstance(first_item, pd.DataFrame)
             data_is_scalar = is_scalar(first_item)
-            N_items = len(group)
 
             if is_pandas:
-                averaged_data[group_name] = first_item.copy()
-                if averaging_type == 'last':
-                    for data in group.values():
-                        averaged_data[group_name].iloc[:,-1] += data.iloc[:,-1]
-                    averaged_data[group_name].iloc[:,-1] -= first_item.iloc[:,-1]
-                    if not summing:
-                        averaged_data[group_name].iloc[:,-1] /= N_items
-
-                elif averaging_type == 'first':
-                    for data in group.values():
-                        averaged_data[group_name].iloc[:,1:] += data.iloc[:, 1:]
-                    averaged_data[group_name].iloc[:,1:] -= first_item.iloc[:,1:]
-                    if not summing:
-                        averaged_data[group_name].iloc[:,1:] /= N_items
-                else:
-                     raise ValueError(f'Averaging type {averaging_type} not recognized. Available types are "first" and "last"')
+                frames = list(group.values())
+                if resample is not None:
+                    frames = resample_frames(frames, grid=resample)
+                    first_item = frames[0]
+                columns = averaging_columns(first_item, averaging_type)
+                stack = stack_frames(frames, columns)
+                aggregated = aggregate_stack(
+                        stack, requested_statistics, **bootstrap_kw)
+                group_statistics = {
+                    s: replace_columns(first_item, columns, v) \
+                    for s, v in aggregated.items()}
 
             elif data_is_scalar:
-                averaged_data[group_name] = first_item
-                for data in group.values():
-                    averaged_data[group_name] += data
-                averaged_data[group_name] -= first_item
-                if not summing:
-                    averaged_data[group_name] /= N_items
+                stack, units = stack_scalars(list(group.values()))
+                aggregated = aggregate_stack(
+                        stack, requested_statistics, **bootstrap_kw)
+                if units is None:
+                    group_statistics = aggregated
+                else:
+                    group_statistics = {
+                        s: v * units for s, v in aggregated.items()}
             else:
                 raise ValueError(f'type {type(first_item)} not supported. Available types are scalar, Pandas Array')
 
-        return averaged_data
+            averaged_data[group_name] = group_statistics[reduction]
+            for s in statistic_names:
+                statistics_data[s][group_name] = group_statistics[s]
+
+        if statistics is None:
+            return averaged_data
+        else:
+            return averaged_data, statistics_data
 
     # This function is a mess. It needs to be split up into smaller functions. One for legend generation, one for data preparation, etc.
     # that have a clearly-delineated purpose.
@@ -688,7 +1582,7 @@ class Experiment:
         plotter=default_plotter, line_kw={}, subplot_kw={}, save_kw = {},
         theory_func=None, theory_kw={},
         theory_data=None, theory_exp=None,
-        postfix='', x_axis_include=[], x_axis_exclude=[], c_axis_include=[], c_axis_exclude=[]):
+        postfix='', x_axis_include=[], x_axis_exclude=[], c_axis_include=[], c_axis_exclude=[], pixels=None):
         """
         Generates figures from loaded data.
 
@@ -705,6 +1599,7 @@ class Experiment:
         :param x_axis_exclude: List of factors for which you do not want to be plotted on the x-axis
         :param c_axis_include: Complete list of factors for which you want to generate c-axis plots
         :param c_axis_exclude: Complete list of factors for which you do not want to be plotted on the c-axis
+        :param pixels: Horizontal resolution of the plots in pixels. When plotting the raw data without a quantity_func, datasets saved with a decimation pyramid are plotted from the coarsest level with at least this many points. See decimated_data. Defaults to the width of a matplotlib figure (figure.figsize times figure.dpi). Pass data_dict=self.data to plot the full-resolution data instead.
         """
         plotted_figs = []
         plotted_axes = []
@@ -715,7 +1610,12 @@ class Experiment:
             if postfix != '': postfix += self.major_separator
             postfix += 'summed'
 
-        if data_dict is None:
+        if data_dict is None and quantity_func is None:
+            if pixels is None:
+                pixels = int(plt.rcParams['figure.figsize'][0] *
+                             plt.rcParams['figure.dpi'])
+            data_dict = self.decimated_data(pixels)
+        elif data_dict is None:
             data_dict = self.data
 
         if representative:
@@ -734,7 +1634,7 @@ class Experiment:
         else:
             dict_to_plot = data_dict
 
-        first_value = list(dict_to_plot.values())[0]
+        first_value = next(iter(dict_to_plot.values()))
         data_is_scalar = is_scalar(first_value)
         if data_is_scalar:
             # Generate a bunch of dictionaries with the appropriate
@@ -0,0 +1,133 @@
+"""
+Lazily-loaded data dictionaries
+"""
+import sys
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+def data_size(data):
+    """
+    Estimates the memory used by a dataset in bytes
+
+    :param data: pandas DataFrame, numpy array, or scalar
+    """
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum())
+    elif isinstance(data, np.ndarray):
+        return data.nbytes
+    else:
+        return sys.getsizeof(data)
+
+class LazyData(MutableMapping):
+    """
+    Dictionary of named data which loads each dataset the first time it is accessed. If a memory budget is given, the least-recently used datasets are dropped from memory when the total size of the loaded data exceeds it, and are loaded again on their next access. Datasets assigned directly (rather than through a loader) are never dropped.
+
+    :param memory_budget: Maximum memory in bytes to use for loaded data, or None for no limit
+    """
+    def __init__(self, memory_budget=None):
+        self.memory_budget = memory_budget
+        self.loaders = {}
+        self.cache = OrderedDict()
+        self.sizes = {}
+
+    def add_loader(self, name, loader):
+        """
+        Adds a dataset which will be loaded when it is first accessed
+
+        :param name: Name of the dataset
+        :param loader: Function with no arguments which returns the dataset
+        """
+        self.loaders[name] = loader
+        self.unload(name)
+
+    def is_loaded(self, name):
+        return name in self.cache
+
+    def unload(self, name):
+        """
+        Drops a dataset from memory. It will be loaded again on its next access.
+        """
+        self.cache.pop(name, None)
+        self.sizes.pop(name, None)
+
+    def memory_usage(self):
+        """
+        Total estimated size of the datasets currently in memory in bytes
+        """
+        return sum(self.sizes.values())
+
+    def evict(self, keep=None):
+        """
+        Drops the least-recently used datasets until the memory used is within the memory budget
+
+        :param keep: Name of a dataset which should not be dropped
+        """
+        if self.memory_budget is None:
+            return
+        for name in list(self.cache.keys()):
+            if self.memory_usage() <= self.memory_budget:
+                break
+            if name != keep and self.loaders[name] is not None:
+                self.unload(name)
+
+    def __getitem__(self, name):
+        if name in self.cache:
+            self.cache.move_to_end(name)
+            return self.cache[name]
+        loader = self.loaders.get(name, None)
+        if loader is None:
+            raise KeyError(name)
+        data = loader()
+        self.cache[name] = data
+        self.sizes[name] = data_size(data)
+        self.evict(keep=name)
+        return data
+
+    def __setitem__(self, name, data):
+        self.loaders[name] = None
+        self.cache[name] = data
+        self.cache.move_to_end(name)
+        self.sizes[name] = data_size(data)
+        self.evict(keep=name)
+
+    def __delitem__(self, name):
+        del self.loaders[name]
+        self.unload(name)
+
+    def __contains__(self, name):
+        return name in self.loaders
+
+    def pop(self, name, *default):
+        """
+        Removes a dataset and returns it if it is in memory. Datasets which are not in memory are removed without being loaded, and None is returned for them.
+
+        :param name: Name of the dataset
+        :param default: Value returned if there is no dataset with this name. If not given, a KeyError is raised.
+        """
+        if name not in self.loaders:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        data = self.cache.get(name, None)
+        del self[name]
+        return data
+
+    def popitem(self):
+        """
+        Removes the most recently added dataset without loading it, and returns its name and its data if it is in memory (None otherwise)
+        """
+        if not self.loaders:
+            raise KeyError('popitem(): LazyData is empty')
+        name = next(reversed(list(self.loaders)))
+        return name, self.pop(name)
+
+    def __iter__(self):
+        return iter(self.loaders)
+
+    def __len__(self):
+        return len(self.loaders)
+
+    def __repr__(self):
+        return f'LazyData({len(self.cache)} of {len(self.loaders)} loaded)'
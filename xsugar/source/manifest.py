@@ -0,0 +1,123 @@
+"""
+Manifest of the datasets saved in an experiment, so the experiment can be reopened without scanning its data directory
+"""
+import os
+import json
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from sciparse import dict_to_string, string_to_dict
+from xsugar.source.columns import column_unit
+
+manifest_suffix = '.manifest'
+
+def metadata_hash(metadata):
+    """
+    Hash of a metadata dictionary
+
+    :param metadata: Dictionary of metadata
+    """
+    return hashlib.sha1(dict_to_string(metadata).encode()).hexdigest()
+
+def manifest_entry(name, filename, storage, data, metadata,
+                   compression=None, size=None, column_names=None,
+                   statistics=None, signature=None):
+    """
+    Creates the manifest entry of a single dataset
+
+    :param name: Name of the dataset
+    :param filename: Filename of the file containing the dataset, relative to the data directory
+    :param storage: Storage format of the file, i.e. "csv" or "archive"
+    :param data: The dataset, as a pandas DataFrame or numpy array, or None if the number of rows and columns are not known
+    :param metadata: Dictionary of metadata saved with the dataset
+    :param compression: Compression of the file, or None
+    :param size: Size of the dataset on disk in bytes
+    :param column_names: Names of the columns of a numpy array, or None if they are unnamed
+    :param statistics: Summary statistics of the columns of the dataset, as computed by column_summary
+    :param signature: Signature of the file when the dataset was saved, as computed by file_signature, used to detect files changed afterwards
+    """
+    if data is None:
+        rows = None
+        columns = None
+    elif isinstance(data, np.ndarray):
+        rows = len(data)
+        columns = None if column_names is None else \
+            [[c, column_unit(c)] for c in column_names]
+    else:
+        rows = len(data)
+        columns = [[str(c), column_unit(c)] for c in data.columns]
+    return {
+        'name': name,
+        'file': filename,
+        'format': storage,
+        'compression': compression,
+        'size': size,
+        'rows': rows,
+        'columns': columns,
+        'metadata': dict_to_string(metadata),
+        'metadata_hash': metadata_hash(metadata),
+        'statistics': statistics,
+        'signature': None if signature is None else list(signature)}
+
+class ExperimentManifest:
+    """
+    Append-only list of the datasets saved in an experiment, stored as one JSON entry per line. Saving a dataset with an existing name supersedes its previous entry. A partially-written last line left by an interrupted write is discarded when the manifest is loaded, so new entries start on a fresh line.
+
+    :param filename: Full filename of the manifest
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = OrderedDict()
+        if os.path.exists(filename):
+            self.load()
+
+    def load(self):
+        with open(self.filename, 'rb+') as fh:
+            offset = 0
+            for line in fh:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('Partially-written entry')
+                    entry = json.loads(line.decode())
+                except ValueError:
+                    fh.truncate(offset)
+                    break
+                self.entries[entry['name']] = entry
+                offset += len(line)
+
+    def add(self, entry):
+        """
+        Adds an entry to the manifest
+
+        :param entry: Manifest entry as generated by manifest_entry
+        """
+        self.entries[entry['name']] = entry
+        with open(self.filename, 'a') as fh:
+            fh.write(json.dumps(entry) + '\n')
+
+    def write(self):
+        """
+        Rewrites the manifest with only the latest entry of each dataset
+        """
+        temporary_filename = self.filename + '.tmp'
+        with open(temporary_filename, 'w') as fh:
+            for entry in self.entries.values():
+                fh.write(json.dumps(entry) + '\n')
+        os.replace(temporary_filename, self.filename)
+
+    def metadata(self, name):
+        """
+        Gets the metadata of a dataset
+
+        :param name: Name of the dataset
+        """
+        return string_to_dict(self.entries[name]['metadata'])
+
+    def names(self):
+        return list(self.entries.keys())
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
@@ -8,6 +8,12 @@ def dc_photocurrent(data, cond):
     voltages = column_from_unit(data, ureg.mV)
     return (voltages.mean() / cond['gain']).to(ureg.nA)
 
+def dc_photocurrent_summary(summary, cond):
+    voltage = summary.statistic('mean', ureg.mV)
+    return (voltage / cond['gain']).to(ureg.nA)
+
+dc_photocurrent.from_summary = dc_photocurrent_summary
+
 def modulated_photocurrent(data, cond):
     """
     Returns the RMS value of the modulated photocurrent given the system gain and a dataset using lock-in amplification.
@@ -0,0 +1,119 @@
+"""
+Multi-resolution decimation pyramids of raw time series, stored next to the raw data so long records can be plotted without loading every point
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from xsugar.source.storage import load_npy
+
+pyramid_suffix = '.pyramid'
+pyramid_statistics = ['mean', 'min', 'max']
+
+def decimate(values, factor):
+    """
+    Decimates the rows of an array into blocks of factor rows. The last block contains the remaining rows if the number of rows is not a multiple of factor.
+
+    :param values: 2D numpy array
+    :param factor: Number of rows in each block
+    :returns decimated: Dictionary of "mean", "min", and "max" arrays with one row per block
+    """
+    starts = np.arange(0, len(values), factor)
+    counts = np.diff(np.append(starts, len(values)))
+    return {
+        'mean': np.add.reduceat(values, starts, axis=0) / counts[:, None],
+        'min': np.minimum.reduceat(values, starts, axis=0),
+        'max': np.maximum.reduceat(values, starts, axis=0)}
+
+def write_pyramid(filename, data, factors, signature=None):
+    """
+    Writes the min/max/mean decimation levels of a DataFrame to a directory, replacing any existing pyramid, with one .npy file per level and statistic, and a pyramid.json file describing the levels. Only levels coarser than the data itself are written. DataFrames with non-numeric columns are not decimated.
+
+    :param filename: Name of the directory to write
+    :param data: pandas DataFrame whose first column is the x-axis (i.e. time)
+    :param factors: Decimation factors of each level (i.e. [10, 100, 1000])
+    :param signature: Signature of the raw data on disk (i.e. from file_signature), used to detect if the raw data has changed
+    :returns written: Whether the pyramid was written
+    """
+    shutil.rmtree(filename, ignore_errors=True)
+    if not all(isinstance(dtype, np.dtype) and np.issubdtype(dtype, np.number)
+               for dtype in data.dtypes):
+        return False
+    values = data.to_numpy(dtype=np.float64)
+    levels = sorted(f for f in factors if 1 < f < len(values))
+    if not levels:
+        return False
+    os.makedirs(filename, exist_ok=True)
+    for factor in levels:
+        for statistic, decimated in decimate(values, factor).items():
+            np.save(os.path.join(filename, f'level{factor}_{statistic}.npy'),
+                    decimated, allow_pickle=False)
+    description = {
+        'columns': [str(c) for c in data.columns],
+        'rows': len(values),
+        'levels': levels,
+        'signature': None if signature is None else list(signature)}
+    description_filename = os.path.join(filename, 'pyramid.json')
+    with open(description_filename + '.tmp', 'w') as fh:
+        json.dump(description, fh)
+    os.replace(description_filename + '.tmp', description_filename)
+    return True
+
+class DecimationPyramid:
+    """
+    Decimation levels of a dataset written by write_pyramid. Levels are memory-mapped, so only the levels which are used are read.
+
+    :param filename: Name of the directory containing the pyramid
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(os.path.join(filename, 'pyramid.json')) as fh:
+            description = json.load(fh)
+        self.columns = description['columns']
+        self.rows = description['rows']
+        self.levels = description['levels']
+        self.signature = description.get('signature', None)
+
+    def level(self, factor, statistic='mean'):
+        """
+        Gets one statistic of a decimation level
+
+        :param factor: Decimation factor of the level
+        :param statistic: "mean", "min", or "max"
+        :returns data: pandas DataFrame with the same columns as the raw data, and one row per block
+        """
+        if factor not in self.levels:
+            raise ValueError(f'Decimation level {factor} not found. Available levels are {self.levels}')
+        if statistic not in pyramid_statistics:
+            raise ValueError(f'Statistic {statistic} not recognized. Available statistics are {pyramid_statistics}')
+        values = load_npy(os.path.join(
+                self.filename, f'level{factor}_{statistic}.npy'))
+        return pd.DataFrame(values, columns=self.columns, copy=False)
+
+    def envelope(self, factor):
+        """
+        Gets a decimation level for plotting. Each block becomes two points, at the mean of the first (x-axis) column, with the minimum and the maximum of the remaining columns, so peaks are preserved in the plot.
+
+        :param factor: Decimation factor of the level
+        :returns data: pandas DataFrame with the same columns as the raw data
+        """
+        minimum = self.level(factor, 'min').to_numpy()
+        maximum = self.level(factor, 'max').to_numpy()
+        values = np.stack([minimum, maximum], axis=1).reshape(
+                -1, len(self.columns))
+        values[:, 0] = np.repeat(self.level(factor, 'mean').iloc[:, 0], 2)
+        return pd.DataFrame(values, columns=self.columns)
+
+    def select_level(self, points):
+        """
+        Selects the coarsest level with at least the given number of blocks (i.e. the number of horizontal pixels of a plot)
+
+        :param points: Minimum number of blocks
+        :returns factor: Decimation factor of the level, or None if no level is fine enough and the raw data should be used
+        """
+        adequate_levels = [f for f in self.levels \
+                           if -(-self.rows // f) >= points]
+        if not adequate_levels:
+            return None
+        return max(adequate_levels)
@@ -0,0 +1,47 @@
+"""
+Binary snapshots of the in-memory state of an experiment, so loaded and derived data can be reopened without parsing the raw data again
+"""
+import os
+import json
+import pickle
+
+snapshot_magic = b'XSUGAR-SNAPSHOT\n'
+snapshot_version = 1
+
+def write_snapshot(filename, header, state):
+    """
+    Writes a snapshot file, consisting of a magic line, a JSON header line, and the pickled state. The file is replaced atomically.
+
+    :param filename: Full filename of the snapshot
+    :param header: Dictionary describing the snapshot, readable without unpickling the state. The snapshot version is added to it.
+    :param state: Object to pickle
+    """
+    header = dict(header, version=snapshot_version)
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'wb') as fh:
+        fh.write(snapshot_magic)
+        fh.write(json.dumps(header).encode() + b'\n')
+        pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_filename, filename)
+
+def read_snapshot_header(fh):
+    if fh.readline() != snapshot_magic:
+        raise ValueError(f'{fh.name} is not an xsugar snapshot')
+    header = json.loads(fh.readline().decode())
+    if header['version'] != snapshot_version:
+        raise ValueError(f'Snapshot {fh.name} has version {header["version"]}, but only version {snapshot_version} can be read. Recreate the snapshot from the raw data.')
+    return header
+
+def read_snapshot(filename, header_only=False):
+    """
+    Reads a snapshot file written by write_snapshot. Snapshots are unpickled, so only read snapshots from trusted sources.
+
+    :param filename: Full filename of the snapshot
+    :param header_only: If True, only reads the header
+    :returns (header, state): The header and the unpickled state (None if header_only)
+    """
+    with open(filename, 'rb') as fh:
+        header = read_snapshot_header(fh)
+        if header_only:
+            return header, None
+        return header, pickle.load(fh)
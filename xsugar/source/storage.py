@@ -0,0 +1,591 @@
+"""
+Storage backends for raw data. Each parser has the same signature as sciparse's parse_default, so they can be used interchangeably to read and write data.
+"""
+import os
+import re
+import json
+import itertools
+import hashlib
+import numpy as np
+import pandas as pd
+from sciparse import parse_default, parse_xrd, dict_to_string, string_to_dict
+from xsugar.source.columns import select_columns, column_unit
+from xsugar.source.compression import compression_formats, open_compressed, compression_from_filename, strip_compression_extension, decompressed_copy
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+metadata_key = b'xsugar_metadata'
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError('pyarrow is required for the parquet and feather storage formats. Install it with "pip install pyarrow"')
+
+def table_from_frame(data, metadata):
+    """
+    Converts a DataFrame into a pyarrow Table, storing the metadata in the key-value metadata of the schema.
+
+    :param data: pandas DataFrame to convert
+    :param metadata: Dictionary of metadata to store
+    """
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    schema_metadata = dict(table.schema.metadata or {})
+    schema_metadata[metadata_key] = dict_to_string(metadata).encode()
+    return table.replace_schema_metadata(schema_metadata)
+
+def frame_from_table(table):
+    """
+    Converts a pyarrow Table written by table_from_frame back into a DataFrame and its metadata
+    """
+    schema_metadata = table.schema.metadata or {}
+    if metadata_key in schema_metadata:
+        metadata = string_to_dict(schema_metadata[metadata_key].decode())
+    else:
+        metadata = {}
+    return table.to_pandas(), metadata
+
+def parse_csv(filename, data=None, metadata=None, read_write='r', precision=None):
+    """
+    Parser for data in the same format as parse_default, which is compressed if the filename ends in a compression extension (i.e. ".csv.gz" or ".csv.zst"). The file is compressed and decompressed as a stream.
+
+    :param filename: Name of the file to be written
+    :param data: Data to write to file
+    :param metadata: Metadata to write to file
+    :param read_write: "r" or "w". Read or write.
+    :param precision: (if writing) Number of significant digits of floating-point values. If None, values are written with full round-trip precision. See write_csv.
+    """
+    if read_write == 'r':
+        with open_compressed(filename, 'rt') as fh:
+            metadata = string_to_dict(fh.readline().rstrip('\n'))
+            data = pd.read_csv(fh)
+        return data, metadata
+    elif read_write == 'w':
+        with open_compressed(filename, 'wt') as fh:
+            fh.write(dict_to_string(metadata) + '\n')
+            write_csv(fh, data, precision=precision)
+
+def csv_column_format(dtype, precision=None):
+    """
+    Gets the printf-style format of a column written by write_csv, or None if the column cannot be formatted without pandas
+
+    :param dtype: numpy dtype of the column
+    :param precision: Number of significant digits of floating-point values, or None for full precision
+    """
+    if not isinstance(dtype, np.dtype):
+        return None
+    elif dtype == np.float64:
+        return '%r' if precision is None else f'%.{precision}g'
+    elif dtype == np.bool_:
+        return '%r'
+    elif np.issubdtype(dtype, np.integer):
+        return '%d'
+    return None
+
+def write_csv(fh, data, precision=None, block_rows=2**16):
+    """
+    Writes a DataFrame as CSV in the same format as DataFrame.to_csv(index=False). Numeric columns are formatted a block of rows at a time with a single printf-style format operation (one call into the string formatter per block, rather than one per value) and written as one large string, which is several times faster than to_csv. Frames with other column types (including pandas extension dtypes) or missing values are written with to_csv.
+
+    :param fh: Text file handle to write to
+    :param data: pandas DataFrame to write
+    :param precision: Number of significant digits of floating-point values. If None, values are written with full round-trip precision, as with to_csv.
+    :param block_rows: Number of rows formatted and written at once
+    """
+    formats = [csv_column_format(dtype, precision) for dtype in data.dtypes]
+    columns = [data.iloc[:, i].to_numpy() for i in range(data.shape[1])]
+    fast = data.shape[1] > 0 and None not in formats and \
+        not any(v.dtype == np.float64 and np.isnan(v).any() for v in columns)
+    if not fast:
+        float_format = None if precision is None else f'%.{precision}g'
+        data.to_csv(fh, index=False, float_format=float_format)
+        return
+
+    data.iloc[:0].to_csv(fh, index=False)
+    row_format = ','.join(formats) + '\n'
+    for start in range(0, len(data), block_rows):
+        block = [v[start:start + block_rows].tolist() for v in columns]
+        values = tuple(itertools.chain.from_iterable(zip(*block)))
+        fh.write((row_format * len(block[0])) % values)
+
+def parse_parquet(filename, data=None, metadata=None, read_write='r', columns=None, compression=None):
+    """
+    Parser for data in the Apache Parquet format. Metadata is stored in the key-value metadata of the file.
+
+    :param filename: Name of the file to be written
+    :param data: Data to write to file
+    :param metadata: Metadata to write to file
+    :param read_write: "r" or "w". Read or write.
+    :param columns: (if reading) Names or units of the columns to read. All columns are read if None. See select_columns.
+    :param compression: (if writing) Compression codec used inside the file, i.e. "zstd" or "gzip"
+    """
+    require_pyarrow()
+    if read_write == 'r':
+        if columns is not None:
+            columns = select_columns(pq.read_schema(filename).names, columns)
+        return frame_from_table(pq.read_table(filename, columns=columns))
+    elif read_write == 'w':
+        if compression is None:
+            compression = 'none'
+        pq.write_table(table_from_frame(data, metadata), filename,
+                       compression=compression)
+
+def parse_feather(filename, data=None, metadata=None, read_write='r', columns=None, compression=None):
+    """
+    Parser for data in the Apache Arrow Feather (v2) format. Metadata is stored in the key-value metadata of the file.
+
+    :param filename: Name of the file to be written
+    :param data: Data to write to file
+    :param metadata: Metadata to write to file
+    :param read_write: "r" or "w". Read or write.
+    :param columns: (if reading) Names or units of the columns to read. All columns are read if None. See select_columns.
+    :param compression: (if writing) Compression codec used inside the file, "zstd" or "lz4"
+    """
+    require_pyarrow()
+    if read_write == 'r':
+        if columns is not None:
+            with pa.memory_map(filename) as source:
+                column_names = pa.ipc.open_file(source).schema.names
+            columns = select_columns(column_names, columns)
+        return frame_from_table(feather.read_table(filename, columns=columns))
+    elif read_write == 'w':
+        if compression is None:
+            compression = 'uncompressed'
+        feather.write_feather(table_from_frame(data, metadata), filename,
+                              compression=compression)
+
+def column_runs(data):
+    """
+    Splits the columns of a DataFrame into runs of consecutive columns which share the same dtype
+
+    :param data: pandas DataFrame
+    :returns runs: List of lists of integer column locations
+    """
+    runs = []
+    previous_dtype = None
+    for i, dtype in enumerate(data.dtypes):
+        if runs and dtype == previous_dtype:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+        previous_dtype = dtype
+    return runs
+
+def load_npy(filename, mmap_mode='r'):
+    try:
+        return np.load(filename, mmap_mode=mmap_mode, allow_pickle=False)
+    except ValueError: # Empty arrays cannot be memory-mapped
+        return np.load(filename, allow_pickle=False)
+
+def save_npy(filename, values):
+    """
+    Saves an array to a .npy file by writing a temporary file and replacing the file with it, so arrays memory-mapped from the previous file keep their contents
+
+    :param filename: Full filename of the .npy file
+    :param values: numpy array
+    """
+    with open(filename + '.tmp', 'wb') as fh:
+        np.save(fh, values, allow_pickle=False)
+    os.replace(filename + '.tmp', filename)
+
+def parse_npy(filename, data=None, metadata=None, read_write='r', mmap_mode='r', columns=None):
+    """
+    Parser for data stored as a directory of .npy files, with one file for each run of columns sharing the same dtype, and a columns.json sidecar describing the columns, their units, and the metadata. Columns are stored contiguously and loaded as memory-mapped arrays, so only the parts of the data which are actually used are read from disk.
+
+    numpy arrays are written unchanged as a single block and read back as (memory-mapped) numpy arrays rather than DataFrames.
+
+    :param filename: Name of the directory to be written
+    :param data: Data to write to file, as a pandas DataFrame or numpy array
+    :param metadata: Metadata to write to file
+    :param read_write: "r" or "w". Read or write.
+    :param mmap_mode: Memory-map mode passed to numpy.load when reading. None loads the data into memory.
+    :param columns: (if reading) Names or units of the columns to read. All columns are read if None, otherwise only the blocks containing the requested columns are opened. See select_columns.
+    """
+    sidecar_filename = os.path.join(filename, 'columns.json')
+    if read_write == 'r':
+        with open(sidecar_filename) as fh:
+            sidecar = json.load(fh)
+        if sidecar.get('kind', None) == 'array':
+            return read_npy_array(filename, sidecar, mmap_mode, columns)
+        if columns is not None:
+            column_names = [c for block in sidecar['blocks'] \
+                            for c in block['columns']]
+            columns = select_columns(column_names, columns)
+        frames = []
+        for block in sidecar['blocks']:
+            if columns is not None and \
+                    not any(c in columns for c in block['columns']):
+                continue
+            values = load_npy(
+                    os.path.join(filename, block['file']), mmap_mode=mmap_mode)
+            frames.append(pd.DataFrame(
+                values, columns=block['columns'], copy=False))
+        if len(frames) == 0:
+            data = pd.DataFrame()
+        elif len(frames) == 1:
+            data = frames[0]
+        else:
+            data = pd.concat(frames, axis=1, copy=False)
+        if columns is not None:
+            data = data[columns]
+        return data, string_to_dict(sidecar['metadata'])
+
+    elif read_write == 'w' and isinstance(data, np.ndarray):
+        write_npy_array(filename, data, metadata)
+    elif read_write == 'w':
+        os.makedirs(filename, exist_ok=True)
+        blocks = []
+        for i, run in enumerate(column_runs(data)):
+            values = data.iloc[:, run].to_numpy()
+            if values.dtype == object:
+                values = values.astype(str)
+            block_filename = f'block{i}.npy'
+            save_npy(os.path.join(filename, block_filename),
+                     np.asfortranarray(values))
+            blocks.append({
+                'file': block_filename,
+                'columns': [str(c) for c in data.columns[run]]})
+        units = {str(c): column_unit(c) for c in data.columns}
+        write_npy_sidecar(filename, {
+            'metadata': dict_to_string(metadata),
+            'blocks': blocks,
+            'units': units,
+            'shape': list(data.shape)})
+
+def write_npy_sidecar(filename, sidecar):
+    sidecar_filename = os.path.join(filename, 'columns.json')
+    with open(sidecar_filename + '.tmp', 'w') as fh:
+        json.dump(sidecar, fh)
+    os.replace(sidecar_filename + '.tmp', sidecar_filename)
+
+def write_npy_array(filename, data, metadata, column_names=None):
+    """
+    Writes a numpy array in the format of parse_npy. The array is written directly from its buffer, without conversion to a DataFrame.
+
+    :param filename: Name of the directory to be written
+    :param data: numpy array with one or two dimensions
+    :param metadata: Metadata to write to file
+    :param column_names: Names of the columns of the array, or None if the columns are unnamed
+    """
+    if data.dtype == object:
+        raise ValueError('Cannot save numpy arrays with dtype object. Convert the array to a numeric dtype first.')
+    os.makedirs(filename, exist_ok=True)
+    save_npy(os.path.join(filename, 'block0.npy'), data)
+    if column_names is None:
+        units = None
+    else:
+        units = {c: column_unit(c) for c in column_names}
+    write_npy_sidecar(filename, {
+        'metadata': dict_to_string(metadata),
+        'kind': 'array',
+        'blocks': [{'file': 'block0.npy', 'columns': column_names}],
+        'units': units,
+        'shape': list(data.shape)})
+
+def read_npy_array(filename, sidecar, mmap_mode='r', columns=None):
+    """
+    Reads a numpy array written by write_npy_array
+
+    :param filename: Name of the directory
+    :param sidecar: Dictionary read from the columns.json sidecar
+    :param mmap_mode: Memory-map mode passed to numpy.load. None loads the data into memory.
+    :param columns: Names or units of the columns to read. All columns are read if None. See select_columns.
+    :returns (data, metadata): The array and the metadata
+    """
+    block = sidecar['blocks'][0]
+    data = load_npy(os.path.join(filename, block['file']), mmap_mode=mmap_mode)
+    if columns is not None:
+        column_names = block['columns'] or []
+        columns = select_columns(column_names, columns)
+        if data.ndim > 1:
+            data = data[:, [column_names.index(c) for c in columns]]
+    return data, string_to_dict(sidecar['metadata'])
+
+storage_compression = {
+    'csv': list(compression_formats.keys()),
+    'parquet': ['snappy', 'gzip', 'brotli', 'zstd', 'lz4'],
+    'feather': ['zstd', 'lz4'],
+    'npy': [],
+    'archive': [],
+}
+
+storage_formats = {
+    'csv': ('.csv', parse_default),
+    'parquet': ('.parquet', parse_parquet),
+    'feather': ('.feather', parse_feather),
+    'npy': ('.npyd', parse_npy),
+}
+
+def parser_from_filename(filename):
+    """
+    Gets the parser for a file of raw data from its extension, ignoring any compression extension. Defaults to parse_default for unknown extensions.
+
+    :param filename: Name of the file
+    """
+    extension = os.path.splitext(strip_compression_extension(filename))[1]
+    for format_extension, parser in storage_formats.values():
+        if extension == format_extension:
+            return parser
+    return parse_default
+
+def parse_csv_columns(filename, columns):
+    """
+    Reads a subset of the columns of a file written by parse_default or parse_csv. Only the requested columns are converted by the CSV reader.
+
+    :param filename: Full filename of the file
+    :param columns: Names or units of the columns to read. See select_columns.
+    :returns (data, metadata): The selected columns and the metadata
+    """
+    with open_compressed(filename, 'rt') as fh:
+        metadata = string_to_dict(fh.readline().rstrip('\n'))
+        column_names = pd.read_csv(fh, nrows=0).columns
+    columns = select_columns(column_names, columns)
+    with open_compressed(filename, 'rt') as fh:
+        fh.readline()
+        data = pd.read_csv(fh, usecols=columns)
+    return data[columns], metadata
+
+def load_columns(filename, columns, parser=None):
+    """
+    Reads a subset of the columns of a file of raw data. The built-in formats only read the requested columns; other parsers read the whole file and the columns are selected afterwards.
+
+    :param filename: Full filename of the file
+    :param columns: Names or units of the columns to read. See select_columns.
+    :param parser: Parser used to read the file. If None, chosen from the file extension.
+    :returns (data, metadata): The selected columns and the metadata
+    """
+    if parser is None:
+        parser = parser_from_filename(filename)
+    if parser in [parse_default, parse_csv]:
+        return parse_csv_columns(filename, columns)
+    elif parser in [parse_parquet, parse_feather, parse_npy] and \
+            compression_from_filename(filename) is None:
+        return parser(filename, columns=columns)
+    else:
+        data, metadata = load_file(filename, parser=parser)
+        return data[select_columns(data.columns, columns)], metadata
+
+def read_xrd(file_handle):
+    """
+    Reads XRD data in the same format as sciparse's parse_xrd from an open text file, so compressed XRD files can be decompressed as a stream
+
+    :param file_handle: File opened in text mode
+    :returns (data, metadata): The data and metadata
+    """
+    reg_pattern = re.compile(r'\w+=\S*\w+')
+    interesting_names = [
+        'drivename', 'startposition', 'date', 'time', 'increment',
+        'scantype', 'start', 'steps']
+    metadata = {}
+    current_drive = None
+    while True:
+        line = file_handle.readline()
+        if line == '[Data]\n' or not line:
+            break
+        line = line.rstrip('\n')
+        if not reg_pattern.match(line):
+            continue
+        name, val = [x.lower() for x in line.split('=')[:2]]
+        if name not in interesting_names:
+            continue
+        if name == 'drivename':
+            current_drive = val
+        elif name == 'startposition':
+            metadata[current_drive] = float(val)
+        else:
+            try:
+                metadata[name] = int(val)
+            except ValueError:
+                try:
+                    metadata[name] = float(val)
+                except ValueError:
+                    metadata[name] = val
+    data = pd.read_csv(file_handle)
+    data = data.loc[:, ~data.columns.str.contains('^Unnamed')]
+    data = data.rename(columns=lambda x: x.strip())
+    data = data.rename(columns={'Angle': 'Angle (deg)', 'Det1Disc1': 'Counts'})
+    return data, metadata
+
+def load_file(filename, parser=None):
+    """
+    Reads a file of raw data, decompressing it if it is compressed. Compressed CSV and XRD files are decompressed as a stream. For other parsers, which can only read from a filename, the file is first decompressed into a temporary file.
+
+    :param filename: Full filename of the file
+    :param parser: Parser used to read the file. If None, chosen from the file extension.
+    :returns (data, metadata): The data and metadata
+    """
+    if parser is None:
+        parser = parser_from_filename(filename)
+    if compression_from_filename(filename) is None:
+        return parser(filename)
+    elif parser in [parse_default, parse_csv]:
+        return parse_csv(filename)
+    elif parser is parse_xrd:
+        with open_compressed(filename, 'rt') as fh:
+            return read_xrd(fh)
+    with decompressed_copy(filename) as temporary_filename:
+        return parser(temporary_filename)
+
+def file_list(filename):
+    """
+    Lists the files making up a dataset, which is either a single file or a directory of files
+
+    :param filename: Full filename of the file or directory
+    """
+    if os.path.isdir(filename):
+        return [os.path.join(filename, fn) for fn in sorted(os.listdir(filename))]
+    return [filename]
+
+def file_size(filename):
+    """
+    Gets the total size in bytes of a file (or directory of files)
+
+    :param filename: Full filename of the file or directory
+    """
+    return sum(os.path.getsize(fn) for fn in file_list(filename))
+
+def storage_from_filename(filename):
+    """
+    Gets the storage format of a file of raw data from its extension, ignoring any compression extension, or None if it is not one of the storage formats.
+
+    :param filename: Name of the file
+    """
+    extension = os.path.splitext(strip_compression_extension(filename))[1]
+    for storage, (format_extension, _) in storage_formats.items():
+        if extension == format_extension:
+            return storage
+    return None
+
+def file_signature(filename):
+    """
+    Gets a cheap signature of a file (or directory of files) from its size and modification time, which changes whenever the file is modified.
+
+    :param filename: Full filename of the file or directory
+    """
+    signature = []
+    for fn in file_list(filename):
+        stat = os.stat(fn)
+        signature += [stat.st_size, stat.st_mtime_ns]
+    return tuple(signature)
+
+def file_hash(filename, chunk_size=2**20):
+    """
+    Computes a hash of the contents of a file (or directory of files)
+
+    :param filename: Full filename of the file or directory
+    :param chunk_size: Number of bytes to read at once
+    """
+    content_hash = hashlib.sha1()
+    for fn in file_list(filename):
+        with open(fn, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(chunk_size), b''):
+                content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+def read_metadata(filename, parser=None):
+    """
+    Reads the metadata from a file of raw data. For the built-in formats only the header of the file is read, not the data.
+
+    :param filename: Full filename of the file
+    :param parser: Parser used to read the file. If None, chosen from the file extension.
+    """
+    if parser is None:
+        parser = parser_from_filename(filename)
+    if parser in [parse_default, parse_csv]:
+        with open_compressed(filename, 'rt') as fh:
+            return string_to_dict(fh.readline().rstrip('\n'))
+    elif compression_from_filename(filename) is not None:
+        return load_file(filename, parser=parser)[1]
+    elif parser is parse_parquet:
+        require_pyarrow()
+        schema_metadata = pq.read_schema(filename).metadata or {}
+    elif parser is parse_feather:
+        require_pyarrow()
+        with pa.memory_map(filename) as source:
+            schema_metadata = pa.ipc.open_file(source).schema.metadata or {}
+    elif parser is parse_npy:
+        with open(os.path.join(filename, 'columns.json')) as fh:
+            return string_to_dict(json.load(fh)['metadata'])
+    else:
+        return parser(filename)[1]
+
+    if metadata_key in schema_metadata:
+        return string_to_dict(schema_metadata[metadata_key].decode())
+    return {}
+
+def read_experiment_metadata(filename):
+    """
+    Reads the metadata shared by a whole experiment, or an empty dictionary if it has not been saved
+
+    :param filename: Full filename of the experiment metadata file
+    """
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as fh:
+        return string_to_dict(fh.readline().rstrip('\n'))
+
+def write_experiment_metadata(filename, metadata):
+    """
+    Writes the metadata shared by a whole experiment
+
+    :param filename: Full filename of the experiment metadata file
+    :param metadata: Dictionary of metadata
+    """
+    temporary_filename = filename + '.tmp'
+    with open(temporary_filename, 'w') as fh:
+        fh.write(dict_to_string(metadata) + '\n')
+    os.replace(temporary_filename, filename)
+
+class DataSource:
+    """
+    A single named dataset stored on disk, which can be loaded on demand.
+
+    :param name: Name of the dataset
+    :param filename: Full filename of the file or archive containing the dataset
+    :param parser: Parser used to read the file. If None, chosen from the file extension.
+    :param archive: ExperimentArchive containing the dataset, if it is stored in an archive
+    :param columns: Names or units of the columns to load. All columns are loaded if None. See select_columns.
+    """
+    def __init__(self, name, filename, parser=None, archive=None, columns=None):
+        self.name = name
+        self.filename = filename
+        self.parser = parser
+        self.archive = archive
+        self.columns = columns
+
+    def load(self):
+        """
+        :returns (data, metadata): The dataset and its metadata
+        """
+        if self.archive is not None:
+            return self.archive.read(self.name, columns=self.columns)
+        if self.columns is not None:
+            return load_columns(
+                    self.filename, self.columns, parser=self.parser)
+        return load_file(self.filename, parser=self.parser)
+
+    def load_data(self):
+        return self.load()[0]
+
+    def signature(self):
+        """
+        Cheap signature which changes whenever the dataset is modified
+        """
+        if self.archive is not None:
+            return self.archive.index[self.name]
+        return file_signature(self.filename)
+
+    def content_hash(self):
+        """
+        Hash of the contents of the dataset
+        """
+        if self.archive is not None:
+            return str(self.archive.index[self.name])
+        return file_hash(self.filename)
+
+    def load_metadata(self):
+        if self.archive is not None:
+            return self.archive.read_metadata(self.name)
+        return read_metadata(self.filename, parser=self.parser)
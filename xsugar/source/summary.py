@@ -0,0 +1,88 @@
+"""
+Summary statistics of the columns of raw data, computed when the data is saved so that simple derived quantities can be found without reloading the data
+"""
+import numpy as np
+import pandas as pd
+from xsugar import ureg
+from xsugar.source.columns import select_columns, column_unit
+
+summary_statistics = ['count', 'mean', 'rms', 'min', 'max', 'variance']
+
+def column_summary(data, column_names=None):
+    """
+    Computes the number of values, mean, RMS, minimum, maximum, and (population) variance of each numeric column of a dataset. As with numpy, the statistics of columns containing NaNs are NaN, so they match the quantities computed from the data itself.
+
+    :param data: pandas DataFrame or numpy array with one or two dimensions
+    :param column_names: Names of the columns of a numpy array. Defaults to the column indices.
+    :returns statistics: Dictionary of column name: dictionary of statistic: value
+    """
+    if isinstance(data, pd.DataFrame):
+        columns = [(str(c), data[c].to_numpy()) for c in data.columns]
+    elif isinstance(data, np.ndarray) and data.ndim in [1, 2]:
+        values = data.reshape(len(data), -1)
+        if column_names is None:
+            column_names = [str(i) for i in range(values.shape[1])]
+        columns = list(zip(column_names, values.T))
+    else:
+        raise ValueError(f'Cannot summarize data of type {type(data)}. Can only summarize pandas DataFrames and 1D or 2D numpy arrays')
+
+    statistics = {}
+    for name, values in columns:
+        if not np.issubdtype(values.dtype, np.number) or \
+                np.issubdtype(values.dtype, np.complexfloating) or \
+                len(values) == 0:
+            continue
+        mean = float(np.mean(values))
+        variance = float(np.var(values))
+        statistics[name] = {
+            'count': len(values),
+            'mean': mean,
+            'rms': float(np.sqrt(variance + mean ** 2)),
+            'min': float(np.min(values)),
+            'max': float(np.max(values)),
+            'variance': variance}
+    return statistics
+
+class DataSummary:
+    """
+    Summary statistics of a dataset, as computed by column_summary, which can stand in for the dataset in quantity functions which only need those statistics.
+
+    :param statistics: Dictionary of column name: dictionary of statistic: value
+    """
+    def __init__(self, statistics):
+        self.statistics = statistics
+
+    def columns(self):
+        return list(self.statistics.keys())
+
+    def statistic(self, statistic, column):
+        """
+        Gets a statistic of a column, with the units of the column
+
+        :param statistic: One of "count", "mean", "rms", "min", "max", or "variance"
+        :param column: Name or unit of the column (i.e. ureg.mV). See select_columns.
+        """
+        if statistic not in summary_statistics:
+            raise ValueError(f'Statistic {statistic} not recognized. Available statistics are {summary_statistics}')
+        name = select_columns(self.columns(), [column])[0]
+        value = self.statistics[name][statistic]
+        unit = column_unit(name)
+        if statistic == 'count' or not unit:
+            return value
+        elif statistic == 'variance':
+            return value * ureg.Unit(unit) ** 2
+        return value * ureg.Unit(unit)
+
+def summary_quantity(statistic, column):
+    """
+    Creates a quantity function for derived_quantity which returns a statistic of a column. When used on the raw data of an experiment, the statistic is read from the summary saved with each dataset instead of loading the data.
+
+    :param statistic: One of "count", "mean", "rms", "min", "max", or "variance"
+    :param column: Name or unit of the column (i.e. ureg.mV). See select_columns.
+    """
+    def quantity_func(data, cond):
+        return DataSummary(column_summary(data)).statistic(statistic, column)
+    def from_summary(summary, cond):
+        return summary.statistic(statistic, column)
+    quantity_func.from_summary = from_summary
+    return quantity_func
@@ -0,0 +1,81 @@
+"""
+Tests conversion of experiment data to and from Apache Arrow
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from shutil import rmtree
+from numpy.testing import assert_equal
+from xsugar import Experiment, ureg
+
+pa = pytest.importorskip('pyarrow')
+
+@pytest.fixture
+def exp_arrow(exp_data):
+    exp = Experiment(name='TEST1', kind='test', frequency=8500)
+    for temperature in [25, 50]:
+        for wavelength in [700, 800]:
+            name = exp.nameFromCondition({
+                'temperature': temperature, 'wavelength': wavelength * ureg.nm})
+            exp.data[name] = pd.DataFrame({
+                'Time (ms)': np.arange(3.0),
+                'Voltage (mV)': np.arange(3.0) + temperature})
+    yield exp
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_to_arrow_raw_data(exp_arrow):
+    table = exp_arrow.to_arrow()
+    assert_equal(table.num_rows, 12)
+    assert_equal(table.column_names,
+        ['condition', 'temperature', 'wavelength', 'Time (ms)', 'Voltage (mV)'])
+    assert_equal(pa.types.is_dictionary(table.schema.field('wavelength').type),
+                 True)
+    assert_equal(table.schema.field('wavelength').metadata[b'unit'],
+                 b'nanometer')
+    assert_equal(table.schema.field('Voltage (mV)').metadata[b'unit'],
+                 b'millivolt')
+    assert_equal(table.column('temperature').chunk(2).dictionary.to_pylist(),
+                 [25, 50])
+
+    first_frame = next(iter(exp_arrow.data.values()))
+    first_chunk = table.column('Voltage (mV)').chunk(0)
+    assert_equal(first_chunk.buffers()[1].address,
+                 first_frame['Voltage (mV)'].to_numpy().ctypes.data)
+
+def test_arrow_round_trip_raw_data(exp_arrow):
+    table = exp_arrow.to_arrow()
+    data = exp_arrow.from_arrow(table)
+    assert_equal(list(data.keys()), list(exp_arrow.data.keys()))
+    for name in exp_arrow.data.keys():
+        assert_frame_equal(data[name], exp_arrow.data[name])
+
+@pytest.mark.parametrize('empty_names', [[0], [1, 2], [0, 1, 2, 3]])
+def test_arrow_round_trip_empty(exp_arrow, empty_names):
+    names = list(exp_arrow.data.keys())
+    for i in empty_names:
+        exp_arrow.data[names[i]] = exp_arrow.data[names[i]].iloc[:0]
+    data = exp_arrow.from_arrow(exp_arrow.to_arrow())
+    assert_equal(list(data.keys()), names)
+    for name in names:
+        assert_frame_equal(data[name], exp_arrow.data[name])
+
+def test_arrow_round_trip_scalars(exp_arrow):
+    data_dict = {name: i * ureg.nA \
+                 for i, name in enumerate(exp_arrow.data.keys())}
+    table = exp_arrow.to_arrow(data_dict)
+    assert_equal(table.schema.field('Value').metadata[b'unit'], b'nanoampere')
+    assert_equal(exp_arrow.from_arrow(table), data_dict)
+
+def test_arrow_round_trip_master(exp_arrow):
+    data_dict = {name: i * ureg.nA \
+                 for i, name in enumerate(exp_arrow.data.keys())}
+    master_table = exp_arrow.master_data(data_dict)
+    table = exp_arrow.to_arrow(master_table)
+    assert_equal(pa.types.is_dictionary(table.schema.field('temperature').type),
+                 True)
+    assert_equal(pa.types.is_dictionary(
+        table.schema.field('wavelength (nm)').type), True)
+    assert_equal(pa.types.is_dictionary(table.schema[-1].type), False)
+    assert_frame_equal(exp_arrow.from_arrow(table), master_table)
@@ -8,7 +8,7 @@ from pandas.testing import assert_frame_equal
 import os
 from shutil import rmtree
 from numpy.testing import assert_equal, assert_allclose
-from xsugar import Experiment, ureg
+from xsugar import Experiment, ureg, WelfordAccumulator, bootstrap_interval, interpolate_columns
 from ast import literal_eval
 from itertools import zip_longest
 from spectralpy import power_spectrum
@@ -93,6 +93,193 @@ def test_sum_data_pandas(exp, convert_name):
             sum_along='replicate')
     assertDataDictEqual(summed_data_actual, summed_data_desired)
 
+def test_average_data_statistics(exp, convert_name):
+    fudge_data_1 = pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': [0.5, 0.6, 0.7]})
+    fudge_data_2 = pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': [1, 1.2, 1.4]})
+    name_1 = convert_name('TEST1~wavelength-1~replicate-0')
+    name_2 = convert_name('TEST1~wavelength-1~replicate-1')
+    group_name = convert_name('TEST1~wavelength-1')
+    data_dict = {name_1: fudge_data_1, name_2: fudge_data_2}
+
+    std_desired = np.std([[0.5, 0.6, 0.7], [1, 1.2, 1.4]], axis=0, ddof=1)
+    averaged_desired = {group_name: pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': [0.75, 0.9, 1.05]})}
+    statistics_desired = {
+        'std': {group_name: pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': std_desired})},
+        'sem': {group_name: pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': std_desired / np.sqrt(2)})},
+        'median': {group_name: pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': [0.75, 0.9, 1.05]})},
+        'p100': {group_name: pd.DataFrame({'Time (ms)': [1, 2, 3],
+                               'Photocurrent (nA)': [1, 1.2, 1.4]})},
+    }
+    averaged_actual, statistics_actual = exp.average_data(
+            data_dict, average_along='replicate',
+            statistics=['std', 'sem', 'median', 100])
+    assertDataDictEqual(averaged_actual, averaged_desired)
+    assert_equal(list(statistics_actual.keys()),
+                 list(statistics_desired.keys()))
+    for k in statistics_desired.keys():
+        assertDataDictEqual(statistics_actual[k], statistics_desired[k])
+
+def test_average_data_statistics_units(exp, convert_name):
+    name_1 = convert_name('TEST1~wavelength-1~replicate-0')
+    name_2 = convert_name('TEST1~wavelength-1~replicate-1')
+    group_name = convert_name('TEST1~wavelength-1')
+    data_dict = {name_1: 1.0 * ureg.nA, name_2: 2000.0 * ureg.pA}
+    averaged_actual, statistics_actual = exp.average_data(
+            data_dict, average_along='replicate', statistics=['std'])
+    assert_allclose(averaged_actual[group_name].to(ureg.nA).magnitude, 1.5)
+    assert_allclose(statistics_actual['std'][group_name].to(ureg.nA).magnitude,
+                    np.sqrt(0.5))
+
+def test_average_data_multiple_factors(exp, convert_name):
+    data_dict = {
+        convert_name('TEST1~wavelength-1~replicate-0~trial-0'): 1.0,
+        convert_name('TEST1~wavelength-1~replicate-1~trial-0'): 2.0,
+        convert_name('TEST1~wavelength-1~replicate-0~trial-1'): 3.0,
+        convert_name('TEST1~wavelength-1~replicate-1~trial-1'): 4.0,
+        convert_name('TEST1~wavelength-2~replicate-0~trial-0'): 5.0,
+        convert_name('TEST1~wavelength-2~replicate-1~trial-0'): 7.0,
+    }
+    averaged_desired = {
+        convert_name('TEST1~wavelength-1'): 2.5,
+        convert_name('TEST1~wavelength-2'): 6.0,
+    }
+    averaged_actual = exp.average_data(
+            data_dict, average_along=['replicate', 'trial'])
+    assertDataDictEqual(averaged_actual, averaged_desired)
+
+def test_average_data_mismatched_shapes(exp, convert_name):
+    data_dict = {
+        convert_name('TEST1~wavelength-1~replicate-0'):
+            pd.DataFrame({'Time (ms)': [1, 2], 'Current (nA)': [1, 2]}),
+        convert_name('TEST1~wavelength-1~replicate-1'):
+            pd.DataFrame({'Time (ms)': [1], 'Current (nA)': [1]}),
+    }
+    with pytest.raises(ValueError):
+        exp.average_data(data_dict, average_along='replicate')
+
+def test_welford_accumulator_scalar():
+    values = [1.0, 4.0, 2.5, 8.0]
+    accumulator = WelfordAccumulator()
+    for v in values:
+        accumulator.update(v * ureg.mV)
+    results = accumulator.result(['mean', 'sum', 'std', 'sem'])
+    assert_allclose(results['mean'].to(ureg.mV).m, np.mean(values))
+    assert_allclose(results['sum'].to(ureg.mV).m, np.sum(values))
+    assert_allclose(results['std'].to(ureg.mV).m, np.std(values, ddof=1))
+    assert_allclose(results['sem'].to(ureg.mV).m,
+                    np.std(values, ddof=1) / 2)
+
+def test_welford_accumulator_unsupported():
+    accumulator = WelfordAccumulator()
+    accumulator.update(1.0)
+    with pytest.raises(ValueError):
+        accumulator.result(['median'])
+
+def test_average_data_resample_intersection(exp, convert_name):
+    name_1 = convert_name('TEST1~wavelength-1~replicate-0')
+    name_2 = convert_name('TEST1~wavelength-1~replicate-1')
+    group_name = convert_name('TEST1~wavelength-1')
+    data_dict = {
+        name_1: pd.DataFrame({'Wavelength (nm)': [1, 2, 3, 4],
+                              'Photocurrent (nA)': [1, 2, 3, 4]}),
+        name_2: pd.DataFrame({'Wavelength (nm)': [1.5, 2.5, 3.5],
+                              'Photocurrent (nA)': [3, 5, 7]}),
+    }
+    averaged_desired = {group_name: pd.DataFrame({
+        'Wavelength (nm)': [2.0, 3.0],
+        'Photocurrent (nA)': [3.0, 4.5]})}
+    averaged_actual = exp.average_data(
+            data_dict, average_along='replicate', resample='intersection')
+    assertDataDictEqual(averaged_actual, averaged_desired)
+
+def test_average_data_resample_union(exp, convert_name):
+    name_1 = convert_name('TEST1~wavelength-1~replicate-0')
+    name_2 = convert_name('TEST1~wavelength-1~replicate-1')
+    group_name = convert_name('TEST1~wavelength-1')
+    data_dict = {
+        name_1: pd.DataFrame({'Wavelength (nm)': [1, 2, 3],
+                              'Photocurrent (nA)': [1, 2, 3]}),
+        name_2: pd.DataFrame({'Wavelength (nm)': [2, 3],
+                              'Photocurrent (nA)': [4, 5]}),
+    }
+    averaged_actual = exp.average_data(
+            data_dict, average_along='replicate', resample='union')
+    assert_allclose(averaged_actual[group_name].values,
+            [[1, np.nan], [2, 3], [3, 4]])
+
+def test_average_data_resample_grid(exp, convert_name):
+    name_1 = convert_name('TEST1~wavelength-1~replicate-0')
+    name_2 = convert_name('TEST1~wavelength-1~replicate-1')
+    group_name = convert_name('TEST1~wavelength-1')
+    data_dict = {
+        name_1: pd.DataFrame({'Wavelength (nm)': [1, 3],
+                              'Photocurrent (nA)': [1, 3]}),
+        name_2: pd.DataFrame({'Wavelength (nm)': [3, 2, 1],
+                              'Photocurrent (nA)': [5, 4, 3]}),
+    }
+    averaged_desired = {group_name: pd.DataFrame({
+        'Wavelength (nm)': [1.5, 2.5],
+        'Photocurrent (nA)': [2.5, 3.5]})}
+    averaged_actual = exp.average_data(
+            data_dict, average_along='replicate', resample=[2.5, 1.5])
+    assertDataDictEqual(averaged_actual, averaged_desired)
+
+@pytest.mark.parametrize('x', [
+    np.array([]), np.array([2.0]), np.array([0.0, 1.0, 1.0, 2.5, 4.0])])
+def test_interpolate_columns(x):
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=(len(x), 3))
+    new_x = np.concatenate([np.linspace(-1, 5, 25), x])
+    new_values = interpolate_columns(new_x, x, values)
+    for i in range(values.shape[1]):
+        if len(x) == 0:
+            desired = np.full(len(new_x), np.nan)
+        else:
+            desired = np.interp(new_x, x, values[:, i],
+                                left=np.nan, right=np.nan)
+        assert_equal(new_values[:, i], desired)
+
+def test_bootstrap_interval():
+    stack = np.array([[1.0, 10.0], [2.0, 10.0], [3.0, 10.0], [4.0, 10.0]])
+    lower_1, upper_1 = bootstrap_interval(stack, n_resamples=1000, seed=0)
+    lower_2, upper_2 = bootstrap_interval(
+            stack, n_resamples=1000, seed=0, max_elements=10)
+    assert_equal(lower_1, lower_2)
+    assert_equal(upper_1, upper_2)
+    assert_equal(lower_1[0] < 2.5 < upper_1[0], True)
+    assert_allclose(lower_1[1], 10)
+    assert_allclose(upper_1[1], 10)
+
+def test_derived_quantity_bootstrap_master_data(exp_units, convert_name):
+    names = [convert_name(f'TEST1~wavelength=1nm~replicate={i}') \
+             for i in range(5)] + \
+            [convert_name(f'TEST1~wavelength=2nm~replicate={i}') \
+             for i in range(5)]
+    data_dict = {name: pd.DataFrame({'Voltage (mV)': [i % 5 + 1.0]}) \
+                 for i, name in enumerate(names)}
+    def voltage(data, cond):
+        return data['Voltage (mV)'].values[0] * ureg.mV
+
+    averaged_data, statistics_data = exp_units.derived_quantity(
+        quantity_func=voltage, data_dict=data_dict,
+        average_along='replicate',
+        average_kw={'statistics': ['ci_lower', 'ci_upper'],
+                    'bootstrap_kw': {'seed': 1, 'n_resamples': 2000}})
+    master_data = exp_units.master_data(
+            averaged_data, statistics_data=statistics_data)
+    assert_equal(list(master_data.columns), [
+        'wavelength (nm)', 'voltage (mV)',
+        'voltage_ci_lower (mV)', 'voltage_ci_upper (mV)'])
+    assert_allclose(master_data['voltage (mV)'], [3, 3])
+    assert_equal(all(master_data['voltage_ci_lower (mV)'] < 3), True)
+    assert_equal(all(master_data['voltage_ci_upper (mV)'] > 3), True)
+
 def test_average_data_unsupported(exp):
     with pytest.raises(ValueError):
         averaged_data_actual = exp.average_data(
@@ -0,0 +1,145 @@
+"""
+Tests the SQLite catalog of experiments
+"""
+import pytest
+import pandas as pd
+import os
+from numpy.testing import assert_equal
+from xsugar import Experiment, ExperimentCatalog, ureg
+from sciparse import parse_default
+
+@pytest.fixture
+def catalog_path(tmp_path):
+    base_path = str(tmp_path)
+    catalog = ExperimentCatalog(base_path)
+    for name, temperatures in [('TEST1', [25, 50]), ('TEST2', [50, 75])]:
+        exp = Experiment(name=name, kind='test', base_path=base_path,
+                         catalog=catalog, frequency=8500)
+        for temperature in temperatures:
+            for wavelength in [700, 800]:
+                data = pd.DataFrame({
+                    'Time (ms)': [0, 1, 2],
+                    'Voltage (mV)': [temperature, wavelength, 1.0]})
+                exp.saveRawResults(data, {
+                    'temperature': temperature,
+                    'wavelength': wavelength * ureg.nm})
+    Experiment(name='TEST3', kind='other', base_path=base_path,
+               catalog=catalog).saveRawResults(
+        2.0 * ureg.nA, {'temperature': 50, 'material': 'Au'})
+    catalog.close()
+    yield base_path
+
+def test_catalog_query(catalog_path):
+    catalog = ExperimentCatalog(catalog_path)
+    conditions = catalog.query(temperature=50)
+    assert_equal([(c['experiment'], c['name']) for c in conditions], [
+        ('TEST3', 'TEST3~material=Au~temperature=50'),
+        ('TEST1', 'TEST1~temperature=50~wavelength=700nm'),
+        ('TEST1', 'TEST1~temperature=50~wavelength=800nm'),
+        ('TEST2', 'TEST2~temperature=50~wavelength=700nm'),
+        ('TEST2', 'TEST2~temperature=50~wavelength=800nm')])
+    assert_equal(conditions[1]['filename'], catalog_path + \
+        '/data/test/TEST1/TEST1~temperature=50~wavelength=700nm.csv')
+    assert_equal(conditions[1]['rows'], 3)
+    assert_equal(conditions[1]['format'], 'csv')
+    assert_equal(conditions[0]['file'], 'TEST3.csv')
+
+    conditions = catalog.query(kind='test',
+        wavelength=(0.75 * ureg.um, None), temperature=[25, 75])
+    assert_equal([c['name'] for c in conditions], [
+        'TEST1~temperature=25~wavelength=800nm',
+        'TEST2~temperature=75~wavelength=800nm'])
+    conditions = catalog.query(wavelength=0.7 * ureg.um, experiment='TEST2')
+    assert_equal(len(conditions), 2)
+    conditions = catalog.query(material='Au')
+    assert_equal([c['experiment'] for c in conditions], ['TEST3'])
+    conditions = catalog.query(temperature=lambda t: t > 50)
+    assert_equal(len(conditions), 2)
+
+def test_catalog_query_plain_numbers(catalog_path):
+    catalog = ExperimentCatalog(catalog_path)
+    conditions = catalog.query(experiment='TEST1', wavelength=(750, 900))
+    assert_equal([c['name'] for c in conditions], [
+        'TEST1~temperature=25~wavelength=800nm',
+        'TEST1~temperature=50~wavelength=800nm'])
+    conditions = catalog.query(experiment='TEST1', wavelength=700)
+    assert_equal(len(conditions), 2)
+    conditions = catalog.query(experiment='TEST1', wavelength=[700, 0.8])
+    assert_equal(len(conditions), 2)
+    assert_equal(catalog.query(wavelength=(600e-9, 800e-9)), [])
+    assert_equal(catalog.query(pressure=1), [])
+
+def test_catalog_statistics(catalog_path):
+    catalog = ExperimentCatalog(catalog_path)
+    rows = catalog.connection.execute(
+        "SELECT co.name, co.unit, co.mean, co.minimum, co.maximum FROM columns co JOIN conditions c ON co.condition_id = c.id WHERE c.name = 'TEST1~temperature=25~wavelength=700nm'").fetchall()
+    assert_equal(rows, [
+        ('Time (ms)', 'millisecond', 1.0, 0.0, 2.0),
+        ('Voltage (mV)', 'millivolt', 242.0, 1.0, 700.0)])
+
+def test_catalog_rescan(catalog_path):
+    os.remove(catalog_path + '/data/_catalog.sqlite')
+    os.remove(catalog_path + '/data/test/TEST2/_TEST2.manifest')
+    catalog = ExperimentCatalog(catalog_path)
+    assert_equal(catalog.query(), [])
+    catalog.rescan()
+    assert_equal(len(catalog.query(kind='test')), 8)
+    conditions = catalog.query(temperature=(60, None))
+    assert_equal([c['name'] for c in conditions], [
+        'TEST2~temperature=75~wavelength=700nm',
+        'TEST2~temperature=75~wavelength=800nm'])
+    assert_equal(conditions[0]['size'], os.path.getsize(conditions[0]['filename']))
+
+def test_catalog_open_experiments(catalog_path):
+    catalog = ExperimentCatalog(catalog_path)
+    experiments = catalog.open_experiments(kind='test', temperature=50)
+    assert_equal([exp.name for exp in experiments], ['TEST1', 'TEST2'])
+    exp = experiments[0]
+    assert_equal(sorted(exp.data.keys()), [
+        'TEST1~temperature=50~wavelength=700nm',
+        'TEST1~temperature=50~wavelength=800nm'])
+    assert_equal(len(exp.data.cache), 0)
+    assert_equal(exp.data['TEST1~temperature=50~wavelength=800nm'][
+        'Voltage (mV)'].iloc[1], 800)
+    assert_equal(len(exp.conditions), 2)
+
+def test_catalog_open_experiments_unparsed(catalog_path):
+    parsed_files = []
+    def parser(filename, **kwargs):
+        parsed_files.append(os.path.basename(filename))
+        return parse_default(filename, **kwargs)
+    catalog = ExperimentCatalog(catalog_path)
+    exp, = catalog.open_experiments(experiment='TEST1', temperature=25,
+                                    parser=parser)
+    assert_equal(sorted(exp.data.keys()), [
+        'TEST1~temperature=25~wavelength=700nm',
+        'TEST1~temperature=25~wavelength=800nm'])
+    assert_equal(parsed_files, [])
+    dict(exp.data)
+    assert_equal(sorted(parsed_files), [
+        'TEST1~temperature=25~wavelength=700nm.csv',
+        'TEST1~temperature=25~wavelength=800nm.csv'])
+
+def test_catalog_rescan_consistent(catalog_path):
+    catalog = ExperimentCatalog(catalog_path)
+    statistics_query = 'SELECT c.name, co.name, co.unit, co.mean, co.minimum, co.maximum FROM columns co JOIN conditions c ON co.condition_id = c.id ORDER BY c.name, co.name'
+    conditions_desired = catalog.query()
+    statistics_desired = catalog.connection.execute(statistics_query).fetchall()
+    catalog.rescan()
+    assert_equal(catalog.query(), conditions_desired)
+    statistics_actual = catalog.connection.execute(statistics_query).fetchall()
+    assert_equal(statistics_actual, statistics_desired)
+    assert_equal(statistics_actual[-1],
+        ('TEST3~material=Au~temperature=50', 'current (nA)', 'nanoampere',
+         2.0, 2.0, 2.0))
+
+def test_catalog_owned(tmp_path):
+    base_path = str(tmp_path)
+    with Experiment(name='TEST1', kind='test', base_path=base_path,
+                    catalog=True) as exp:
+        exp.saveRawResults(2.0, {'temperature': 25})
+        catalog = exp.catalog
+        assert_equal(len(catalog.query(temperature=25)), 1)
+    assert_equal(exp.catalog, None)
+    with pytest.raises(Exception):
+        catalog.query()
@@ -4,7 +4,7 @@ import pandas as pd
 import os
 from shutil import rmtree
 from numpy.testing import assert_equal, assert_allclose
-from xsugar import Experiment, factors_from_condition, get_partial_condition, condition_is_subset
+from xsugar import Experiment, factors_from_condition, get_partial_condition, condition_is_subset, common_metadata, condition_matches, ureg
 
 def test_get_conditions(exp, convert_name):
     exp.data = {
@@ -165,5 +165,51 @@ def test_condition_is_subset_false():
     is_subset_desired = False
     assert_equal(is_subset_actual, is_subset_desired)
 
+def test_common_metadata():
+    metadata_list = [
+        {'frequency': 8500, 'gain': 1, 'date': '1'},
+        {'frequency': 8500, 'gain': 2, 'date': '1'},
+        {'frequency': 8500, 'date': '1', 'other': [1, 2]}]
+    common_actual = common_metadata(metadata_list)
+    common_desired = {'frequency': 8500, 'date': '1'}
+    assert_equal(common_actual, common_desired)
+    assert_equal(common_metadata([]), {})
+
+@pytest.mark.parametrize('condition_filter, matches', [
+    (None, True),
+    ({'temperature': 25}, True),
+    ({'temperature': 50}, False),
+    ({'wavelength': (600, 800)}, True),
+    ({'wavelength': (800, None)}, False),
+    ({'wavelength': [700, 800], 'temperature': 25}, True),
+    ({'replicate': 1}, False),
+    ({'wavelength': lambda x: x > 500}, True),
+    (lambda cond: cond['temperature'] == 50, False)])
+def test_condition_matches(condition_filter, matches):
+    cond = {'wavelength': 700, 'temperature': 25}
+    assert_equal(condition_matches(cond, condition_filter), matches)
+
+def test_condition_matches_quantity():
+    cond = {'wavelength': 1000 * ureg.nm}
+    assert_equal(condition_matches(cond, {'wavelength': 1 * ureg.um}), True)
+    assert_equal(condition_matches(cond,
+        {'wavelength': (900 * ureg.nm, 1100 * ureg.nm)}), True)
+
+def test_condition_matches_quantity_plain_numbers():
+    cond = {'wavelength': 1000 * ureg.nm}
+    assert_equal(condition_matches(cond, {'wavelength': (900, 1100)}), True)
+    assert_equal(condition_matches(cond, {'wavelength': (600, 800)}), False)
+    assert_equal(condition_matches(cond, {'wavelength': 1000}), True)
+    assert_equal(condition_matches(cond, {'wavelength': [700, 1000]}), True)
+    assert_equal(condition_matches(cond,
+        {'wavelength': (1 * ureg.s, None)}), False)
+
+def test_condition_matches_incomparable():
+    cond = {'material': 'Au', 'wavelength': 700}
+    assert_equal(condition_matches(cond, {'material': (1, 5)}), False)
+    assert_equal(condition_matches(cond, {'material': ('Ag', 'Cu')}), True)
+    assert_equal(condition_matches(cond,
+        {'wavelength': (600 * ureg.nm, None)}), False)
+
 #def test_condition_from_name():
 #name = 'TEST1~wavelength=25~
@@ -0,0 +1,80 @@
+"""
+Tests continuous acquisition into a ring buffer with rolling persistence
+"""
+import pytest
+import numpy as np
+from numpy.testing import assert_equal
+from xsugar import Experiment, ureg, RingBuffer
+
+def record(start, stop):
+    time = np.arange(start, stop) * 0.5
+    return np.column_stack([time, time * 2])
+
+def test_ring_buffer():
+    buffer = RingBuffer(4, 1)
+    buffer.append(np.arange(3.0)[:, None])
+    buffer.append(np.arange(3.0, 6.0)[:, None])
+    assert_equal(buffer.first(), 2)
+    assert_equal(buffer.rows(2, 6)[:, 0], [2, 3, 4, 5])
+    assert_equal(buffer.rows(4, 6)[:, 0], [4, 5])
+    with pytest.raises(ValueError):
+        buffer.rows(1, 6)
+    buffer.append(np.arange(6.0, 12.0)[:, None])
+    assert_equal(buffer.rows(8, 12)[:, 0], [8, 9, 10, 11])
+
+def test_continuous_segments(exp, exp_data):
+    exp = Experiment(name='TEST1', kind='test', frequency=8500)
+    acquisition = exp.continuous(['Time (s)', 'Voltage (mV)'],
+                                      segment_rows=4, capacity=6)
+    for start in range(0, 22, 3):
+        acquisition.append(record(start, start + 3))
+    assert_equal(acquisition.buffer.buffer.shape, (6, 2))
+    assert_equal(len(acquisition.segments), 6)
+    assert_equal(acquisition.buffer.total - acquisition.flushed, 0)
+    acquisition.append(record(24, 26))
+    acquisition.close()
+    assert_equal(len(exp.data.cache), 0)
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    assert_equal(sorted(loaded_exp.data.keys()),
+                 [f'TEST1~segment={i}' for i in range(7)])
+    assert_equal(loaded_exp.data['TEST1~segment=6'], record(24, 26))
+    assert_equal(loaded_exp.data['TEST1~segment=1'], record(4, 8))
+
+    assert_equal(acquisition.last(1 * ureg.s).to_numpy(), record(23, 26))
+    assert_equal(acquisition.last(6).to_numpy(), record(13, 26))
+    assert_equal(len(acquisition.last(100)), 26)
+    assert_equal(len(exp.data.cache), 0)
+
+    resumed = exp.continuous(['Time (s)', 'Voltage (mV)'],
+                                  segment_rows=4)
+    assert_equal(resumed.segment, 7)
+
+def test_continuous_sampling_frequency(exp):
+    exp = Experiment(name='TEST1', kind='test', frequency=8500)
+    acquisition = exp.continuous(['Voltage (mV)'], segment_rows=10,
+        sampling_frequency=2 * ureg.Hz)
+    acquisition.append(np.arange(25.0))
+    assert_equal(acquisition.last(3)['Voltage (mV)'].to_numpy(),
+                 [19, 20, 21, 22, 23, 24])
+    with pytest.raises(ValueError):
+        exp.continuous(['Voltage (mV)'], segment_rows=10).last(3)
+
+def test_execute_continuous(exp):
+    exp = Experiment(name='TEST1', kind='test', frequency=8500)
+    chunks = iter([record(0, 5), record(5, 10), record(10, 12)])
+    exp.measure_func = lambda cond: next(chunks, None)
+    acquisition = exp.execute_continuous(
+        ['Time (ms)', 'Voltage (mV)'], segment_rows=5)
+    assert_equal(len(acquisition.segments), 3)
+    assert_equal(acquisition.last(1 * ureg.ms).to_numpy(), record(9, 12))
+
+def test_continuous_compressed(exp):
+    exp = Experiment(name='TEST1', kind='test', compression='gzip')
+    with exp.continuous(['Time (s)', 'Voltage (mV)'],
+                        segment_rows=4) as acquisition:
+        acquisition.append(record(0, 6))
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    assert_equal(loaded_exp.data['TEST1~segment=1'], record(4, 6))
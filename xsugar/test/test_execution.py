@@ -92,3 +92,75 @@ def testExecuteExperimentDataCorrect(exp, exp_data, convert_name):
     }
     actual_data = exp.data
     assertDataDictEqual(actual_data, desired_data)
+
+def test_execute_running_average(exp_data, convert_name):
+    def data_func(cond):
+        return pd.DataFrame(
+            {'Time (ms)': [0, 0.1, 0.2],
+             'Voltage (V)': np.array([1, 2, 3]) + cond['replicate']})
+    exp = Experiment(
+        name='TEST1', kind='test',
+         measure_func=data_func,
+         average_along='replicate',
+         frequency=exp_data['frequency'],
+         wavelength=exp_data['wavelength'],
+         replicate=exp_data['replicate'])
+    exp.Execute()
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+    averaged_desired = exp.average_data(average_along='replicate')
+    averaged_actual, statistics_actual = exp.running_average_data(
+            statistics=['std'])
+    assertDataDictEqual(averaged_actual, averaged_desired)
+    std_desired = pd.DataFrame(
+            {'Time (ms)': [0, 0.1, 0.2],
+             'Voltage (V)': [np.sqrt(0.5)] * 3})
+    assertDataDictEqual(statistics_actual['std'], {
+        convert_name('TEST1~wavelength=1'): std_desired,
+        convert_name('TEST1~wavelength=2'): std_desired})
+
+def test_execute_running_average_settings(exp_data, convert_name):
+    def data_func(cond):
+        return pd.DataFrame(
+            {'Time (ms)': [0, 0.1, 0.2],
+             'Voltage (V)': np.array([1, 2, 3]) + cond['replicate']})
+    exp = Experiment(
+        name='TEST1', kind='test',
+         measure_func=data_func,
+         average_along='replicate', averaging_type='last',
+         average_statistics=['sem'], retain_raw_data=False,
+         frequency=exp_data['frequency'],
+         wavelength=exp_data['wavelength'],
+         replicate=exp_data['replicate'])
+    exp.Execute()
+    assert_equal(len(exp.data), 0)
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+    averaged_desired = loaded_exp.average_data(
+            average_along='replicate', averaging_type='last')
+    averaged_actual, statistics_actual = exp.running_average_data()
+    assertDataDictEqual(averaged_actual, averaged_desired)
+    assert_equal(list(statistics_actual.keys()), ['sem'])
+
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', average_along='replicate',
+                   average_statistics=['median'])
+
+def test_execute_scalar_flushed(exp_data):
+    exp = Experiment(
+        name='TEST1', kind='test', flush_rows=100,
+        measure_func=lambda cond: 2.0,
+        frequency=exp_data['frequency'],
+        wavelength=exp_data['wavelength'])
+    exp.Execute()
+    with open(exp_data['data_full_path'] + 'TEST1.csv') as fh:
+        fh.readline()
+        data_actual = pd.read_csv(fh)
+    assert_equal(len(data_actual), 2)
+    assert_equal(exp.appender, None)
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
@@ -0,0 +1,101 @@
+"""
+Tests lazily loading data from disk
+"""
+import pytest
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from numpy.testing import assert_equal
+from xsugar import Experiment, LazyData, data_size
+from sciparse import assertDataDictEqual
+
+@pytest.fixture
+def frames():
+    return {
+        'TEST1~replicate=0~wavelength=1':
+            pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [1.0, 2.0]}),
+        'TEST1~replicate=1~wavelength=1':
+            pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [3.0, 4.0]}),
+        'TEST1~replicate=0~wavelength=2':
+            pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [5.0, 6.0]}),
+    }
+
+def save_frames(exp, frames):
+    for name, data in frames.items():
+        exp.saveRawResults(data, exp.conditionFromName(name))
+
+def test_lazy_data_loads_on_access():
+    calls = []
+    def loader():
+        calls.append(1)
+        return 5
+    data = LazyData()
+    data.add_loader('a', loader)
+    assert_equal(len(calls), 0)
+    assert_equal(list(data.keys()), ['a'])
+    assert_equal(data['a'], 5)
+    assert_equal(data['a'], 5)
+    assert_equal(len(calls), 1)
+
+def test_lazy_data_eviction(frames):
+    frame_size = data_size(list(frames.values())[0])
+    data = LazyData(memory_budget=2 * frame_size)
+    for name, frame in frames.items():
+        data.add_loader(name, lambda frame=frame: frame.copy())
+    names = list(frames.keys())
+    for name in names:
+        data[name]
+    assert_equal([data.is_loaded(n) for n in names], [False, True, True])
+    data[names[1]]
+    data[names[0]]
+    assert_equal([data.is_loaded(n) for n in names], [True, True, False])
+    assert_frame_equal(data[names[2]], frames[names[2]])
+    assert_equal(data.memory_usage() <= 2 * frame_size, True)
+
+def test_lazy_data_assigned_not_evicted():
+    data = LazyData(memory_budget=0)
+    data['a'] = 1.0
+    data.add_loader('b', lambda: 2.0)
+    data['b']
+    data['b']
+    assert_equal(data.is_loaded('a'), True)
+    assert_equal(dict(data), {'a': 1.0, 'b': 2.0})
+
+def test_lazy_data_pop_not_loaded():
+    def loader():
+        raise AssertionError('Removed data should not be loaded')
+    data = LazyData()
+    data.add_loader('a', loader)
+    data.add_loader('b', loader)
+    data['c'] = 3.0
+    assert_equal('a' in data, True)
+    assert_equal(data.pop('a'), None)
+    assert_equal(data.pop('a', 5), 5)
+    with pytest.raises(KeyError):
+        data.pop('a')
+    assert_equal(data.pop('c'), 3.0)
+    assert_equal(data.popitem(), ('b', None))
+    assert_equal(len(data), 0)
+
+def test_load_data_lazy(exp, frames):
+    save_frames(exp, frames)
+    exp = Experiment(name='TEST1', kind='test')
+    exp.loadData(lazy=True)
+    assert_equal(isinstance(exp.data, LazyData), True)
+    assert_equal(sorted(exp.data.keys()), sorted(frames.keys()))
+    assert_equal(any(exp.data.is_loaded(n) for n in frames.keys()), False)
+    assert_equal(exp.constants, {'frequency': 8500})
+    assertDataDictEqual(dict(exp.data), frames)
+
+def test_load_data_lazy_transparent(exp, frames):
+    save_frames(exp, frames)
+    exp = Experiment(name='TEST1', kind='test')
+    exp.loadData(lazy=True, memory_budget=1)
+    def mean_voltage(data, cond):
+        return data['Voltage (mV)'].mean()
+    averaged_actual = exp.derived_quantity(
+            mean_voltage, average_along='replicate')
+    averaged_desired = {
+        'TEST1~wavelength=1': 2.5,
+        'TEST1~wavelength=2': 5.5}
+    assertDataDictEqual(averaged_actual, averaged_desired)
+    assert_equal(sum(exp.data.is_loaded(n) for n in frames.keys()), 1)
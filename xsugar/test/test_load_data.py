@@ -8,8 +8,8 @@ from pandas.testing import assert_frame_equal
 import os
 from shutil import rmtree
 from numpy.testing import assert_equal, assert_allclose
-from xsugar import Experiment
-from sciparse import assertDataDictEqual
+from xsugar import Experiment, DataSource
+from sciparse import assertDataDictEqual, parse_default
 from ast import literal_eval
 from itertools import zip_longest
 from pathlib import Path
@@ -135,3 +135,124 @@ def test_load_conditions(exp, exp_data, convert_name):
             'frequency': frequency}]
     conditions_actual = exp.conditions
     assert_equal(conditions_actual, conditions_desired)
+
+@pytest.mark.parametrize('pool', ['thread', 'process'])
+def test_load_data_parallel(exp, exp_data, pool):
+    for i in range(6):
+        data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [i, i + 1]})
+        exp.saveRawResults(data,
+                {'wavelength': i, 'temperature': 25, 'frequency': 8500})
+    serial_exp = Experiment(name='TEST1', kind='test')
+    serial_exp.loadData()
+    parallel_exp = Experiment(name='TEST1', kind='test')
+    parallel_exp.loadData(workers=3, pool=pool)
+    assert_equal(list(parallel_exp.data.keys()),
+                 list(serial_exp.data.keys()))
+    assertDataDictEqual(parallel_exp.data, serial_exp.data)
+    assert_equal(parallel_exp.conditions, serial_exp.conditions)
+    assert_equal(parallel_exp.constants, {'frequency': 8500})
+
+def test_load_data_incremental(exp, exp_data):
+    names = []
+    for i in range(3):
+        data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [i, i + 1]})
+        cond = {'wavelength': i, 'temperature': 25}
+        exp.saveRawResults(data, cond)
+        names.append(exp.nameFromCondition(cond))
+    parsed_files = []
+    def parser(filename, **kwargs):
+        parsed_files.append(filename)
+        return parse_default(filename, **kwargs)
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData(parser=parser, incremental=True)
+    assert_equal(len(parsed_files), 3)
+    assert_equal(len(loaded_exp.conditions), 3)
+
+    parsed_files.clear()
+    loaded_exp.loadData(parser=parser, incremental=True)
+    assert_equal(parsed_files, [])
+    assert_equal(len(loaded_exp.conditions), 3)
+
+    new_data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [7, 8]})
+    exp.saveRawResults(new_data, {'wavelength': 0, 'temperature': 25})
+    os.remove(exp_data['data_full_path'] + names[1] + '.csv')
+    exp.saveRawResults(new_data, {'wavelength': 5, 'temperature': 25})
+    loaded_exp.loadData(parser=parser, incremental=True)
+    assert_equal(len(parsed_files), 2)
+    assert_equal(list(loaded_exp.data.keys()).count(names[1]), 0)
+    assert_equal(names[1] in loaded_exp.metadata, False)
+    assert_frame_equal(loaded_exp.data[names[0]], new_data)
+    wavelengths = sorted(c['wavelength'] for c in loaded_exp.conditions)
+    assert_equal(wavelengths, [0, 2, 5])
+
+def test_load_data_incremental_lazy_removed(exp, exp_data):
+    names = []
+    for i in range(3):
+        data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [i, i + 1]})
+        cond = {'wavelength': i, 'temperature': 25}
+        exp.saveRawResults(data, cond)
+        names.append(exp.nameFromCondition(cond))
+    parsed_files = []
+    def parser(filename, **kwargs):
+        parsed_files.append(filename)
+        return parse_default(filename, **kwargs)
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData(parser=parser, lazy=True, incremental=True)
+    parsed_files.clear()
+    os.remove(exp_data['data_full_path'] + names[1] + '.csv')
+    loaded_exp.loadData(parser=parser, lazy=True, incremental=True)
+    assert_equal(parsed_files, [])
+    assert_equal(sorted(loaded_exp.data.keys()), [names[0], names[2]])
+    assert_equal(names[1] in loaded_exp.metadata, False)
+    assert_equal(len(loaded_exp.conditions), 2)
+
+def test_load_data_incremental_hashes_changed(exp, exp_data, monkeypatch):
+    data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [0, 1]})
+    exp.saveRawResults(data, {'wavelength': 1, 'temperature': 25})
+    hashed_files = []
+    content_hash = DataSource.content_hash
+    def hash_source(source):
+        hashed_files.append(source.name)
+        return content_hash(source)
+    monkeypatch.setattr(DataSource, 'content_hash', hash_source)
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData(incremental=True)
+    loaded_exp.loadData(incremental=True)
+    assert_equal(hashed_files, [])
+
+    filename = exp_data['data_full_path'] + 'TEST1~temperature=25~wavelength=1.csv'
+    stat = os.stat(filename)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    loaded_exp.loadData(incremental=True)
+    assert_equal(hashed_files, ['TEST1~temperature=25~wavelength=1'])
+
+def test_load_data_repeated_no_duplicates(exp):
+    data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [0, 1]})
+    exp.saveRawResults(data, {'wavelength': 1, 'temperature': 25})
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    loaded_exp.loadData()
+    assert_equal(len(loaded_exp.conditions), 1)
+
+def test_load_data_condition_filter(exp):
+    for wavelength in [1, 2, 3]:
+        for temperature in [25, 50]:
+            data = pd.DataFrame({'Time (ms)': [0, 1], 'Voltage (mV)': [0, 1]})
+            exp.saveRawResults(data,
+                {'wavelength': wavelength, 'temperature': temperature})
+    parsed_files = []
+    def parser(filename, **kwargs):
+        parsed_files.append(filename)
+        return parse_default(filename, **kwargs)
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData(parser=parser, condition_filter={
+        'temperature': 25, 'wavelength': (2, None)})
+    assert_equal(len(parsed_files), 2)
+    conditions_actual = sorted(
+        [(c['wavelength'], c['temperature']) for c in loaded_exp.conditions])
+    assert_equal(conditions_actual, [(2, 25), (3, 25)])
+    assert_equal(len(loaded_exp.data), 2)
@@ -0,0 +1,99 @@
+"""
+Tests the experiment manifest and reopening experiments from it
+"""
+import pytest
+import pandas as pd
+import os
+from numpy.testing import assert_equal
+from xsugar import Experiment, ExperimentManifest, ureg
+from sciparse import assertDataDictEqual
+
+def save_conditions(exp):
+    for wavelength in [1, 2, 3]:
+        data = pd.DataFrame({
+            'Time (ms)': [0, 0.1, 0.2],
+            'Voltage (mV)': [wavelength, 2.5, 3.0]})
+        exp.saveRawResults(data, {'wavelength': wavelength, 'temperature': 25})
+
+def test_manifest_maintained(exp, exp_data):
+    save_conditions(exp)
+    manifest = ExperimentManifest(
+        exp_data['data_full_path'] + '_TEST1.manifest')
+    assert_equal(manifest.names(), [
+        'TEST1~temperature=25~wavelength=1',
+        'TEST1~temperature=25~wavelength=2',
+        'TEST1~temperature=25~wavelength=3'])
+    entry = manifest.entries['TEST1~temperature=25~wavelength=1']
+    assert_equal(entry['file'], 'TEST1~temperature=25~wavelength=1.csv')
+    assert_equal(entry['format'], 'csv')
+    assert_equal(entry['rows'], 3)
+    assert_equal(entry['columns'],
+                 [['Time (ms)', 'millisecond'], ['Voltage (mV)', 'millivolt']])
+    assert_equal(entry['size'], os.path.getsize(
+        exp_data['data_full_path'] + entry['file']))
+    assert_equal(manifest.metadata('TEST1~temperature=25~wavelength=1'),
+                 {'temperature': 25, 'wavelength': 1})
+
+@pytest.mark.parametrize('storage', ['csv', 'npy', 'archive'])
+def test_open(exp, exp_data, storage, monkeypatch):
+    save_conditions(Experiment(name='TEST1', kind='test', storage=storage,
+                               frequency=exp_data['frequency'] * ureg.Hz))
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+
+    real_listdir = os.listdir
+    def listdir(path):
+        if os.path.samefile(path, exp_data['data_full_path']):
+            raise AssertionError('Data directory should not be listed')
+        return real_listdir(path)
+    monkeypatch.setattr(os, 'listdir', listdir)
+    opened_exp = Experiment.open(name='TEST1', kind='test')
+    assert_equal(len(opened_exp.data.cache), 0)
+    assert_equal(opened_exp.conditions, loaded_exp.conditions)
+    assert_equal(opened_exp.metadata, loaded_exp.metadata)
+    assert_equal(opened_exp.constants,
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+    assertDataDictEqual(dict(opened_exp.data), loaded_exp.data)
+
+def test_open_rebuilds_manifest(exp, exp_data):
+    save_conditions(exp)
+    exp.saveRawResults(4.0, {'wavelength': 4, 'temperature': 25})
+    exp.flush_results()
+    manifest_filename = exp_data['data_full_path'] + '_TEST1.manifest'
+    os.remove(manifest_filename)
+
+    opened_exp = Experiment.open(name='TEST1', kind='test')
+    assert_equal(os.path.isfile(manifest_filename), True)
+    assert_equal(len(opened_exp.data), 4)
+    manifest = ExperimentManifest(manifest_filename)
+    assert_equal(manifest.entries['TEST1']['rows'], 1)
+    assert_equal(manifest.entries['TEST1~temperature=25~wavelength=2']['rows'], 3)
+
+def test_manifest_torn_write(exp, exp_data):
+    save_conditions(exp)
+    manifest_filename = exp_data['data_full_path'] + '_TEST1.manifest'
+    with open(manifest_filename, 'a') as fh:
+        fh.write('{"name": "TEST1~temp')
+
+    exp = Experiment(name='TEST1', kind='test')
+    exp.saveRawResults(pd.DataFrame({'Time (ms)': [0], 'Voltage (mV)': [1.0]}),
+                       {'wavelength': 4, 'temperature': 25})
+    manifest = ExperimentManifest(manifest_filename)
+    assert_equal(len(manifest), 4)
+    assert_equal(manifest.names()[-1], 'TEST1~temperature=25~wavelength=4')
+
+def test_open_refreshes_stale(exp, exp_data):
+    save_conditions(exp)
+    name = 'TEST1~temperature=25~wavelength=2'
+    with open(exp_data['data_full_path'] + name + '.csv', 'a') as fh:
+        fh.write('0.3,7.0\n')
+    os.remove(exp_data['data_full_path'] +
+              'TEST1~temperature=25~wavelength=1.csv')
+
+    opened_exp = Experiment.open(name='TEST1', kind='test')
+    assert_equal(list(opened_exp.data.keys()), [
+        name, 'TEST1~temperature=25~wavelength=3'])
+    assert_equal(opened_exp.data[name]['Voltage (mV)'].iloc[-1], 7)
+    manifest = ExperimentManifest(
+        exp_data['data_full_path'] + '_TEST1.manifest')
+    assert_equal(manifest.entries[name]['rows'], 4)
@@ -480,3 +480,52 @@ def test_master_data_dict_3var(exp, exp_data, convert_name):
     }
     actual_data = exp.master_data_dict(data_dict)
     assertDataDictEqual(actual_data, desired_data)
+
+def test_tidy_data(exp, convert_name):
+    name1 = convert_name('TEST1~wavelength=1~temperature=25')
+    name2 = convert_name('TEST1~wavelength=2~temperature=25')
+    data_dict = {
+        name1: pd.DataFrame({
+            'Time (ms)': [0, 1],
+            'Voltage (V)': [1.0, 2.0]}),
+        name2: pd.DataFrame({
+            'Time (ms)': [0, 1, 2],
+            'Voltage (V)': [3.0, 4.0, 5.0]}),
+    }
+    desired_data = pd.DataFrame({
+        'wavelength': pd.Categorical([1, 1, 2, 2, 2]),
+        'temperature': pd.Categorical([25, 25, 25, 25, 25]),
+        'Time (ms)': [0, 1, 0, 1, 2],
+        'Voltage (V)': [1.0, 2.0, 3.0, 4.0, 5.0]})
+    actual_data = exp.tidy_data(data_dict)
+    assert_frame_equal(actual_data, desired_data)
+
+def test_tidy_data_units(exp_units, convert_name):
+    name1 = convert_name('TEST1~wavelength=25nm~temperature=305K')
+    name2 = convert_name('TEST1~wavelength=35nm~temperature=306K')
+    data_dict = {
+        name1: pd.DataFrame({'Voltage (V)': [1.0]}),
+        name2: pd.DataFrame({'Voltage (V)': [2.0]}),
+    }
+    desired_data = pd.DataFrame({
+        'wavelength (nm)': [25, 35],
+        'temperature (K)': [305, 306],
+        'Voltage (V)': [1.0, 2.0]})
+    actual_data = exp_units.tidy_data(data_dict, categorical=False)
+    assert_frame_equal(actual_data, desired_data)
+
+def test_tidy_data_groupby(exp, convert_name):
+    name1 = convert_name('TEST1~wavelength=1~replicate=0')
+    name2 = convert_name('TEST1~wavelength=1~replicate=1')
+    data_dict = {
+        name1: pd.DataFrame({'Voltage (V)': [1.0, 2.0]}),
+        name2: pd.DataFrame({'Voltage (V)': [3.0, 4.0]}),
+    }
+    tidy_frame = exp.tidy_data(data_dict)
+    actual_means = tidy_frame.groupby('replicate')['Voltage (V)'].mean()
+    assert_allclose(actual_means.values, [1.5, 3.5])
+
+def test_tidy_data_scalar(exp, convert_name):
+    data_dict = {convert_name('TEST1~wavelength=1'): 1.0}
+    with pytest.raises(ValueError):
+        exp.tidy_data(data_dict)
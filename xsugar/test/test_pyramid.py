@@ -0,0 +1,109 @@
+"""
+Tests the decimation pyramids saved with raw time series
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import os
+from sugarplot import plt
+from numpy.testing import assert_equal, assert_allclose
+from xsugar import Experiment, decimate, write_pyramid, DecimationPyramid
+
+@pytest.fixture
+def long_data():
+    time = np.arange(2500) * 0.1
+    voltage = np.sin(time)
+    voltage[1234] = 10
+    return pd.DataFrame({'Time (ms)': time, 'Voltage (mV)': voltage})
+
+def save_long_data(long_data):
+    saved_exp = Experiment(name='TEST1', kind='test',
+                           pyramid_levels=[10, 100, 1000])
+    saved_exp.saveRawResults(long_data, {'wavelength': 1})
+    return saved_exp
+
+def test_decimate():
+    values = np.arange(7.0)[:, None]
+    decimated = decimate(values, 3)
+    assert_equal(decimated['mean'][:, 0], [1, 4, 6])
+    assert_equal(decimated['min'][:, 0], [0, 3, 6])
+    assert_equal(decimated['max'][:, 0], [2, 5, 6])
+
+def test_write_pyramid(tmp_path, long_data):
+    filename = str(tmp_path / '_TEST1.pyramid')
+    assert_equal(write_pyramid(filename, long_data, [1000, 10, 5000]), True)
+    pyramid = DecimationPyramid(filename)
+    assert_equal(pyramid.levels, [10, 1000])
+    assert_equal(pyramid.rows, 2500)
+    mean = pyramid.level(10)
+    assert_equal(list(mean.columns), ['Time (ms)', 'Voltage (mV)'])
+    assert_allclose(mean['Time (ms)'].iloc[0], 0.45)
+    assert_equal(pyramid.level(1000, 'max')['Voltage (mV)'].iloc[1], 10)
+
+    envelope = pyramid.envelope(1000)
+    assert_equal(len(envelope), 6)
+    assert_allclose(envelope['Time (ms)'], np.repeat([49.95, 149.95, 224.95], 2))
+    assert_equal(envelope['Voltage (mV)'].iloc[3], 10)
+
+    assert_equal(pyramid.select_level(3), 1000)
+    assert_equal(pyramid.select_level(4), 10)
+    assert_equal(pyramid.select_level(251), None)
+
+    assert_equal(write_pyramid(filename, long_data.iloc[:5], [10]), False)
+    assert_equal(os.path.exists(filename), False)
+
+def test_pyramid_saved(exp, exp_data, long_data):
+    save_long_data(long_data)
+    name = 'TEST1~wavelength=1'
+    assert_equal(os.path.isdir(
+        exp_data['data_full_path'] + '_' + name + '.pyramid'), True)
+    exp = Experiment(name='TEST1', kind='test')
+    exp.loadData()
+    assert_equal(list(exp.data.keys()), [name])
+    assert_equal(exp.pyramid(name).levels, [10, 100, 1000])
+
+def test_decimated_data(exp, long_data):
+    save_long_data(long_data)
+    name = 'TEST1~wavelength=1'
+    exp = Experiment.open(name='TEST1', kind='test')
+    data = exp.decimated_data(20)
+    assert_equal(len(data[name]), 50)
+    assert_equal(len(exp.data.cache), 0)
+    data = exp.decimated_data(1000)
+    assert_frame_equal(data[name], long_data)
+
+    figs, axes = exp.plot(pixels=200)
+    x_data = axes[0].lines[0].get_xdata()
+    assert_equal(len(x_data), 500)
+
+    with plt.rc_context({'figure.figsize': (2, 2), 'figure.dpi': 100}):
+        figs, axes = exp.plot()
+    assert_equal(len(axes[0].lines[0].get_xdata()), 500)
+    figs, axes = exp.plot(data_dict=exp.data)
+    assert_equal(len(axes[0].lines[0].get_xdata()), 2500)
+
+def test_pyramid_stale(exp, exp_data, long_data):
+    saved_exp = save_long_data(long_data)
+    name = 'TEST1~wavelength=1'
+    with open(exp_data['data_full_path'] + name + '.csv', 'a') as fh:
+        fh.write('250.0,0.0\n')
+    assert_equal(saved_exp.pyramid(name), None)
+
+def test_pyramid_removed_on_resave(exp, long_data):
+    name = 'TEST1~wavelength=1'
+    exp = Experiment(name='TEST1', kind='test', storage='npy',
+                     pyramid_levels=[10])
+    exp.saveRawResults(long_data, {'wavelength': 1})
+    assert_equal(exp.pyramid(name).levels, [10])
+    exp = Experiment(name='TEST1', kind='test', storage='npy')
+    exp.saveRawResults(long_data * 2, {'wavelength': 1})
+    assert_equal(os.path.exists(exp.pyramid_filename(name)), False)
+    assert_equal(exp.pyramid(name), None)
+
+def test_write_pyramid_extension_dtype(tmp_path):
+    filename = str(tmp_path / '_TEST1.pyramid')
+    data = pd.DataFrame({'Time (ms)': pd.array(np.arange(20), dtype='Int64'),
+                         'Voltage (mV)': np.arange(20.0)})
+    assert_equal(write_pyramid(filename, data, [10]), False)
+    assert_equal(os.path.exists(filename), False)
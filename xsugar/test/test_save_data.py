@@ -52,9 +52,51 @@ def test_save_raw_results_metadata(exp, exp_data, convert_name):
     with open(exp_data['data_full_path'] + filename_desired) as fh:
         first_line = fh.readline()
         metadata_actual = literal_eval(first_line)
+    assert_equal(metadata_actual, {'temperature': 25, 'wavelength': 1})
 
+    with open(exp_data['data_full_path'] + '_TEST1.metadata') as fh:
+        experiment_metadata_actual = literal_eval(fh.readline())
     metadata_desired = {'frequency': exp_data['frequency']}
-    assert_equal(metadata_actual, metadata_desired)
+    assert_equal(experiment_metadata_actual, metadata_desired)
+
+def test_save_raw_results_metadata_delta(exp, exp_data):
+    raw_data = pd.DataFrame({'wavelength': [1, 2, 3],
+                             'Current': [4,4.5,6]})
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    exp.constants['gain'] = 10
+    exp.saveRawResults(raw_data, {'wavelength': 2, 'temperature': 25})
+    with open(exp_data['data_full_path'] + \
+              'TEST1~temperature=25~wavelength=2.csv') as fh:
+        metadata_actual = literal_eval(fh.readline())
+    assert_equal(metadata_actual,
+                 {'gain': 10, 'temperature': 25, 'wavelength': 2})
+
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_equal(new_exp.metadata['TEST1~temperature=25~wavelength=1'],
+                 {'frequency': exp_data['frequency']})
+    assert_equal(new_exp.metadata['TEST1~temperature=25~wavelength=2'],
+                 {'frequency': exp_data['frequency'], 'gain': 10})
+    assert_equal(new_exp.constants, {'frequency': exp_data['frequency']})
+
+def test_save_raw_results_metadata_removed(exp, exp_data):
+    raw_data = pd.DataFrame({'wavelength': [1, 2, 3],
+                             'Current': [4,4.5,6]})
+    exp.constants['gain'] = 10
+    exp.saveRawResults(raw_data, {'wavelength': 1})
+    del exp.constants['gain']
+    exp.saveRawResults(raw_data, {'wavelength': 2})
+    with open(exp_data['data_full_path'] + 'TEST1~wavelength=2.csv') as fh:
+        metadata_actual = literal_eval(fh.readline())
+    assert_equal(metadata_actual, {'wavelength': 2, '_removed': ['gain']})
+
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_equal(new_exp.metadata['TEST1~wavelength=1'],
+                 {'frequency': exp_data['frequency'], 'gain': 10})
+    assert_equal(new_exp.metadata['TEST1~wavelength=2'],
+                 {'frequency': exp_data['frequency']})
+    assert_equal(new_exp.constants, {'frequency': exp_data['frequency']})
 
 def test_save_raw_results_data(exp, exp_data, convert_name):
     """
@@ -130,6 +172,132 @@ def test_save_raw_scalar_multiple_units(ureg, exp_units, exp_data):
     assert_frame_equal(data_actual, data_desired)
 
 
+def test_save_raw_scalar_buffered(exp, exp_data):
+    exp = Experiment(name='TEST1', kind='test', flush_rows=3,
+                     frequency=exp_data['frequency'])
+    filename = exp_data['data_full_path'] + 'TEST1.csv'
+    exp.saveRawResults(1.5, {'wavelength': 1, 'temperature': 25})
+    exp.saveRawResults(2.5, {'wavelength': 2, 'temperature': 25})
+    with open(filename) as fh:
+        fh.readline()
+        assert_equal(len(pd.read_csv(fh)), 0)
+    exp.saveRawResults(3.5, {'wavelength': 3, 'temperature': 25})
+    exp.saveRawResults(4.5, {'wavelength': 4, 'temperature': 25})
+    exp.flush_results()
+    with open(filename) as fh:
+        fh.readline()
+        data_actual = pd.read_csv(fh)
+    assert_frame_equal(data_actual, pd.DataFrame({
+        'temperature': [25, 25, 25, 25],
+        'wavelength': [1, 2, 3, 4],
+        'Value': [1.5, 2.5, 3.5, 4.5]}))
+
+def test_save_raw_scalar_resume(exp, exp_data):
+    filename = exp_data['data_full_path'] + 'TEST1.csv'
+    exp.saveRawResults(1.5, {'wavelength': 1, 'temperature': 25})
+    exp.flush_results()
+    with open(filename, 'a') as fh:
+        fh.write('25,2,2.') # Row interrupted by a crash
+
+    resumed_exp = Experiment(name='TEST1', kind='test', resume=True,
+                             frequency=exp_data['frequency'])
+    resumed_exp.saveRawResults(2.5, {'wavelength': 2, 'temperature': 25})
+    resumed_exp.flush_results()
+    with open(filename) as fh:
+        metadata_actual = literal_eval(fh.readline())
+        data_actual = pd.read_csv(fh)
+    assert_equal(metadata_actual, {'frequency': exp_data['frequency']})
+    assert_frame_equal(data_actual, pd.DataFrame({
+        'temperature': [25, 25],
+        'wavelength': [1, 2],
+        'Value': [1.5, 2.5]}))
+
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', resume=True).saveRawResults(
+            3.5, {'wavelength': 3})
+
+def test_save_raw_scalar_overwrite(exp_data):
+    exp = Experiment(name='TEST1', kind='test', measure_func=lambda cond: 1.0,
+                     wavelength=[1, 2])
+    exp.Execute()
+    exp.Execute()
+    with open(exp_data['data_full_path'] + 'TEST1.csv') as fh:
+        fh.readline()
+        data_actual = pd.read_csv(fh)
+    assert_frame_equal(data_actual, pd.DataFrame({
+        'wavelength': [1, 2], '<lambda>': [1.0, 1.0]}))
+
+    exp.saveRawResults(2.0, {'wavelength': 3})
+    assert_equal(exp.appender, None)
+    with open(exp_data['data_full_path'] + 'TEST1.csv') as fh:
+        fh.readline()
+        assert_equal(len(pd.read_csv(fh)), 3)
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_save_raw_array(exp, exp_data):
+    data = np.array([[0, 1.5], [1, 2.5], [2, 3.5]])
+    exp.saveRawResults(data, {'wavelength': 1, 'temperature': 25},
+                       columns=['Time', 'Voltage'], units=['ms', 'mV'])
+    name = 'TEST1~temperature=25~wavelength=1'
+    assert_equal(os.path.isdir(
+        exp_data['data_full_path'] + name + '.npyd'), True)
+    assert_equal(exp.get_manifest().entries[name]['columns'],
+        [['Time (ms)', 'millisecond'], ['Voltage (mV)', 'millivolt']])
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    assert_equal(list(loaded_exp.data.keys()), [name])
+    data_actual = loaded_exp.data[name]
+    assert_equal(isinstance(data_actual, np.ndarray), True)
+    assert_equal(data_actual, data)
+
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData(columns=['mV'])
+    assert_equal(loaded_exp.data[name], data[:, [1]])
+
+def test_save_raw_array_measure_func(exp_data):
+    def measure_func(cond):
+        return np.arange(3.0) * cond['wavelength']
+    measure_func.columns = 'Voltage'
+    measure_func.units = 'mV'
+    exp = Experiment(name='TEST1', kind='test', measure_func=measure_func,
+                     wavelength=[1, 2])
+    try:
+        exp.Execute()
+        name = 'TEST1~wavelength=2'
+        assert_equal(exp.get_manifest().entries[name]['columns'],
+                     [['Voltage (mV)', 'millivolt']])
+        loaded_exp = Experiment(name='TEST1', kind='test')
+        loaded_exp.loadData()
+        assert_equal(loaded_exp.data[name], [0, 2, 4])
+    finally:
+        rmtree(exp_data['data_base_path'], ignore_errors=True)
+        rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_save_raw_array_columns_mismatch(exp):
+    with pytest.raises(ValueError):
+        exp.saveRawResults(np.zeros((3, 2)), {'wavelength': 1},
+                           columns=['Time'])
+
+def test_save_raw_array_options(exp_data):
+    exp = Experiment(name='TEST1', kind='test')
+    with pytest.raises(ValueError):
+        exp.saveRawResults(pd.DataFrame({'Time': [0, 1]}), {'wavelength': 1},
+                           columns=['Time'])
+    try:
+        exp = Experiment(name='TEST1', kind='test', compression='gzip')
+        exp.saveRawResults(np.zeros((3, 2)), {'wavelength': 1})
+        assert_equal(os.path.isdir(
+            exp_data['data_full_path'] + 'TEST1~wavelength=1.npyd'), True)
+        loaded_exp = Experiment(name='TEST1', kind='test')
+        loaded_exp.loadData()
+        assert_equal(loaded_exp.data['TEST1~wavelength=1'], np.zeros((3, 2)))
+    finally:
+        rmtree(exp_data['data_base_path'], ignore_errors=True)
+        rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+
 @pytest.mark.skip
 def testSaveDerivedQuantitiesFilename(exp, exp_data):
     master_data = {'TEST1': pd.DataFrame({'wavelength': [1, 2, 3],
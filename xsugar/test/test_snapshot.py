@@ -0,0 +1,92 @@
+"""
+Tests saving and reopening snapshots of experiments
+"""
+import pytest
+import pandas as pd
+import os
+from numpy.testing import assert_equal
+from xsugar import Experiment, ureg, dc_photocurrent, read_snapshot
+from sciparse import assertDataDictEqual
+
+def save_snapshot(filename):
+    saved_exp = Experiment(name='TEST1', kind='test', gain=2 * ureg.Mohm)
+    for wavelength in [1, 2]:
+        saved_exp.saveRawResults(pd.DataFrame({
+            'Time (ms)': [0, 1, 2],
+            'Voltage (mV)': [1.0, 2.0, 3.0 * wavelength]}),
+            {'wavelength': wavelength})
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    loaded_exp.derived_quantity(dc_photocurrent, save_as='photocurrent')
+    loaded_exp.snapshot(filename)
+    return loaded_exp
+
+def test_snapshot_roundtrip(exp, tmp_path, monkeypatch):
+    filename = str(tmp_path / 'TEST1.snapshot')
+    exp = save_snapshot(filename)
+    header, _ = read_snapshot(filename, header_only=True)
+    assert_equal(header['name'], 'TEST1')
+    assert_equal(header['version'], 1)
+
+    def parse(*args, **kwargs):
+        raise AssertionError('Raw data should not be parsed')
+    monkeypatch.setattr(pd, 'read_csv', parse)
+    reopened_exp = Experiment.from_snapshot(filename)
+    assertDataDictEqual(reopened_exp.data, exp.data)
+    assert_equal(reopened_exp.metadata, exp.metadata)
+    assert_equal(reopened_exp.conditions, exp.conditions)
+    assert_equal(reopened_exp.constants, {'gain': 2 * ureg.Mohm})
+    assert_equal(reopened_exp.derived_data['photocurrent'],
+                 exp.derived_data['photocurrent'])
+    assert_equal(reopened_exp.changed_datasets(), [])
+
+def test_snapshot_stale(exp, exp_data, tmp_path):
+    filename = str(tmp_path / 'TEST1.snapshot')
+    save_snapshot(filename)
+    name = 'TEST1~wavelength=2'
+    with open(exp_data['data_full_path'] + name + '.csv', 'a') as fh:
+        fh.write('3,7.0\n')
+    os.remove(exp_data['data_full_path'] + 'TEST1~wavelength=1.csv')
+
+    with pytest.raises(ValueError):
+        Experiment.from_snapshot(filename, refresh=False)
+    reopened_exp = Experiment.from_snapshot(filename)
+    assert_equal(list(reopened_exp.data.keys()), [name])
+    assert_equal(reopened_exp.data[name]['Voltage (mV)'].iloc[-1], 7)
+    assert_equal(reopened_exp.derived_data, {})
+    assert_equal(len(reopened_exp.conditions), 1)
+
+def test_snapshot_load_options(exp, exp_data, tmp_path):
+    save_snapshot(str(tmp_path / 'TEST1.snapshot'))
+    name = 'TEST1~wavelength=2'
+    exp = Experiment(name='TEST1', kind='test')
+    exp.loadData(columns=['Voltage (mV)'],
+                 condition_filter={'wavelength': [2, 3]})
+    filename = str(tmp_path / 'TEST1_filtered.snapshot')
+    exp.snapshot(filename)
+    assert_equal(Experiment.from_snapshot(filename).changed_datasets(), [])
+
+    with open(exp_data['data_full_path'] + name + '.csv', 'a') as fh:
+        fh.write('3,7.0\n')
+    Experiment(name='TEST1', kind='test').saveRawResults(pd.DataFrame({
+        'Time (ms)': [0, 1], 'Voltage (mV)': [4.0, 5.0]}), {'wavelength': 3})
+    reopened_exp = Experiment.from_snapshot(filename)
+    assert_equal(sorted(reopened_exp.data.keys()),
+                 [name, 'TEST1~wavelength=3'])
+    assert_equal(list(reopened_exp.data[name].columns), ['Voltage (mV)'])
+    assert_equal(reopened_exp.data[name]['Voltage (mV)'].iloc[-1], 7)
+
+    exp.loadData(condition_filter=lambda cond: True)
+    with pytest.raises(ValueError):
+        exp.snapshot(filename)
+
+def test_snapshot_version(tmp_path):
+    filename = str(tmp_path / 'TEST1.snapshot')
+    with open(filename, 'wb') as fh:
+        fh.write(b'XSUGAR-SNAPSHOT\n{"version": 0}\n')
+    with pytest.raises(ValueError):
+        read_snapshot(filename)
+    with open(filename, 'wb') as fh:
+        fh.write(b'Time (ms),Voltage (mV)\n')
+    with pytest.raises(ValueError):
+        read_snapshot(filename)
@@ -0,0 +1,326 @@
+"""
+Tests the storage backends used to save and load raw data
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import os
+import io
+from shutil import rmtree
+from numpy.testing import assert_equal
+from xsugar import Experiment, ureg, parse_parquet, parse_feather, parser_from_filename, ExperimentArchive, parse_npy, open_compressed, write_csv
+from sciparse import parse_default, parse_xrd
+import xsugar.source.storage
+
+@pytest.fixture
+def raw_data():
+    return pd.DataFrame({
+        'Time (ms)': [0, 0.1, 0.2],
+        'Voltage (mV)': [1.0, 2.5, 3.0]})
+
+@pytest.mark.parametrize('storage', ['parquet', 'feather'])
+def test_save_load_binary(exp, exp_data, raw_data, storage):
+    pytest.importorskip('pyarrow')
+    exp = Experiment(name='TEST1', kind='test', storage=storage,
+                     frequency=exp_data['frequency'] * ureg.Hz)
+    cond = {'wavelength': 1, 'temperature': 25,
+            'frequency': exp_data['frequency'] * ureg.Hz}
+    exp.saveRawResults(raw_data, cond)
+    name = 'TEST1~temperature=25~wavelength=1'
+    assert_equal(os.path.isfile(
+        exp_data['data_full_path'] + name + '.' + storage), True)
+
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_frame_equal(new_exp.data[name], raw_data)
+    assert_equal(new_exp.metadata[name],
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+    assert_equal(new_exp.constants,
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+
+def test_load_mixed_formats(exp, raw_data):
+    pytest.importorskip('pyarrow')
+    cond_1 = {'wavelength': 1, 'temperature': 25}
+    cond_2 = {'wavelength': 2, 'temperature': 25}
+    exp.saveRawResults(raw_data, cond_1)
+    Experiment(name='TEST1', kind='test',
+               storage='parquet').saveRawResults(raw_data, cond_2)
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_equal(sorted(new_exp.data.keys()), [
+        'TEST1~temperature=25~wavelength=1',
+        'TEST1~temperature=25~wavelength=2'])
+    for data in new_exp.data.values():
+        assert_frame_equal(data, raw_data)
+
+def test_parser_from_filename():
+    assert_equal(parser_from_filename('TEST1~a=1.parquet'), parse_parquet)
+    assert_equal(parser_from_filename('TEST1~a=1.feather'), parse_feather)
+    assert_equal(parser_from_filename('TEST1~a=1.csv'), parse_default)
+    assert_equal(parser_from_filename('TEST1~a=1.csv.gz'), parse_default)
+
+def test_storage_unsupported(exp_data):
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', storage='YOLO')
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_save_load_archive(exp, exp_data, raw_data):
+    exp = Experiment(name='TEST1', kind='test', storage='archive',
+                     frequency=exp_data['frequency'] * ureg.Hz)
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    exp.saveRawResults(raw_data * 2, {'wavelength': 2, 'temperature': 25})
+    data_files = [x for x in os.listdir(exp_data['data_full_path']) \
+                  if not x.startswith('_')]
+    assert_equal(data_files, ['TEST1.xsa'])
+
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_frame_equal(
+        new_exp.data['TEST1~temperature=25~wavelength=1'], raw_data)
+    assert_frame_equal(
+        new_exp.data['TEST1~temperature=25~wavelength=2'], raw_data * 2)
+    assert_equal(new_exp.constants,
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+
+def test_archive_random_access(exp_data, raw_data):
+    os.makedirs(exp_data['data_full_path'], exist_ok=True)
+    filename = exp_data['data_full_path'] + 'TEST1.xsa'
+    archive = ExperimentArchive(filename)
+    archive.append('TEST1~a=1', raw_data, {'frequency': 1})
+    archive.append('TEST1~a=2', raw_data * 2, {'frequency': 2})
+    archive.append('TEST1~a=1', raw_data * 3, {'frequency': 3})
+    new_archive = ExperimentArchive(filename)
+    assert_equal(new_archive.names(), ['TEST1~a=2', 'TEST1~a=1'])
+    data, metadata = new_archive.read('TEST1~a=1')
+    assert_frame_equal(data, raw_data * 3)
+    assert_equal(metadata, {'frequency': 3})
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+
+def test_archive_crash_recovery(exp_data, raw_data):
+    os.makedirs(exp_data['data_full_path'], exist_ok=True)
+    filename = exp_data['data_full_path'] + 'TEST1.xsa'
+    archive = ExperimentArchive(filename)
+    archive.append('TEST1~a=1', raw_data, {})
+    archive.append('TEST1~a=2', raw_data, {})
+    os.remove(archive.index_filename) # Lost index
+    with open(filename, 'ab') as fh:
+        fh.write(b'XREC\x00\x01') # Interrupted write
+
+    recovered_archive = ExperimentArchive(filename)
+    assert_equal(recovered_archive.names(), ['TEST1~a=1', 'TEST1~a=2'])
+    recovered_archive.append('TEST1~a=3', raw_data, {})
+    final_archive = ExperimentArchive(filename)
+    assert_equal(final_archive.names(),
+                 ['TEST1~a=1', 'TEST1~a=2', 'TEST1~a=3'])
+    assert_frame_equal(final_archive.read('TEST1~a=3')[0], raw_data)
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+
+def test_save_load_npy_memmap(exp, exp_data, raw_data):
+    exp = Experiment(name='TEST1', kind='test', storage='npy',
+                     frequency=exp_data['frequency'] * ureg.Hz)
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    name = 'TEST1~temperature=25~wavelength=1'
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    data_actual = new_exp.data[name]
+    assert_frame_equal(data_actual, raw_data)
+    voltages = data_actual['Voltage (mV)'].values
+    base = voltages
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert_equal(isinstance(base, np.memmap), True)
+    assert_equal(new_exp.constants,
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+
+    exp.saveRawResults(raw_data * 2, {'wavelength': 1, 'temperature': 25})
+    assert_frame_equal(data_actual, raw_data)
+    assert_equal([f for f in os.listdir(exp_data['data_full_path'] + name +
+                                         '.npyd') if f.endswith('.tmp')], [])
+
+def test_npy_mixed_dtypes(exp_data):
+    data = pd.DataFrame({
+        'Time (ms)': [0, 1, 2],
+        'Voltage (mV)': [1.0, 2.0, 3.0],
+        'Current (nA)': [4.0, 5.0, 6.0],
+        'Label': ['a', 'b', 'c'],
+        'Index': [3, 4, 5]})
+    os.makedirs(exp_data['data_full_path'], exist_ok=True)
+    filename = exp_data['data_full_path'] + 'TEST1~a=1.npyd'
+    parse_npy(filename, data=data, metadata={'b': 2}, read_write='w')
+    data_actual, metadata_actual = parse_npy(filename)
+    assert_frame_equal(data_actual, data)
+    assert_equal(metadata_actual, {'b': 2})
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+
+@pytest.mark.parametrize('storage', ['csv', 'parquet', 'feather', 'npy', 'archive'])
+def test_read_metadata(exp, exp_data, raw_data, storage):
+    if storage in ['parquet', 'feather']:
+        pytest.importorskip('pyarrow')
+    exp = Experiment(name='TEST1', kind='test', storage=storage,
+                     frequency=exp_data['frequency'] * ureg.Hz)
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    sources = exp.data_sources()
+    assert_equal([s.name for s in sources],
+                 ['TEST1~temperature=25~wavelength=1'])
+    assert_equal(sources[0].load_metadata(),
+                 {'temperature': 25, 'wavelength': 1})
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData(lazy=True)
+    assert_equal(new_exp.metadata['TEST1~temperature=25~wavelength=1'],
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+
+@pytest.mark.parametrize('storage', ['csv', 'parquet', 'feather', 'npy', 'archive'])
+@pytest.mark.parametrize('lazy', [False, True])
+def test_load_columns(exp, exp_data, storage, lazy):
+    if storage in ['parquet', 'feather']:
+        pytest.importorskip('pyarrow')
+    raw_data = pd.DataFrame({
+        'Time (ms)': [0, 0.1, 0.2],
+        'Current (nA)': [4, 5, 6],
+        'Voltage (mV)': [1.0, 2.5, 3.0]})
+    exp = Experiment(name='TEST1', kind='test', storage=storage,
+                     frequency=exp_data['frequency'] * ureg.Hz)
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    name = 'TEST1~temperature=25~wavelength=1'
+
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData(columns=[ureg.V, 'Time (ms)'], lazy=lazy)
+    assert_frame_equal(new_exp.data[name],
+                       raw_data[['Voltage (mV)', 'Time (ms)']])
+    assert_equal(new_exp.metadata[name],
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+
+def test_load_columns_missing(exp, raw_data):
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    new_exp = Experiment(name='TEST1', kind='test')
+    with pytest.raises(ValueError):
+        new_exp.loadData(columns=['Current (nA)'])
+    with pytest.raises(ValueError):
+        new_exp.loadData(columns=[ureg.nA])
+
+@pytest.mark.parametrize('compression, extension', [
+    ('gzip', '.gz'), ('bz2', '.bz2'), ('xz', '.xz'), ('zstd', '.zst')])
+def test_save_load_compressed(exp_data, raw_data, compression, extension):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    exp = Experiment(name='TEST1', kind='test', compression=compression,
+                     frequency=exp_data['frequency'] * ureg.Hz)
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    name = 'TEST1~temperature=25~wavelength=1'
+    full_filename = exp_data['data_full_path'] + name + '.csv' + extension
+    assert_equal(os.path.isfile(full_filename), True)
+    with open_compressed(full_filename, 'rt') as fh:
+        assert_equal(fh.readline(), "{'temperature': 25, 'wavelength': 1}\n")
+
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_equal(list(new_exp.data.keys()), [name])
+    assert_frame_equal(new_exp.data[name], raw_data)
+    assert_equal(new_exp.metadata[name],
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+
+    lazy_exp = Experiment(name='TEST1', kind='test')
+    lazy_exp.loadData(lazy=True, columns=['Voltage (mV)'])
+    assert_equal(lazy_exp.metadata[name],
+                 {'frequency': exp_data['frequency'] * ureg.Hz})
+    assert_frame_equal(lazy_exp.data[name], raw_data[['Voltage (mV)']])
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_save_load_parquet_compressed(exp_data, raw_data):
+    pytest.importorskip('pyarrow')
+    exp = Experiment(name='TEST1', kind='test', storage='parquet',
+                     compression='zstd')
+    exp.saveRawResults(raw_data, {'wavelength': 1, 'temperature': 25})
+    new_exp = Experiment(name='TEST1', kind='test')
+    new_exp.loadData()
+    assert_frame_equal(
+        new_exp.data['TEST1~temperature=25~wavelength=1'], raw_data)
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_load_xrd_compressed(exp_data, monkeypatch):
+    name = 'TEST1~wafer=1~type=locked_coupled~peak=Si'
+    source_filename = os.path.dirname(os.path.abspath(__file__)) + \
+        '/data/data/test/TEST1/' + name + '.txt'
+    exp = Experiment(name='TEST1', kind='test')
+    with open(source_filename, 'rb') as source, open_compressed(
+            exp_data['data_full_path'] + name + '.txt.gz', 'wb') as destination:
+        destination.write(source.read())
+    def decompressed_copy(filename):
+        raise AssertionError('XRD files should be decompressed as a stream')
+    monkeypatch.setattr(xsugar.source.storage, 'decompressed_copy',
+                        decompressed_copy)
+    exp.loadXRDData()
+    assert_equal(list(exp.data.keys()), [name])
+    assert_equal(exp.data[name]['Counts'].iloc[0], 24)
+    assert_equal(exp.metadata[name]['steps'], 14)
+    data_desired, metadata_desired = parse_xrd(source_filename)
+    assert_frame_equal(exp.data[name], data_desired)
+    assert_equal(exp.metadata[name], metadata_desired)
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_compression_unsupported(exp_data):
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', compression='rar')
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', storage='npy',
+                   compression='gzip')
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', storage='parquet',
+                   compression='rar')
+    with pytest.raises(ValueError):
+        Experiment(name='TEST1', kind='test', storage='feather',
+                   compression='bz2')
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+@pytest.mark.parametrize('data', [
+    pd.DataFrame({
+        'Time (ms)': np.arange(10) * 0.1,
+        'Voltage (mV)': np.linspace(-1, 1e6, 10),
+        'Index': np.arange(10),
+        'Valid': np.arange(10) > 4}),
+    pd.DataFrame({'Voltage, DC (mV)': [1.0, np.nan, 1e-30]}),
+    pd.DataFrame({'Name': ['a', 'b'], 'Voltage (mV)': [1.0, 2.0]}),
+    pd.DataFrame({'Voltage (mV)': np.array([], dtype=float)}),
+    pd.DataFrame({'Index': pd.array([1, None], dtype='Int64'),
+                  'Voltage (mV)': [1.0, 2.0]}),
+    pd.DataFrame({'Name': pd.Categorical(['a', 'b']),
+                  'Label': pd.array(['c', 'd'], dtype='string'),
+                  'Voltage (mV)': [1.0, 2.0]}),
+    pd.DataFrame({'Date': pd.date_range('2021-01-01', periods=2, tz='UTC'),
+                  'Voltage (mV)': [1.0, 2.0]})])
+@pytest.mark.parametrize('precision', [None, 4])
+def test_write_csv(data, precision):
+    float_format = None if precision is None else f'%.{precision}g'
+    fh_desired = io.StringIO()
+    data.to_csv(fh_desired, index=False, float_format=float_format)
+    fh_actual = io.StringIO()
+    write_csv(fh_actual, data, precision=precision, block_rows=3)
+    assert_equal(fh_actual.getvalue(), fh_desired.getvalue())
+
+def test_save_csv_categorical(exp_data):
+    exp = Experiment(name='TEST1', kind='test')
+    data = pd.DataFrame({'Name': pd.Categorical(['a', 'b']),
+                         'Voltage (mV)': [1.0, 2.0]})
+    exp.saveRawResults(data, {'wavelength': 1})
+    loaded_exp = Experiment(name='TEST1', kind='test')
+    loaded_exp.loadData()
+    assert_equal(list(loaded_exp.data['TEST1~wavelength=1']['Name']),
+                 ['a', 'b'])
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
+
+def test_save_csv_precision(exp_data):
+    exp = Experiment(name='TEST1', kind='test', csv_precision=3)
+    data = pd.DataFrame({'Voltage (mV)': [1.23456, 2 / 3]})
+    exp.saveRawResults(data, {'wavelength': 1})
+    with open(exp_data['data_full_path'] + 'TEST1~wavelength=1.csv') as fh:
+        assert_equal(fh.read(), "{'wavelength': 1}\nVoltage (mV)\n1.23\n0.667\n")
+    assert_equal(exp.summary('TEST1~wavelength=1'), None)
+    rmtree(exp_data['data_base_path'], ignore_errors=True)
+    rmtree(exp_data['figures_base_path'], ignore_errors=True)
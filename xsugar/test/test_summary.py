@@ -0,0 +1,101 @@
+"""
+Tests the summary statistics saved with raw data
+"""
+import pytest
+import numpy as np
+import pandas as pd
+from numpy.testing import assert_equal, assert_allclose
+from xsugar import Experiment, ureg, column_summary, DataSummary, summary_quantity, dc_photocurrent
+
+def save_wavelengths():
+    saved_exp = Experiment(name='TEST1', kind='test', gain=2 * ureg.Mohm)
+    for wavelength in [1, 2]:
+        saved_exp.saveRawResults(pd.DataFrame({
+            'Time (ms)': [0, 1, 2, 3],
+            'Voltage (mV)': [1.0, -1.0, 3.0 * wavelength, 1.0]}),
+            {'wavelength': wavelength})
+    return saved_exp
+
+def test_column_summary():
+    statistics = column_summary(pd.DataFrame({
+        'Time (ms)': [0, 1, 2],
+        'Voltage (mV)': [1.0, -1.0, 3.0],
+        'Current (nA)': [1.0, 2.0, np.nan],
+        'Name': ['a', 'b', 'c']}))
+    assert_equal(list(statistics.keys()),
+                 ['Time (ms)', 'Voltage (mV)', 'Current (nA)'])
+    voltage = statistics['Voltage (mV)']
+    assert_equal(voltage['count'], 3)
+    assert_allclose(voltage['mean'], 1)
+    assert_allclose(voltage['rms'], np.sqrt(11 / 3))
+    assert_equal((voltage['min'], voltage['max']), (-1, 3))
+    assert_allclose(voltage['variance'], 8 / 3)
+    assert_equal(np.isnan(statistics['Current (nA)']['mean']), True)
+
+    statistics = column_summary(np.array([[0, 1], [2, 3.0]]),
+                                column_names=['Time (ms)', 'Voltage (mV)'])
+    assert_equal(statistics['Voltage (mV)']['max'], 3)
+
+def test_data_summary_units():
+    summary = DataSummary(column_summary(pd.DataFrame({
+        'Time (ms)': [0, 1], 'Voltage (mV)': [1.0, 3.0]})))
+    assert_equal(summary.statistic('mean', ureg.V), 2 * ureg.mV)
+    assert_equal(summary.statistic('variance', 'Voltage (mV)'),
+                 1 * ureg.mV ** 2)
+    assert_equal(summary.statistic('count', ureg.ms), 2)
+    with pytest.raises(ValueError):
+        summary.statistic('median', ureg.mV)
+
+def test_derived_quantity_from_summary(exp):
+    save_wavelengths()
+    desired = {
+        'TEST1~wavelength=1': (1.0 * ureg.mV / (2 * ureg.Mohm)).to(ureg.nA),
+        'TEST1~wavelength=2': (1.75 * ureg.mV / (2 * ureg.Mohm)).to(ureg.nA)}
+    exp = Experiment.open(name='TEST1', kind='test')
+    assert_equal(exp.derived_quantity(dc_photocurrent), desired)
+    assert_equal(len(exp.data.cache), 0)
+
+    quantity_func = summary_quantity('rms', ureg.mV)
+    from_summary = exp.derived_quantity(quantity_func)
+    assert_equal(len(exp.data.cache), 0)
+    from_data = exp.derived_quantity(quantity_func, data_dict=dict(exp.data))
+    assert_allclose(from_summary['TEST1~wavelength=2'].magnitude,
+                    from_data['TEST1~wavelength=2'].magnitude)
+    assert_allclose(from_summary['TEST1~wavelength=2'].magnitude,
+                    np.sqrt(39 / 4))
+
+def test_derived_quantity_in_memory(exp):
+    save_wavelengths()
+    name = 'TEST1~wavelength=1'
+    exp = Experiment.open(name='TEST1', kind='test')
+    exp.data[name] = pd.DataFrame({'Time (ms)': [0, 1],
+                                   'Voltage (mV)': [4.0, 4.0]})
+    photocurrent = exp.derived_quantity(dc_photocurrent)
+    assert_allclose(photocurrent[name].to(ureg.nA).magnitude, 2)
+    assert_equal(exp.data.is_loaded('TEST1~wavelength=2'), False)
+
+    exp = Experiment(name='TEST1', kind='test')
+    exp.loadData()
+    exp.data[name]['Voltage (mV)'] *= 2
+    photocurrent = exp.derived_quantity(dc_photocurrent)
+    assert_allclose(photocurrent[name].to(ureg.nA).magnitude, 1)
+
+def test_summary_stale(exp, exp_data):
+    saved_exp = save_wavelengths()
+    name = 'TEST1~wavelength=1'
+    assert_equal(saved_exp.summary(name).statistic('max', ureg.mV),
+                 3 * ureg.mV)
+    with open(exp_data['data_full_path'] + name + '.csv', 'a') as fh:
+        fh.write('4,10.0\n')
+    assert_equal(saved_exp.summary(name), None)
+
+    exp = Experiment(name='TEST1', kind='test', gain=2 * ureg.Mohm)
+    exp.loadData()
+    photocurrent = exp.derived_quantity(dc_photocurrent)
+    assert_allclose(photocurrent[name].to(ureg.nA).magnitude, 2.8 / 2)
+
+def test_summarize_disabled(exp):
+    exp = Experiment(name='TEST1', kind='test', summarize=False)
+    exp.saveRawResults(pd.DataFrame({'Voltage (mV)': [1.0]}),
+                       {'wavelength': 1})
+    assert_equal(exp.summary('TEST1~wavelength=1'), None)